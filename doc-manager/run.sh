@@ -4,12 +4,16 @@
 # Navigate to project directory
 cd /home/ross/pythonproject/doc-manager/src
 
-# Start background worker
-python3 worker.py &
-WORKER_PID=$!
+# Shared embedding-server client (installed into the image by the Dockerfile)
+python3 -c "import embed_client" 2>/dev/null || pip install ../../embed-server/client
+
+# Start worker supervisor (runs `worker.slots` worker processes)
+python3 supervisor.py &
+SUPERVISOR_PID=$!
 
 # Start Streamlit
 streamlit run app.py --server.port 8505 --server.address 0.0.0.0
 
-# Cleanup on exit
-kill $WORKER_PID
+# Cleanup on exit: SIGTERM drains the workers (tasks in progress finish)
+kill $SUPERVISOR_PID
+wait $SUPERVISOR_PID
@@ -2,6 +2,9 @@
 # Install missing dependencies in the background if needed
 pip install streamlit pandas psycopg2-binary pgvector sentence-transformers python-frontmatter uuid-utils requests torch --index-url https://download.pytorch.org/whl/cpu --user
 
-# Run Streamlit and worker
-python3 src/worker.py &
+# Shared embedding-server client (already installed in the Docker image)
+python3 -c "import embed_client" 2>/dev/null || pip install ../embed-server/client --user
+
+# Run Streamlit and the worker supervisor (runs `worker.slots` worker processes)
+python3 src/supervisor.py &
 python3 -m streamlit run src/app.py --server.port=8505 --server.address=0.0.0.0
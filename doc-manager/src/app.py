@@ -19,8 +19,8 @@ import streamlit as st
 import subprocess
 from db_manager import DBManager
 from llm_client import LLMClient
-from sentence_transformers import SentenceTransformer
 from utils.config_loader import load_config
+from utils.embedder import get_embedder, DEFAULT_EMBEDDING_MODEL
 
 # Import Tabs
 from ui.tab_upload import render_upload_tab
@@ -45,34 +45,16 @@ def get_db():
 def get_llm():
     return LLMClient()
 
-@st.cache_resource
-def get_embedder():
-    """
-    Initializes and caches the SentenceTransformer model.
-    
-    CRITICAL CONFIGURATION NOTE:
-    The `cache_folder` is explicitly set to "/app/embed".
-    This path corresponds to a directory inside the Docker container.
-    
-    1. Docker Mount: The host machine's `./embed` directory is mounted to `/app/embed`.
-       (See `docker-compose.yml` services: doc-manager: volumes)
-    2. Shared Storage: This ensures that downloaded models are stored persistently 
-       on the host (not inside the container's ephemeral file system) and can be 
-       shared across different projects (e.g., RAG) by mounting the same host directory.
-    3. User Transparency: Users don't need to configure this path in config.json 
-       as it is an internal structural decision for the Docker environment.
-    """
-    return SentenceTransformer(
-        CONF.get("embedding_model", 'paraphrase-multilingual-MiniLM-L12-v2'),
-        cache_folder="/app/embed"
-    )
-
 # Initialize Session State using Cached Resources
 # We re-assign these on every run to ensure that if the class definition changed (e.g. during development),
 # the session state gets the latest cached instance.
 st.session_state.db = get_db()
 st.session_state.llm = get_llm()
-st.session_state.embedder = get_embedder()
+# The active embedding model is recorded in the DB (embedding_versions) so that a
+# completed shadow migration switches query/insert embeddings to the new model.
+st.session_state.embedder = get_embedder(
+    st.session_state.db.get_active_embedding_model() or CONF.get("embedding_model", DEFAULT_EMBEDDING_MODEL)
+)
 if "categories" not in st.session_state:
     st.session_state.categories = st.session_state.db.get_categories()
 
@@ -1,16 +1,94 @@
 import psycopg2
-from psycopg2.extras import RealDictCursor, Json
+from psycopg2.extras import RealDictCursor, Json, execute_values
 import psycopg2.pool
 import pgvector.psycopg2
 import logging
 import uuid
 import json
+import hashlib
+import select
+import time
+import io
 from contextlib import contextmanager
 from utils.config_loader import load_config
 from utils.worker_manager import ensure_worker_running
+from utils.chunker import split_markdown
 
 logger = logging.getLogger(__name__)
 
+# Vector columns on `documents`. Only these names are ever interpolated into SQL.
+#   embedding          - active vectors, served by search
+#   embedding_shadow   - vectors being built for a new model during a shadow migration
+#   embedding_previous - pre-swap vectors, kept for side-by-side comparison / rollback
+EMBEDDING_COLUMNS = ('embedding', 'embedding_shadow', 'embedding_previous')
+
+# ANN index defaults (overridable via `vector_index` in config.json)
+VECTOR_INDEX_DEFAULTS = {
+    "method": "hnsw",          # 'hnsw' or 'ivfflat'
+    "m": 16,                   # hnsw build: graph degree
+    "ef_construction": 64,     # hnsw build: candidate list size
+    "lists": 100,              # ivfflat build: number of clusters
+    "ef_search": 40,           # hnsw query: candidate list size
+    "probes": 10,              # ivfflat query: clusters scanned
+    "partial_levels": [],      # e.g. ["L0", "L1"]: extra per-level partial indexes
+}
+# pgvector index types cap the indexed dimension
+VECTOR_INDEX_MAX_DIM = 2000
+
+def _copy_text(value):
+    """Formats one value for COPY ... (FORMAT text): \\N for NULL, escaped specials otherwise."""
+    if value is None:
+        return r"\N"
+    if isinstance(value, (list, tuple)):
+        value = "{" + ",".join(repr(float(v)) for v in value) + "}"
+    return (str(value).replace("\\", "\\\\").replace("\t", "\\t")
+            .replace("\n", "\\n").replace("\r", "\\r"))
+
+def _copy_rows(cur, table, columns, rows):
+    """Bulk-loads `rows` into `table` with one COPY FROM STDIN (text format)."""
+    buf = io.StringIO()
+    for row in rows:
+        buf.write("\t".join(_copy_text(v) for v in row))
+        buf.write("\n")
+    buf.seek(0)
+    cur.copy_expert(f"COPY {table} ({', '.join(columns)}) FROM STDIN", buf)
+
+# Search filter: documents that have no processing_tasks row (unqualified `documents` scope)
+_NO_TASK_SQL = "NOT EXISTS (SELECT 1 FROM processing_tasks t WHERE t.doc_id = documents.id)"
+
+# Chunk-level vectors for long documents (overridable via `chunking` in config.json)
+CHUNKING_DEFAULTS = {
+    "enabled": True,
+    "chunk_size": 800,         # characters; documents up to this length keep a single vector
+    "overlap": 100,            # characters carried over between consecutive chunks
+    "aggregate": "max",        # doc score from its chunk similarities: 'max' or 'sum'
+    "candidates": 100,         # chunk hits gathered before aggregating per document
+}
+
+def content_hash(text):
+    """sha256 hex of the text (same value as Postgres encode(sha256(convert_to(text, 'UTF8')), 'hex'))."""
+    return hashlib.sha256((text or '').encode('utf-8')).hexdigest()
+
+# SQL expression matching content_hash() for the current row's content
+_CONTENT_HASH_SQL = "encode(sha256(convert_to(COALESCE(content, ''), 'UTF8')), 'hex')"
+
+# Documents whose shadow vector is missing or was computed from different content
+_SHADOW_STALE_SQL = f"(embedding_shadow IS NULL OR embedding_shadow_hash IS DISTINCT FROM {_CONTENT_HASH_SQL})"
+
+def _link_arrays(alias):
+    """
+    SELECT-list fragment exposing a row's summary links as the `summary_uuids`
+    (children) and `source_uuids` (parents) id lists the UI works with.
+    """
+    return f"""
+        (SELECT COALESCE(jsonb_agg(l.child_id::text ORDER BY l.created_at), '[]'::jsonb)
+         FROM document_links l WHERE l.parent_id = {alias}.id AND l.kind = 'summary') AS summary_uuids,
+        (SELECT COALESCE(jsonb_agg(l.parent_id::text ORDER BY l.created_at), '[]'::jsonb)
+         FROM document_links l WHERE l.child_id = {alias}.id AND l.kind = 'summary') AS source_uuids"""
+
+# LISTEN/NOTIFY channel for task queue changes (payload: new task status)
+TASK_CHANNEL = 'task_queue'
+
 class DBManager:
     """
     Database Manager for handling MariaDB connections and schema migrations.
@@ -26,15 +104,26 @@ class DBManager:
     def __init__(self):
         config = load_config()
         self.conn_params = config['database']
+        self.default_embedding_model = config.get('embedding_model')
+        self.vector_index = {**VECTOR_INDEX_DEFAULTS, **config.get('vector_index', {})}
+        self.chunking = {**CHUNKING_DEFAULTS, **config.get('chunking', {})}
+        self.pgvector_version = (0, 0, 0)
+        self.has_trgm = False
         
         # Initialize Connection Pool
-        self.pool = psycopg2.pool.SimpleConnectionPool(
+        # Threaded pool: shared by Streamlit sessions, re-index threads and worker stage threads
+        self.pool = psycopg2.pool.ThreadedConnectionPool(
             minconn=1, 
             maxconn=20, 
             **self.conn_params
         )
         self._init_db()
 
+    def close(self):
+        """Closes the task listener and every pooled connection."""
+        self.close_task_listener()
+        self.pool.closeall()
+
     @contextmanager
     def get_conn(self):
         conn = self.pool.getconn()
@@ -60,8 +149,6 @@ class DBManager:
                             level TEXT,
                             metadata JSONB,
                             content TEXT,
-                            summary_uuids JSONB DEFAULT '[]'::jsonb,
-                            source_uuids JSONB DEFAULT '[]'::jsonb,
                             embedding vector(384),
                             created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
                         );
@@ -90,11 +177,96 @@ class DBManager:
                     except Exception as e:
                         logger.warning(f"Migration error (title): {e}")
 
-                    # Migration: Add source_uuids
-                    try:
-                        cur.execute("ALTER TABLE documents ADD COLUMN IF NOT EXISTS source_uuids JSONB DEFAULT '[]'::jsonb;")
-                    except Exception as e:
-                        logger.warning(f"Migration error (source_uuids): {e}")
+                    # Migration: hash of the content the active vector was computed from.
+                    # Rows whose hash differs from their current content (or that have no
+                    # vector) are stale; the model is tracked per column in embedding_versions.
+                    cur.execute("ALTER TABLE documents ADD COLUMN IF NOT EXISTS embedding_hash CHAR(64);")
+                    # Same for the shadow/previous vector columns of a model migration (if any)
+                    cur.execute("""
+                        SELECT attname FROM pg_attribute
+                        WHERE attrelid = 'documents'::regclass AND NOT attisdropped
+                          AND attname IN ('embedding_shadow', 'embedding_previous')
+                    """)
+                    for (column,) in cur.fetchall():
+                        cur.execute(f"ALTER TABLE documents ADD COLUMN IF NOT EXISTS {column}_hash CHAR(64);")
+
+                    # Embedding cache: (model, content hash) -> vector, so unchanged text is
+                    # never encoded twice (see encode_cached). Untyped vector: any dimension.
+                    cur.execute("""
+                        CREATE TABLE IF NOT EXISTS embedding_cache (
+                            model TEXT NOT NULL,
+                            content_hash CHAR(64) NOT NULL,
+                            embedding vector NOT NULL,
+                            created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
+                            PRIMARY KEY (model, content_hash)
+                        );
+                    """)
+                    # Migration: last cache hit (day resolution), for pruning unused entries
+                    cur.execute("ALTER TABLE embedding_cache ADD COLUMN IF NOT EXISTS last_used_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP;")
+
+                    # Chunk vectors of long documents (same model/dimension as documents.embedding).
+                    # doc_hash is the content hash the chunks were cut from (stale check).
+                    cur.execute("""
+                        SELECT atttypmod FROM pg_attribute
+                        WHERE attrelid = 'documents'::regclass AND attname = 'embedding' AND NOT attisdropped
+                    """)
+                    row = cur.fetchone()
+                    chunk_vector_type = f"vector({row[0]})" if row and row[0] > 0 else "vector"
+                    cur.execute(f"""
+                        CREATE TABLE IF NOT EXISTS document_chunks (
+                            doc_id UUID NOT NULL REFERENCES documents(id) ON DELETE CASCADE,
+                            chunk_index INTEGER NOT NULL,
+                            content TEXT,
+                            embedding {chunk_vector_type},
+                            doc_hash CHAR(64),
+                            PRIMARY KEY (doc_id, chunk_index)
+                        );
+                    """)
+                    self._ensure_chunk_index(cur)
+
+                    # Parent/child edges (L0 -> L1 summary links). Indexed in both directions;
+                    # rows disappear with either document (ON DELETE CASCADE).
+                    cur.execute("""
+                        CREATE TABLE IF NOT EXISTS document_links (
+                            parent_id UUID NOT NULL REFERENCES documents(id) ON DELETE CASCADE,
+                            child_id UUID NOT NULL REFERENCES documents(id) ON DELETE CASCADE,
+                            kind TEXT NOT NULL DEFAULT 'summary',
+                            created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
+                            PRIMARY KEY (parent_id, child_id, kind)
+                        );
+                    """)
+                    cur.execute("CREATE INDEX IF NOT EXISTS idx_links_child ON document_links(child_id, parent_id);")
+
+                    # Migration: summary_uuids / source_uuids JSONB arrays -> document_links.
+                    # Links to documents that no longer exist are dropped; the arrays are removed
+                    # in the same transaction, so this runs exactly once.
+                    cur.execute("""
+                        SELECT column_name FROM information_schema.columns
+                        WHERE table_name = 'documents' AND column_name IN ('summary_uuids', 'source_uuids')
+                    """)
+                    legacy_link_columns = [r[0] for r in cur.fetchall()]
+                    if 'summary_uuids' in legacy_link_columns:
+                        cur.execute("""
+                            INSERT INTO document_links (parent_id, child_id, kind)
+                            SELECT p.id, c.id, 'summary'
+                            FROM documents p
+                            CROSS JOIN LATERAL jsonb_array_elements_text(COALESCE(p.summary_uuids, '[]'::jsonb)) AS e(child_id)
+                            JOIN documents c ON c.id::text = e.child_id
+                            ON CONFLICT DO NOTHING
+                        """)
+                    if 'source_uuids' in legacy_link_columns:
+                        cur.execute("""
+                            INSERT INTO document_links (parent_id, child_id, kind)
+                            SELECT p.id, c.id, 'summary'
+                            FROM documents c
+                            CROSS JOIN LATERAL jsonb_array_elements_text(COALESCE(c.source_uuids, '[]'::jsonb)) AS e(parent_id)
+                            JOIN documents p ON p.id::text = e.parent_id
+                            ON CONFLICT DO NOTHING
+                        """)
+                    for column in legacy_link_columns:
+                        cur.execute(f"ALTER TABLE documents DROP COLUMN {column};")
+                    if legacy_link_columns:
+                        logger.info("Migrated summary_uuids/source_uuids to document_links.")
 
                     # Create categories table
                     cur.execute("""
@@ -133,7 +305,67 @@ class DBManager:
                         cur.execute("ALTER TABLE processing_tasks ADD COLUMN IF NOT EXISTS results_model_r JSONB;")
                     except:
                         pass
+
+                    # Migration: claim/lease columns (multi-worker queue)
+                    cur.execute("ALTER TABLE processing_tasks ADD COLUMN IF NOT EXISTS claimed_by TEXT;")
+                    cur.execute("ALTER TABLE processing_tasks ADD COLUMN IF NOT EXISTS lease_expires_at TIMESTAMP WITH TIME ZONE;")
+
+                    # Migration: retry bookkeeping (backoff + dead-letter 'failed' state)
+                    cur.execute("ALTER TABLE processing_tasks ADD COLUMN IF NOT EXISTS attempts INTEGER DEFAULT 0;")
+                    cur.execute("ALTER TABLE processing_tasks ADD COLUMN IF NOT EXISTS last_error TEXT;")
+                    cur.execute("ALTER TABLE processing_tasks ADD COLUMN IF NOT EXISTS next_attempt_at TIMESTAMP WITH TIME ZONE;")
+
+                    # Migration: telemetry timestamps (entered current status / claimed by a worker)
+                    cur.execute("ALTER TABLE processing_tasks ADD COLUMN IF NOT EXISTS queued_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP;")
+                    cur.execute("ALTER TABLE processing_tasks ADD COLUMN IF NOT EXISTS claimed_at TIMESTAMP WITH TIME ZONE;")
+
+                    # Worker telemetry: claims (queue wait), LLM calls (latency, tokens), finished/failed stages.
+                    # No FK: history outlives deleted tasks.
+                    cur.execute("""
+                        CREATE TABLE IF NOT EXISTS task_events (
+                            id BIGSERIAL PRIMARY KEY,
+                            doc_id UUID,
+                            event TEXT NOT NULL,
+                            stage TEXT,
+                            model TEXT,
+                            kind TEXT,
+                            worker_id TEXT,
+                            duration_ms DOUBLE PRECISION,
+                            prompt_tokens INTEGER,
+                            completion_tokens INTEGER,
+                            cached BOOLEAN DEFAULT FALSE,
+                            created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
+                        );
+                    """)
+                    cur.execute("CREATE INDEX IF NOT EXISTS idx_task_events_event_created ON task_events(event, created_at);")
+
+                    # Worker liveness: one row per running worker process, refreshed every few seconds
+                    cur.execute("""
+                        CREATE TABLE IF NOT EXISTS worker_heartbeats (
+                            worker_id TEXT PRIMARY KEY,
+                            host TEXT,
+                            pid INTEGER,
+                            slot INTEGER,
+                            status TEXT,
+                            current_tasks UUID[] DEFAULT '{}',
+                            started_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
+                            last_beat TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
+                        );
+                    """)
                     
+                    # LLM result cache (content-addressed, see LLMClient.cache_key)
+                    cur.execute("""
+                        CREATE TABLE IF NOT EXISTS llm_cache (
+                            cache_key CHAR(64) PRIMARY KEY,
+                            kind TEXT,
+                            model TEXT,
+                            result JSONB,
+                            hits INTEGER DEFAULT 0,
+                            created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
+                            last_hit_at TIMESTAMP WITH TIME ZONE
+                        );
+                    """)
+
                     # Create prompts table (Prompt Lab)
                     cur.execute("""
                         CREATE TABLE IF NOT EXISTS prompts (
@@ -143,11 +375,69 @@ class DBManager:
                         );
                     """)
 
+                    # Create re-index jobs table (background embedding refresh with checkpoints)
+                    cur.execute("""
+                        CREATE TABLE IF NOT EXISTS reindex_jobs (
+                            id SERIAL PRIMARY KEY,
+                            status TEXT DEFAULT 'pending',
+                            model_name TEXT,
+                            dim INTEGER,
+                            batch_size INTEGER DEFAULT 64,
+                            total INTEGER DEFAULT 0,
+                            processed INTEGER DEFAULT 0,
+                            last_doc_id UUID,
+                            error TEXT,
+                            created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
+                            updated_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
+                        );
+                    """)
+
+                    # Migration: re-index jobs can target the shadow column
+                    cur.execute("ALTER TABLE reindex_jobs ADD COLUMN IF NOT EXISTS target_column TEXT DEFAULT 'embedding';")
+
+                    # Create embedding versions table (which model produced which vector column)
+                    cur.execute("""
+                        CREATE TABLE IF NOT EXISTS embedding_versions (
+                            slot TEXT PRIMARY KEY,
+                            model_name TEXT,
+                            dim INTEGER,
+                            updated_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
+                        );
+                    """)
+                    cur.execute("""
+                        INSERT INTO embedding_versions (slot, model_name, dim)
+                        SELECT 'active', %s, atttypmod FROM pg_attribute
+                        WHERE attrelid = 'documents'::regclass AND attname = 'embedding'
+                        ON CONFLICT (slot) DO NOTHING;
+                    """, (self.default_embedding_model,))
+
                     # Indexes
                     cur.execute("CREATE INDEX IF NOT EXISTS idx_docs_category ON documents(category);")
                     cur.execute("CREATE INDEX IF NOT EXISTS idx_docs_level ON documents(level);")
                     cur.execute("CREATE INDEX IF NOT EXISTS idx_docs_metadata ON documents USING gin(metadata);")
                     cur.execute("CREATE INDEX IF NOT EXISTS idx_tasks_status ON processing_tasks(status);")
+                    cur.execute("CREATE INDEX IF NOT EXISTS idx_tasks_status_created ON processing_tasks(status, created_at);")
+
+                    # Keyword search: trigram indexes serve ILIKE '%q%' and word_similarity ranking.
+                    # Trigrams are character-based, so Korean works without a morphological analyzer.
+                    # Optional (needs the extension + privileges): a savepoint keeps a failure
+                    # from aborting the rest of the schema setup.
+                    cur.execute("SAVEPOINT trgm;")
+                    try:
+                        cur.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm;")
+                        cur.execute("CREATE INDEX IF NOT EXISTS idx_docs_content_trgm ON documents USING gin (content gin_trgm_ops);")
+                        cur.execute("CREATE INDEX IF NOT EXISTS idx_docs_title_trgm ON documents USING gin (title gin_trgm_ops);")
+                        cur.execute("RELEASE SAVEPOINT trgm;")
+                    except Exception as e:
+                        cur.execute("ROLLBACK TO SAVEPOINT trgm;")
+                        logger.warning(f"Migration error (pg_trgm), keyword ranking disabled: {e}")
+                    cur.execute("SELECT 1 FROM pg_extension WHERE extname = 'pg_trgm'")
+                    self.has_trgm = cur.fetchone() is not None
+
+                    cur.execute("SELECT extversion FROM pg_extension WHERE extname = 'vector'")
+                    ext = cur.fetchone()
+                    if ext:
+                        self.pgvector_version = tuple(int(p) for p in ext[0].split('.')[:3] if p.isdigit())
                     
                     conn.commit()
                     # Also register on the connection level for the session
@@ -155,6 +445,8 @@ class DBManager:
             except Exception as e:
                 logger.error(f"Error initializing DB: {e}")
                 conn.rollback()
+        # ANN indexes are built by the Settings tab and the re-index/migration paths
+        # (ensure_vector_index), not on every connect.
 
     def save_prompt(self, alias, prompt_text):
         with self.get_conn() as conn:
@@ -196,20 +488,27 @@ class DBManager:
                 return False
 
     def upsert_document(self, doc_id, category, level, meta, content, embedding=None, title=None):
+        """
+        Inserts or updates a document. Without `embedding` the stored vector is kept;
+        if the content changed it then shows up as stale (`count_stale_embeddings`).
+        """
+        embedding_hash = content_hash(content) if embedding is not None else None
         with self.get_conn() as conn:
             try:
                 with conn.cursor() as cur:
-                    cur.execute("""
-                        INSERT INTO documents (id, title, category, level, metadata, content, embedding)
-                        VALUES (%s, %s, %s, %s, %s, %s, %s)
+                    cur.execute(f"""
+                        INSERT INTO documents (id, title, category, level, metadata, content, embedding, embedding_hash)
+                        VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
                         ON CONFLICT (id) DO UPDATE SET
                             title = EXCLUDED.title,
                             category = EXCLUDED.category,
                             level = EXCLUDED.level,
                             metadata = EXCLUDED.metadata,
                             content = EXCLUDED.content,
-                            embedding = COALESCE(EXCLUDED.embedding, documents.embedding);
-                    """, (doc_id, title, category, level, Json(meta), content, embedding))
+                            embedding = COALESCE(EXCLUDED.embedding, documents.embedding),
+                            embedding_hash = CASE WHEN EXCLUDED.embedding IS NULL THEN documents.embedding_hash
+                                                  ELSE EXCLUDED.embedding_hash END{self._shadow_reset_sql(cur)};
+                    """, (doc_id, title, category, level, Json(meta), content, embedding, embedding_hash))
                 conn.commit()
                 return True
             except Exception as e:
@@ -217,40 +516,340 @@ class DBManager:
                 conn.rollback()
                 return False
 
-    def link_documents(self, source_id, summary_id):
+    def _shadow_reset_sql(self, cur):
+        """
+        Extra `ON CONFLICT DO UPDATE` assignment for document writes during a shadow
+        migration: a document whose content changes loses its shadow vector, so the
+        shadow build re-embeds it (empty when no shadow column exists).
+        """
+        cur.execute("""
+            SELECT 1 FROM pg_attribute
+            WHERE attrelid = 'documents'::regclass AND attname = 'embedding_shadow' AND NOT attisdropped
+        """)
+        if not cur.fetchone():
+            return ""
+        return """,
+                            embedding_shadow = CASE WHEN documents.content IS DISTINCT FROM EXCLUDED.content
+                                                    THEN NULL ELSE documents.embedding_shadow END"""
+
+    def encode_cached(self, embedder, texts, batch_size=64):
+        """
+        `embedder.encode` through the embedding cache.
+
+        Texts already embedded with this model (same content hash) are served from
+        `embedding_cache`; only the rest are encoded, in one batched call, and stored.
+        Hits refresh `last_used_at` (at most once a day per entry) for
+        `prune_embedding_cache`.
+
+        Returns:
+            list: One vector (list of floats) for a str, a list of vectors for a list.
+        """
+        single = isinstance(texts, str)
+        texts = [texts] if single else list(texts)
+        if not texts:
+            return []
+        model = str(getattr(embedder, 'model_name_or_path', None) or self.get_active_embedding_model() or 'unknown')
+        hashes = [content_hash(t) for t in texts]
+
+        cached = {}
+        with self.get_conn() as conn:
+            try:
+                with conn.cursor() as cur:
+                    cur.execute("SELECT content_hash, embedding::float4[] FROM embedding_cache WHERE model = %s AND content_hash = ANY(%s)",
+                                (model, list(set(hashes))))
+                    cached = {h: emb for h, emb in cur.fetchall()}
+                    if cached:
+                        cur.execute("""
+                            UPDATE embedding_cache SET last_used_at = CURRENT_TIMESTAMP
+                            WHERE model = %s AND content_hash = ANY(%s)
+                              AND last_used_at < CURRENT_TIMESTAMP - INTERVAL '1 day'
+                        """, (model, list(cached)))
+                conn.commit()
+            except Exception as e:
+                logger.error(f"Error reading embedding cache: {e}")
+                conn.rollback()
+
+        missing = {}
+        for h, t in zip(hashes, texts):
+            if h not in cached:
+                missing.setdefault(h, t)
+        if missing:
+            vectors = embedder.encode(list(missing.values()), batch_size=batch_size)
+            fresh = {h: v.tolist() for h, v in zip(missing, vectors)}
+            cached.update(fresh)
+            with self.get_conn() as conn:
+                try:
+                    with conn.cursor() as cur:
+                        execute_values(cur, """
+                            INSERT INTO embedding_cache (model, content_hash, embedding)
+                            VALUES %s
+                            ON CONFLICT DO NOTHING
+                        """, [(model, h, v) for h, v in fresh.items()], template="(%s, %s, %s::float4[]::vector)")
+                    conn.commit()
+                except Exception as e:
+                    logger.error(f"Error writing embedding cache: {e}")
+                    conn.rollback()
+
+        result = [cached[h] for h in hashes]
+        return result[0] if single else result
+
+    def prune_embedding_cache(self, retention_days=90):
+        """Deletes cache entries not used for `retention_days`. Returns the number of rows removed."""
+        with self.get_conn() as conn:
+            with conn.cursor() as cur:
+                cur.execute("""
+                    DELETE FROM embedding_cache
+                    WHERE COALESCE(last_used_at, created_at) < CURRENT_TIMESTAMP - make_interval(days => %s)
+                """, (int(retention_days),))
+                count = cur.rowcount
+            conn.commit()
+        return count
+
+    @staticmethod
+    def _drop_embedding_cache(cur, slot):
+        """Deletes the cached vectors of the model in `slot`, unless another slot still uses that model."""
+        cur.execute("""
+            DELETE FROM embedding_cache
+            WHERE model IN (SELECT model_name FROM embedding_versions WHERE slot = %s)
+              AND model NOT IN (SELECT model_name FROM embedding_versions WHERE slot <> %s AND model_name IS NOT NULL)
+        """, (slot, slot))
+
+    def count_stale_embeddings(self):
+        """Documents whose active vector is missing or was computed from different content."""
+        with self.get_conn() as conn:
+            with conn.cursor() as cur:
+                cur.execute(f"""
+                    SELECT COUNT(*) FROM documents
+                    WHERE content IS NOT NULL
+                      AND (embedding IS NULL OR embedding_hash IS DISTINCT FROM {_CONTENT_HASH_SQL})
+                """)
+                return cur.fetchone()[0]
+
+    def get_existing_ids(self, doc_ids):
+        """Subset of `doc_ids` already stored in documents (one query), as strings."""
+        if not doc_ids:
+            return set()
+        with self.get_conn() as conn:
+            with conn.cursor() as cur:
+                cur.execute("SELECT id::text FROM documents WHERE id = ANY(%s::uuid[])", ([str(d) for d in doc_ids],))
+                return {r[0] for r in cur.fetchall()}
+
+    def bulk_ingest(self, docs, embedder=None, level="L0", batch_size=64):
+        """
+        Upserts many documents and their processing tasks in one transaction.
+
+        Each doc is a dict with `id`, `category`, `content` and optionally `title`,
+        `metadata`, `embedding` and `task_config` (the task's config, e.g. filename).
+        Missing embeddings are computed in one batch through `encode_cached`, and so
+        are the chunk vectors of long documents. Documents, chunks and tasks are
+        written with `execute_values` in the same transaction, and the worker is
+        checked once at the end (instead of once per document).
+
+        Returns:
+            dict: {"inserted": n, "updated": n} (0/0 on failure)
+        """
+        # Last occurrence wins: one statement cannot upsert the same id twice
+        by_id = {str(d['id']): d for d in docs}
+        if not by_id:
+            return {"inserted": 0, "updated": 0}
+        docs = list(by_id.values())
+
+        to_encode = [d for d in docs if d.get('embedding') is None]
+        if embedder is not None and to_encode:
+            vectors = self.encode_cached(embedder, [d['content'] for d in to_encode], batch_size=batch_size)
+            for d, vec in zip(to_encode, vectors):
+                d['embedding'] = vec
+
+        chunk_ids, chunk_rows = [], []
+        if embedder is not None:
+            chunk_ids, chunk_rows = self._prepare_chunks({doc_id: d['content'] for doc_id, d in by_id.items()}, embedder)
+
+        existing = self.get_existing_ids(list(by_id))
+        with self.get_conn() as conn:
+            try:
+                with conn.cursor() as cur:
+                    execute_values(cur, f"""
+                        INSERT INTO documents (id, title, category, level, metadata, content, embedding, embedding_hash)
+                        VALUES %s
+                        ON CONFLICT (id) DO UPDATE SET
+                            title = EXCLUDED.title,
+                            category = EXCLUDED.category,
+                            level = EXCLUDED.level,
+                            metadata = EXCLUDED.metadata,
+                            content = EXCLUDED.content,
+                            embedding = COALESCE(EXCLUDED.embedding, documents.embedding),
+                            embedding_hash = CASE WHEN EXCLUDED.embedding IS NULL THEN documents.embedding_hash
+                                                  ELSE EXCLUDED.embedding_hash END{self._shadow_reset_sql(cur)}
+                    """, [
+                        (doc_id, d.get('title'), d['category'], level, Json(d.get('metadata') or {}),
+                         d['content'], d.get('embedding'),
+                         content_hash(d['content']) if d.get('embedding') is not None else None)
+                        for doc_id, d in by_id.items()
+                    ], template="(%s, %s, %s, %s, %s, %s, %s::float4[]::vector, %s)", page_size=batch_size)
+                    self._write_chunks(cur, chunk_ids, chunk_rows)
+
+                    execute_values(cur, """
+                        INSERT INTO processing_tasks (doc_id, status, config)
+                        VALUES %s
+                        ON CONFLICT (doc_id) DO UPDATE SET
+                            status = 'created',
+                            config = EXCLUDED.config,
+                            attempts = 0,
+                            last_error = NULL,
+                            next_attempt_at = NULL,
+                            queued_at = CURRENT_TIMESTAMP,
+                            updated_at = CURRENT_TIMESTAMP
+                    """, [
+                        (doc_id, 'created', Json(d.get('task_config') or {}))
+                        for doc_id, d in by_id.items()
+                    ], page_size=500)
+                    self._notify_task(cur, 'created')
+                conn.commit()
+            except Exception as e:
+                logger.error(f"Error in bulk ingest: {e}")
+                conn.rollback()
+                return {"inserted": 0, "updated": 0}
+
+        ensure_worker_running()
+        return {"inserted": len(by_id) - len(existing), "updated": len(existing)}
+
+    def iter_documents_for_export(self, batch_size=500):
+        """
+        Streams every document for a snapshot through a server-side cursor.
+
+        Rows carry `embedding` as a float list (None if missing), `metadata` as a dict
+        and `links` (outgoing edges) as [{"child_id", "kind"}]. Only `batch_size` rows
+        are held in memory at a time.
+        """
+        conn = self.pool.getconn()
+        try:
+            with conn.cursor(name="export_documents", cursor_factory=RealDictCursor) as cur:
+                cur.itersize = batch_size
+                cur.execute("""
+                    SELECT d.id::text AS id, d.title, d.category, d.level, d.metadata, d.content, d.created_at,
+                           d.embedding::float4[] AS embedding,
+                           COALESCE((
+                               SELECT json_agg(json_build_object('child_id', l.child_id::text, 'kind', l.kind)
+                                               ORDER BY l.created_at)
+                               FROM document_links l WHERE l.parent_id = d.id
+                           ), '[]'::json) AS links
+                    FROM documents d
+                    ORDER BY d.created_at, d.id
+                """)
+                for row in cur:
+                    yield row
+            conn.rollback()
+        finally:
+            self.pool.putconn(conn)
+
+    def import_documents(self, docs, with_embeddings=True, overwrite=True):
+        """
+        Bulk-loads snapshot rows (see `iter_documents_for_export`) with COPY.
+
+        Rows are COPYed into a temporary staging table and merged into `documents` in
+        one statement. Imported vectors are marked current (`embedding_hash`); pass
+        `with_embeddings=False` when they come from a different model/dimension, so
+        they are left NULL for a re-index. Links are not touched (`import_links`).
+        No processing tasks or chunk vectors are created (see `rebuild_chunks`).
+
+        Args:
+            overwrite (bool): Replace existing documents with the same id (else keep them).
+
+        Returns:
+            int: Number of documents inserted or updated (0 on failure).
+        """
+        if not docs:
+            return 0
         with self.get_conn() as conn:
             try:
                 with conn.cursor() as cur:
-                    # Add summary_id to source's summary_uuids
+                    conflict_sql = f"""
+                        DO UPDATE SET
+                            title = EXCLUDED.title,
+                            category = EXCLUDED.category,
+                            level = EXCLUDED.level,
+                            metadata = EXCLUDED.metadata,
+                            content = EXCLUDED.content,
+                            created_at = EXCLUDED.created_at,
+                            embedding = EXCLUDED.embedding,
+                            embedding_hash = EXCLUDED.embedding_hash{self._shadow_reset_sql(cur)}
+                    """ if overwrite else "DO NOTHING"
                     cur.execute("""
-                        UPDATE documents 
-                        SET summary_uuids = (
-                            SELECT jsonb_agg(DISTINCT value)
-                            FROM (
-                                SELECT jsonb_array_elements(COALESCE(summary_uuids, '[]'::jsonb)) AS value 
-                                FROM documents WHERE id = %s
-                                UNION ALL
-                                SELECT jsonb_build_array(%s::text)->0
-                            ) s
-                        )
-                        WHERE id = %s;
-                    """, (source_id, str(summary_id), source_id))
-                    
-                    # Add source_id to summary's source_uuids
+                        CREATE TEMP TABLE import_documents (
+                            id UUID, title TEXT, category TEXT, level TEXT, metadata JSONB, content TEXT,
+                            created_at TIMESTAMP WITH TIME ZONE, embedding REAL[]
+                        ) ON COMMIT DROP
+                    """)
+                    _copy_rows(cur, "import_documents",
+                               ["id", "title", "category", "level", "metadata", "content", "created_at", "embedding"],
+                               ((d['id'], d.get('title'), d['category'], d.get('level'),
+                                 json.dumps(d.get('metadata') or {}, ensure_ascii=False), d.get('content'),
+                                 d.get('created_at'), d.get('embedding') if with_embeddings else None)
+                                for d in docs))
+                    if overwrite:
+                        # Chunk vectors cut from content that is being replaced are stale
+                        cur.execute(f"""
+                            DELETE FROM document_chunks c USING import_documents i
+                            WHERE c.doc_id = i.id AND c.doc_hash IS DISTINCT FROM {_CONTENT_HASH_SQL.replace('content', 'i.content')}
+                        """)
+                    cur.execute(f"""
+                        INSERT INTO documents (id, title, category, level, metadata, content, created_at, embedding, embedding_hash)
+                        SELECT id, title, category, level, metadata, content, COALESCE(created_at, CURRENT_TIMESTAMP),
+                               embedding::vector,
+                               CASE WHEN embedding IS NULL THEN NULL ELSE {_CONTENT_HASH_SQL} END
+                        FROM import_documents
+                        ON CONFLICT (id) {conflict_sql}
+                    """)
+                    count = cur.rowcount
+                conn.commit()
+                return count
+            except Exception as e:
+                logger.error(f"Error importing documents: {e}")
+                conn.rollback()
+                return 0
+
+    def import_links(self, links):
+        """
+        Bulk-loads (parent_id, child_id, kind) edges with COPY.
+
+        Edges whose endpoints do not exist are skipped. Call this after all documents
+        of a snapshot are imported.
+
+        Returns:
+            int: Number of edges added.
+        """
+        if not links:
+            return 0
+        with self.get_conn() as conn:
+            try:
+                with conn.cursor() as cur:
+                    cur.execute("CREATE TEMP TABLE import_links (parent_id UUID, child_id UUID, kind TEXT) ON COMMIT DROP")
+                    _copy_rows(cur, "import_links", ["parent_id", "child_id", "kind"], links)
                     cur.execute("""
-                        UPDATE documents 
-                        SET source_uuids = (
-                            SELECT jsonb_agg(DISTINCT value)
-                            FROM (
-                                SELECT jsonb_array_elements(COALESCE(source_uuids, '[]'::jsonb)) AS value 
-                                FROM documents WHERE id = %s
-                                UNION ALL
-                                SELECT jsonb_build_array(%s::text)->0
-                            ) s
-                        )
-                        WHERE id = %s;
-                    """, (str(summary_id), source_id, str(summary_id)))
-                    
+                        INSERT INTO document_links (parent_id, child_id, kind)
+                        SELECT l.parent_id, l.child_id, COALESCE(l.kind, 'summary')
+                        FROM import_links l
+                        JOIN documents p ON p.id = l.parent_id
+                        JOIN documents c ON c.id = l.child_id
+                        ON CONFLICT DO NOTHING
+                    """)
+                    count = cur.rowcount
+                conn.commit()
+                return count
+            except Exception as e:
+                logger.error(f"Error importing links: {e}")
+                conn.rollback()
+                return 0
+
+    def link_documents(self, source_id, summary_id, kind='summary'):
+        with self.get_conn() as conn:
+            try:
+                with conn.cursor() as cur:
+                    cur.execute("""
+                        INSERT INTO document_links (parent_id, child_id, kind)
+                        VALUES (%s, %s, %s)
+                        ON CONFLICT DO NOTHING
+                    """, (str(source_id), str(summary_id), kind))
                 conn.commit()
                 return True
             except Exception as e:
@@ -258,19 +857,12 @@ class DBManager:
                 conn.rollback()
                 return False
 
-    def remove_summary_link(self, source_id, summary_id):
+    def remove_summary_link(self, source_id, summary_id, kind='summary'):
         with self.get_conn() as conn:
             try:
                 with conn.cursor() as cur:
-                    cur.execute("""
-                        UPDATE documents
-                        SET summary_uuids = (
-                            SELECT COALESCE(jsonb_agg(value), '[]'::jsonb)
-                            FROM jsonb_array_elements(summary_uuids) AS value
-                            WHERE value #>> '{}' != %s
-                        )
-                        WHERE id = %s;
-                    """, (str(summary_id), source_id))
+                    cur.execute("DELETE FROM document_links WHERE parent_id = %s AND child_id = %s AND kind = %s",
+                                (str(source_id), str(summary_id), kind))
                 conn.commit()
                 return True
             except Exception as e:
@@ -278,11 +870,11 @@ class DBManager:
                 conn.rollback()
                 return False
 
-    def clear_summary_links(self, source_id):
+    def clear_summary_links(self, source_id, kind='summary'):
         with self.get_conn() as conn:
             try:
                 with conn.cursor() as cur:
-                    cur.execute("UPDATE documents SET summary_uuids = '[]'::jsonb WHERE id = %s", (source_id,))
+                    cur.execute("DELETE FROM document_links WHERE parent_id = %s AND kind = %s", (str(source_id), kind))
                 conn.commit()
                 return True
             except Exception as e:
@@ -290,72 +882,67 @@ class DBManager:
                 conn.rollback()
                 return False
 
+    def get_children(self, doc_id, kind='summary'):
+        """Ids of documents linked below doc_id (e.g. its L1 summaries)."""
+        with self.get_conn() as conn:
+            with conn.cursor() as cur:
+                cur.execute("SELECT child_id FROM document_links WHERE parent_id = %s AND kind = %s ORDER BY created_at",
+                            (str(doc_id), kind))
+                return [r[0] for r in cur.fetchall()]
+
+    def get_parents(self, doc_id, kind='summary'):
+        """Ids of documents linked above doc_id (e.g. the L0 sources of an L1)."""
+        with self.get_conn() as conn:
+            with conn.cursor() as cur:
+                cur.execute("SELECT parent_id FROM document_links WHERE child_id = %s AND kind = %s ORDER BY created_at",
+                            (str(doc_id), kind))
+                return [r[0] for r in cur.fetchall()]
+
     def add_summary_link(self, parent_id, summary_id):
         return self.link_documents(parent_id, summary_id)
 
-    def get_impact_analysis(self, doc_id):
-        """Recursively finds all downstream documents that would be affected by deleting doc_id."""
-        impact_list = []
-        queue = [str(doc_id)]
-        visited = set()
+    # Descendants of a root document along summary links (L0 -> L1 -> L2 ...).
+    # UNION (not UNION ALL) de-duplicates rows, so cyclic links terminate.
+    _DESCENDANTS_CTE = """
+        WITH RECURSIVE tree AS (
+            SELECT %s::uuid AS id
+            UNION
+            SELECT l.child_id
+            FROM tree t
+            JOIN document_links l ON l.parent_id = t.id AND l.kind = 'summary'
+        )
+    """
 
+    def get_impact_analysis(self, doc_id):
+        """Finds all downstream documents that would be affected by deleting doc_id (one recursive query)."""
         with self.get_conn() as conn:
             with conn.cursor(cursor_factory=RealDictCursor) as cur:
-                while queue:
-                    current_id = queue.pop(0)
-                    if current_id in visited:
-                        continue
-                    visited.add(current_id)
-                    
-                    if current_id != str(doc_id): # Don't add the root doc itself to impact list (optional, but cleaner)
-                         # We'll re-fetch title/level for UI display
-                         cur.execute("SELECT id, title, level, category FROM documents WHERE id = %s", (current_id,))
-                         res = cur.fetchone()
-                         if res:
-                             impact_list.append(res)
-
-                    # Find children (documents where this doc is listed in source_uuids OR this doc lists them in summary_uuids)
-                    # We primarily follow summary_uuids as that's the L0->L1->L2 direction.
-                    cur.execute("SELECT summary_uuids FROM documents WHERE id = %s", (current_id,))
-                    row = cur.fetchone()
-                    if row and row.get('summary_uuids'):
-                        for child_id in row['summary_uuids']:
-                            if str(child_id) not in visited:
-                                queue.append(str(child_id))
-        
-        return impact_list
+                cur.execute(self._DESCENDANTS_CTE + """
+                    SELECT d.id, d.title, d.level, d.category
+                    FROM documents d
+                    WHERE d.id IN (SELECT id FROM tree) AND d.id != %s
+                    ORDER BY d.level, d.title
+                """, (str(doc_id), str(doc_id)))
+                return cur.fetchall()
 
     def delete_document(self, doc_id):
-        """Recursively deletes a document and all its downstream summaries."""
-        # 1. Get all descendants
-        impacts = self.get_impact_analysis(doc_id)
-        all_ids_to_delete = [str(doc_id)] + [str(i['id']) for i in impacts]
-        
+        """
+        Deletes a document and all its downstream summaries in one statement.
+
+        Tasks of the deleted documents are removed with them; their links (including
+        the parent's link to a deleted summary) go via ON DELETE CASCADE.
+        """
         with self.get_conn() as conn:
             try:
                 with conn.cursor() as cur:
-                    for target_id in all_ids_to_delete:
-                        # Cascade delete task first
-                        cur.execute("DELETE FROM processing_tasks WHERE doc_id = %s", (target_id,))
-                        cur.execute("DELETE FROM documents WHERE id = %s", (target_id,))
-                        # Also clean up references in other docs (e.g. if an L1 is deleted, remove it from L0's summary_uuids)
-                        # but since we are deleting the whole chain, checking upstream links is redundant for the chain itself.
-                        # However, for safety/cleanliness, we might want to ensure upstream links are clean?
-                        # Actually, if we delete L0, L1 is deleted. 
-                        # If we delete L1, we should remove L1 from L0.
-                        
-                    # Clean up upstream references for the ROOT document only (doc_id)
-                    # If we delete L1 (root of this op), we must remove it from its L0 parent.
-                    # This is tricky because we need to know who the parent was.
-                    # But remove_summary_link requires knowing the parent ID.
-                    # Simpler: After deleting, any `summary_uuids` pointing to these IDs will just point to non-existent docs.
-                    # We can leave them as "broken links" or try to clean them.
-                    # Given the current scope, broken links inside `summary_uuids` are benign but messy.
-                    # Let's try to clean up the parent of the *root* doc being deleted.
-                    
-                    # (Quick fetch parent before delete? - Already too late in this block if we just delete? No, we haven't committed yet)
-                    # Let's keep it simple: Just recursive delete for now. The standard update later will clean up if we edit the parent.
-                    
+                    cur.execute(self._DESCENDANTS_CTE + """
+                        , targets AS (
+                            SELECT array_agg(id) AS ids FROM tree
+                        ), deleted_tasks AS (
+                            DELETE FROM processing_tasks WHERE doc_id = ANY((SELECT ids FROM targets))
+                        )
+                        DELETE FROM documents WHERE id = ANY((SELECT ids FROM targets))
+                    """, (str(doc_id),))
                 conn.commit()
                 return True
             except Exception as e:
@@ -366,71 +953,581 @@ class DBManager:
     def get_document(self, doc_id):
         with self.get_conn() as conn:
             with conn.cursor(cursor_factory=RealDictCursor) as cur:
-                cur.execute("SELECT * FROM documents WHERE id = %s", (doc_id,))
+                cur.execute(f"SELECT d.*, {_link_arrays('d')} FROM documents d WHERE d.id = %s", (doc_id,))
                 return cur.fetchone()
 
-    def search_documents(self, query_text=None, category=None, level=None, doc_id=None, metadata_filters=None):
+    def _document_filters(self, query_text=None, category=None, level=None, doc_id=None, metadata_filters=None,
+                          no_task=False):
+        """Builds the shared WHERE clause (and params) for document listing/count queries."""
+        sql = " WHERE 1=1"
+        params = []
+        if doc_id:
+            sql += " AND id = %s"
+            params.append(doc_id)
+        if category:
+            sql += " AND category = %s"
+            params.append(category)
+        if level:
+            sql += " AND level = %s"
+            params.append(level)
+        if query_text:
+            sql += " AND content ILIKE %s"
+            params.append(f"%{query_text}%")
+        if metadata_filters:
+            for k, v in metadata_filters.items():
+                sql += " AND metadata->>%s = %s"
+                params.extend([k, str(v)])
+        if no_task:
+            sql += f" AND {_NO_TASK_SQL}"
+        return sql, params
+
+    def search_documents(self, query_text=None, category=None, level=None, doc_id=None, metadata_filters=None,
+                         limit=50, after=None, snippet_len=500, no_task=False):
+        """
+        Lists matching documents newest-first, one page at a time.
+
+        Only display columns are returned: no vectors, and `content` is replaced by
+        a `snippet` of `snippet_len` characters (use `get_document` for full text).
+
+        Pagination is keyset-based: pass the `(created_at, id)` of the last row of
+        the previous page as `after` to fetch the next page.
+
+        Each row carries its `task_status` (NULL without a task), joined for the
+        page only; `no_task=True` keeps only documents without a task.
+
+        Returns:
+            list: Rows with id, title, category, level, metadata, snippet,
+            summary_uuids, source_uuids, created_at, task_status.
+        """
+        where_sql, params = self._document_filters(query_text, category, level, doc_id, metadata_filters, no_task)
+        if after:
+            where_sql += " AND (created_at, id) < (%s, %s)"
+            params.extend([after[0], str(after[1])])
+
         with self.get_conn() as conn:
             with conn.cursor(cursor_factory=RealDictCursor) as cur:
-                sql = "SELECT * FROM documents WHERE 1=1"
-                params = []
-                
-                if doc_id:
-                    sql += " AND id = %s"
-                    params.append(doc_id)
-                if category:
-                    sql += " AND category = %s"
-                    params.append(category)
-                if level:
-                    sql += " AND level = %s"
-                    params.append(level)
-                if query_text:
-                    sql += " AND content ILIKE %s"
-                    params.append(f"%{query_text}%")
-                if metadata_filters:
-                    for k, v in metadata_filters.items():
-                        sql += " AND metadata->>%s = %s"
-                        params.extend([k, str(v)])
-                
-                sql += " ORDER BY created_at DESC"
-                cur.execute(sql, params)
+                sql = f"""
+                    SELECT page.*, t.status AS task_status FROM (
+                        SELECT id, title, category, level, metadata, LEFT(content, %s) AS snippet,
+                               {_link_arrays('documents')}, created_at
+                        FROM documents{where_sql}
+                        ORDER BY created_at DESC, id DESC
+                        LIMIT %s
+                    ) page
+                    LEFT JOIN processing_tasks t ON t.doc_id = page.id
+                    ORDER BY page.created_at DESC, page.id DESC
+                """
+                cur.execute(sql, [snippet_len] + params + [limit])
                 return cur.fetchall()
 
-    def vector_search(self, embedding, limit=5, category=None, level=None):
+    def count_documents(self, query_text=None, category=None, level=None, doc_id=None, metadata_filters=None,
+                        no_task=False):
+        """Total number of documents matching the `search_documents` filters."""
+        where_sql, params = self._document_filters(query_text, category, level, doc_id, metadata_filters, no_task)
         with self.get_conn() as conn:
-            with conn.cursor(cursor_factory=RealDictCursor) as cur:
-                sql = "SELECT *, 1 - (embedding <=> %s) AS cosine_similarity FROM documents"
-                params = [embedding]
-                
-                where_clauses = []
-                if category:
-                    where_clauses.append("category = %s")
-                    params.append(category)
-                if level:
-                    where_clauses.append("level = %s")
-                    params.append(level)
-                
-                if where_clauses:
-                    sql += " WHERE " + " AND ".join(where_clauses)
-                
-                sql += " ORDER BY embedding <=> %s LIMIT %s"
-                params.extend([embedding, limit])
-                
-                cur.execute(sql, params)
-                return cur.fetchall()
+            with conn.cursor() as cur:
+                cur.execute(f"SELECT COUNT(*) FROM documents{where_sql}", params)
+                return cur.fetchone()[0]
 
-    def enqueue_task(self, doc_id, config=None):
+    def _ensure_chunk_index(self, cur):
+        """HNSW index on chunk vectors (skipped while the dimension is unknown or too large)."""
+        cur.execute("""
+            SELECT atttypmod FROM pg_attribute
+            WHERE attrelid = 'document_chunks'::regclass AND attname = 'embedding' AND NOT attisdropped
+        """)
+        row = cur.fetchone()
+        if not row or row[0] <= 0 or row[0] > VECTOR_INDEX_MAX_DIM:
+            return
+        cur.execute(
+            "CREATE INDEX IF NOT EXISTS idx_chunks_embedding_hnsw ON document_chunks "
+            f"USING hnsw (embedding vector_cosine_ops) WITH (m = {int(self.vector_index['m'])}, "
+            f"ef_construction = {int(self.vector_index['ef_construction'])});"
+        )
+
+    def _reset_chunks(self, cur):
+        """
+        Drops all chunk vectors and retypes the column to the active embedding dimension.
+
+        Called whenever documents.embedding switches model/dimension; chunks are then
+        rebuilt with `rebuild_chunks` (search uses document vectors meanwhile).
+        """
+        cur.execute("TRUNCATE document_chunks;")
+        cur.execute("""
+            SELECT atttypmod FROM pg_attribute
+            WHERE attrelid = 'documents'::regclass AND attname = 'embedding' AND NOT attisdropped
+        """)
+        row = cur.fetchone()
+        if row and row[0] > 0:
+            cur.execute(f"ALTER TABLE document_chunks ALTER COLUMN embedding TYPE vector({int(row[0])});")
+        self._ensure_chunk_index(cur)
+
+    def _prepare_chunks(self, contents, embedder):
+        """
+        Chunks and encodes a set of documents for `_write_chunks`.
+
+        Documents no longer than `chunking.chunk_size` get no chunks (their document
+        vector already covers the whole text); documents whose stored chunks were cut
+        from the same content are skipped. All chunk texts are encoded in one
+        `encode_cached` call, so unchanged chunks are not re-encoded.
+
+        Args:
+            contents (dict): doc_id -> content.
+
+        Returns:
+            tuple: (doc ids whose chunks are replaced, chunk rows to insert)
+        """
+        cfg = self.chunking
+        size = int(cfg['chunk_size'])
+        hashes = {str(doc_id): content_hash(content) for doc_id, content in contents.items()}
+        with self.get_conn() as conn:
+            with conn.cursor() as cur:
+                cur.execute("""
+                    SELECT doc_id::text, doc_hash FROM document_chunks
+                    WHERE doc_id = ANY(%s::uuid[])
+                    GROUP BY doc_id, doc_hash
+                """, (list(hashes),))
+                existing = {}
+                for doc_id, doc_hash in cur.fetchall():
+                    existing.setdefault(doc_id, set()).add(doc_hash)
+            conn.rollback()
+
+        reset_ids, pending = [], []
+        for doc_id, content in contents.items():
+            doc_id = str(doc_id)
+            long_doc = cfg['enabled'] and content and len(content) > size
+            if long_doc and existing.get(doc_id) == {hashes[doc_id]}:
+                continue
+            if not long_doc and doc_id not in existing:
+                continue
+            reset_ids.append(doc_id)
+            if long_doc:
+                pending.extend((doc_id, i, c) for i, c in enumerate(split_markdown(content, size, int(cfg['overlap']))))
+
+        vectors = self.encode_cached(embedder, [c for _, _, c in pending]) if pending else []
+        rows = [(doc_id, i, c, v, hashes[doc_id]) for (doc_id, i, c), v in zip(pending, vectors)]
+        return reset_ids, rows
+
+    @staticmethod
+    def _write_chunks(cur, reset_ids, rows):
+        """Replaces the chunks of `reset_ids` with `rows` (caller commits)."""
+        if reset_ids:
+            cur.execute("DELETE FROM document_chunks WHERE doc_id = ANY(%s::uuid[])", (reset_ids,))
+        if rows:
+            execute_values(cur, """
+                INSERT INTO document_chunks (doc_id, chunk_index, content, embedding, doc_hash)
+                VALUES %s
+            """, rows, template="(%s, %s, %s, %s::float4[]::vector, %s)", page_size=500)
+
+    def sync_chunks(self, doc_id, content, embedder):
+        """
+        (Re)builds a document's chunk vectors if its content changed (see `_prepare_chunks`).
+
+        Returns:
+            int: Number of chunks stored for the document.
+        """
+        reset_ids, rows = self._prepare_chunks({str(doc_id): content}, embedder)
+        if not reset_ids:
+            with self.get_conn() as conn:
+                with conn.cursor() as cur:
+                    cur.execute("SELECT COUNT(*) FROM document_chunks WHERE doc_id = %s", (str(doc_id),))
+                    count = cur.fetchone()[0]
+                conn.rollback()
+            return count
         with self.get_conn() as conn:
             try:
                 with conn.cursor() as cur:
-                    cur.execute("""
-                        INSERT INTO processing_tasks (doc_id, status, config)
-                        VALUES (%s, 'created', %s)
-                        ON CONFLICT (doc_id) DO UPDATE SET
-                            status = 'created',
-                            config = EXCLUDED.config,
+                    self._write_chunks(cur, reset_ids, rows)
+                conn.commit()
+                return len(rows)
+            except Exception as e:
+                logger.error(f"Error storing chunks for {doc_id}: {e}")
+                conn.rollback()
+                return 0
+
+    def count_chunk_backlog(self):
+        """Long documents whose chunks are missing or were cut from different content."""
+        with self.get_conn() as conn:
+            with conn.cursor() as cur:
+                cur.execute(f"""
+                    SELECT COUNT(*) FROM documents d
+                    WHERE length(d.content) > %s
+                      AND NOT EXISTS (
+                          SELECT 1 FROM document_chunks c
+                          WHERE c.doc_id = d.id AND c.doc_hash = {_CONTENT_HASH_SQL.replace('content', 'd.content')}
+                      )
+                """, (int(self.chunking['chunk_size']),))
+                return cur.fetchone()[0]
+
+    def rebuild_chunks(self, embedder, progress_callback=None):
+        """
+        Chunks every long document whose chunks are missing or stale.
+
+        Returns:
+            int: Number of documents (re)chunked.
+        """
+        if not self.chunking['enabled']:
+            return 0
+        with self.get_conn() as conn:
+            with conn.cursor() as cur:
+                cur.execute(f"""
+                    SELECT d.id FROM documents d
+                    WHERE length(d.content) > %s
+                      AND NOT EXISTS (
+                          SELECT 1 FROM document_chunks c
+                          WHERE c.doc_id = d.id AND c.doc_hash = {_CONTENT_HASH_SQL.replace('content', 'd.content')}
+                      )
+                    ORDER BY d.id
+                """, (int(self.chunking['chunk_size']),))
+                doc_ids = [r[0] for r in cur.fetchall()]
+        batch_size = 32
+        for start in range(0, len(doc_ids), batch_size):
+            batch = [str(d) for d in doc_ids[start:start + batch_size]]
+            with self.get_conn() as conn:
+                with conn.cursor() as cur:
+                    cur.execute("SELECT id::text, content FROM documents WHERE id = ANY(%s::uuid[])", (batch,))
+                    contents = dict(cur.fetchall())
+                conn.rollback()
+            # One encode call and one transaction per batch of documents
+            reset_ids, rows = self._prepare_chunks(contents, embedder)
+            with self.get_conn() as conn:
+                try:
+                    with conn.cursor() as cur:
+                        self._write_chunks(cur, reset_ids, rows)
+                    conn.commit()
+                except Exception as e:
+                    logger.error(f"Error storing chunks: {e}")
+                    conn.rollback()
+            if progress_callback:
+                progress_callback(min(start + batch_size, len(doc_ids)), len(doc_ids))
+        return len(doc_ids)
+
+    def _vector_search_chunks(self, embedding, limit, category, level, ef_search, probes, aggregate):
+        """
+        Chunk-aware search: long documents are matched through their chunk vectors,
+        short (unchunked) ones through their document vector, and hits are aggregated
+        per document ('max' = best chunk, 'sum' = rewards several matching chunks).
+        """
+        filters, filter_params = [], []
+        if category:
+            filters.append("d.category = %s")
+            filter_params.append(category)
+        if level:
+            filters.append("d.level = %s")
+            filter_params.append(level)
+        filter_sql = "".join(f" AND {f}" for f in filters)
+        candidates = max(int(self.chunking['candidates']), limit * 4)
+        score_sql = "SUM(1 - distance)" if aggregate == 'sum' else "MAX(1 - distance)"
+
+        sql = f"""
+            WITH hits AS (
+                (SELECT c.doc_id, c.embedding <=> %s::vector AS distance
+                 FROM document_chunks c JOIN documents d ON d.id = c.doc_id
+                 WHERE c.embedding IS NOT NULL{filter_sql}
+                 ORDER BY distance LIMIT %s)
+                UNION ALL
+                (SELECT d.id AS doc_id, d.embedding <=> %s::vector AS distance
+                 FROM documents d
+                 WHERE d.embedding IS NOT NULL{filter_sql}
+                   AND NOT EXISTS (SELECT 1 FROM document_chunks c WHERE c.doc_id = d.id)
+                 ORDER BY distance LIMIT %s)
+            ), agg AS (
+                SELECT doc_id, MIN(distance) AS distance, {score_sql} AS score, COUNT(*) AS matched_chunks
+                FROM hits GROUP BY doc_id
+            )
+            SELECT d.id, d.title, d.category, d.level, d.metadata, d.content, d.created_at,
+                   a.distance, 1 - a.distance AS cosine_similarity, a.score, a.matched_chunks,
+                   {_link_arrays('d')}
+            FROM agg a JOIN documents d ON d.id = a.doc_id
+            ORDER BY a.score DESC
+            LIMIT %s
+        """
+        params = [embedding, *filter_params, candidates, embedding, *filter_params, candidates, limit]
+        with self.get_conn() as conn:
+            with conn.cursor(cursor_factory=RealDictCursor) as cur:
+                self._apply_ann_settings(cur, bool(filters), candidates, ef_search, probes)
+                cur.execute(sql, params)
+                rows = cur.fetchall()
+            conn.rollback()
+            return rows
+
+    def vector_search(self, embedding, limit=5, category=None, level=None, column='embedding', ef_search=None, probes=None,
+                      aggregate=None):
+        """
+        Cosine-similarity search over one of the vector columns.
+
+        `column` selects which vectors to search (see EMBEDDING_COLUMNS); the query
+        embedding must come from the model recorded for that column's slot.
+
+        The inner `ORDER BY <=> LIMIT` is what lets the planner use the HNSW/IVFFlat
+        index. With category/level filters the index alone can return fewer than
+        `limit` rows (it filters *after* the ANN scan), so:
+        - pgvector >= 0.8: iterative index scans keep scanning until enough rows
+          pass the filter (`relaxed_order`, re-sorted by the outer query).
+        - older pgvector: ef_search/probes are raised for filtered queries, and
+          level filters can hit the optional per-level partial indexes.
+
+        Args:
+            ef_search (int, optional): hnsw.ef_search override (config default otherwise).
+            probes (int, optional): ivfflat.probes override (config default otherwise).
+            aggregate (str, optional): 'max' or 'sum' chunk aggregation for the active column
+                (`chunking.aggregate` by default; 'none' searches document vectors only).
+        """
+        if column not in EMBEDDING_COLUMNS:
+            raise ValueError(f"Unknown embedding column: {column}")
+        aggregate = aggregate or self.chunking['aggregate']
+        if column == 'embedding' and self.chunking['enabled'] and aggregate in ('max', 'sum'):
+            return self._vector_search_chunks(embedding, limit, category, level, ef_search, probes, aggregate)
+
+        where_clauses = [f"{column} IS NOT NULL"]
+        params = [embedding]
+        if category:
+            where_clauses.append("category = %s")
+            params.append(category)
+        if level:
+            where_clauses.append("level = %s")
+            params.append(level)
+        params.append(limit)
+        filtered = bool(category or level)
+
+        sql = f"""
+            SELECT ranked.*, 1 - distance AS cosine_similarity, {_link_arrays('ranked')} FROM (
+                SELECT *, {column} <=> %s::vector AS distance
+                FROM documents
+                WHERE {" AND ".join(where_clauses)}
+                ORDER BY distance
+                LIMIT %s
+            ) ranked
+            ORDER BY distance
+        """
+
+        with self.get_conn() as conn:
+            with conn.cursor(cursor_factory=RealDictCursor) as cur:
+                self._apply_ann_settings(cur, filtered, limit, ef_search, probes)
+                cur.execute(sql, params)
+                rows = cur.fetchall()
+            conn.rollback()
+            return rows
+
+    def _apply_ann_settings(self, cur, filtered, limit, ef_search=None, probes=None):
+        """Sets transaction-local ANN tuning (reset when the transaction ends)."""
+        ef_search = int(ef_search or self.vector_index['ef_search'])
+        probes = int(probes or self.vector_index['probes'])
+        iterative = self.pgvector_version >= (0, 8, 0)
+        if filtered and not iterative:
+            ef_search = max(ef_search, limit * 10)
+            probes = probes * 4
+
+        cur.execute("SELECT set_config('hnsw.ef_search', %s, true), set_config('ivfflat.probes', %s, true)",
+                    (str(ef_search), str(probes)))
+        if filtered and iterative:
+            cur.execute("SELECT set_config('hnsw.iterative_scan', 'relaxed_order', true), "
+                        "set_config('ivfflat.iterative_scan', 'relaxed_order', true)")
+
+    def hybrid_search(self, query_text, embedding=None, limit=20, category=None, level=None, rrf_k=60, candidates=50,
+                      snippet_len=500, no_task=False):
+        """
+        Keyword + vector retrieval fused with Reciprocal Rank Fusion (RRF).
+
+        - Keyword leg: every whitespace-separated term must appear in title or
+          content (ILIKE, served by the pg_trgm GIN indexes), ranked by trigram
+          `word_similarity`. Character trigrams handle Korean text without a
+          tokenizer, including particles attached to words.
+          Skipped when the pg_trgm extension is not available (`has_trgm`).
+        - Vector leg: ANN search over `embedding` (skipped if `embedding` is None).
+        - Fusion: score = sum over legs of 1 / (rrf_k + rank); each leg contributes
+          its top `candidates` rows.
+
+        Returns:
+            list: Document rows projected like `search_documents` (snippet, no vectors,
+            task_status) with `score`, `keyword_rank` and `vector_rank` (NULL when the
+            document was not found by that leg). `no_task=True` filters both legs to
+            documents without a task.
+        """
+        terms = [t for t in (query_text or "").split() if t] if self.has_trgm else []
+        if not terms and embedding is None:
+            return []
+
+        filter_sql = ""
+        filter_params = []
+        if category:
+            filter_sql += " AND category = %s"
+            filter_params.append(category)
+        if level:
+            filter_sql += " AND level = %s"
+            filter_params.append(level)
+        if no_task:
+            filter_sql += f" AND {_NO_TASK_SQL}"
+
+        legs = []
+        params = []
+        if terms:
+            term_sql = " AND ".join(["(title ILIKE %s OR content ILIKE %s)"] * len(terms))
+            legs.append(f"""
+                SELECT id, 'kw' AS leg, ROW_NUMBER() OVER (ORDER BY score DESC, created_at DESC) AS rnk
+                FROM (
+                    SELECT id, created_at,
+                           GREATEST(word_similarity(%s, COALESCE(title, '')), word_similarity(%s, content)) AS score
+                    FROM documents
+                    WHERE {term_sql}{filter_sql}
+                    ORDER BY score DESC, created_at DESC
+                    LIMIT %s
+                ) kw
+            """)
+            q = " ".join(terms)
+            params += [q, q]
+            for t in terms:
+                params += [f"%{t}%", f"%{t}%"]
+            params += filter_params + [candidates]
+        if embedding is not None:
+            legs.append(f"""
+                SELECT id, 'vec' AS leg, ROW_NUMBER() OVER (ORDER BY dist) AS rnk
+                FROM (
+                    SELECT id, embedding <=> %s::vector AS dist
+                    FROM documents
+                    WHERE embedding IS NOT NULL{filter_sql}
+                    ORDER BY dist
+                    LIMIT %s
+                ) vec
+            """)
+            params += [embedding] + filter_params + [candidates]
+
+        sql = f"""
+            WITH ranked AS ({" UNION ALL ".join(legs)}),
+            fused AS (
+                SELECT id,
+                       SUM(1.0 / (%s + rnk)) AS score,
+                       MIN(rnk) FILTER (WHERE leg = 'kw') AS keyword_rank,
+                       MIN(rnk) FILTER (WHERE leg = 'vec') AS vector_rank
+                FROM ranked
+                GROUP BY id
+            )
+            SELECT d.id, d.title, d.category, d.level, d.metadata, LEFT(d.content, %s) AS snippet,
+                   {_link_arrays('d')}, d.created_at,
+                   f.score, f.keyword_rank, f.vector_rank, t.status AS task_status
+            FROM fused f
+            JOIN documents d ON d.id = f.id
+            LEFT JOIN processing_tasks t ON t.doc_id = d.id
+            ORDER BY f.score DESC
+            LIMIT %s
+        """
+        params += [rrf_k, snippet_len, limit]
+
+        with self.get_conn() as conn:
+            with conn.cursor(cursor_factory=RealDictCursor) as cur:
+                if embedding is not None:
+                    self._apply_ann_settings(cur, bool(category or level or no_task), candidates)
+                cur.execute(sql, params)
+                rows = cur.fetchall()
+            conn.rollback()
+            return rows
+
+    def _vector_index_name(self, column, method, level=None):
+        suffix = f"_{level.lower()}" if level else ""
+        return f"idx_docs_{column}_{method}{suffix}"
+
+    def get_vector_indexes(self):
+        """Lists the ANN indexes on `documents` (name, definition, size, valid)."""
+        with self.get_conn() as conn:
+            with conn.cursor(cursor_factory=RealDictCursor) as cur:
+                cur.execute("""
+                    SELECT i.indexname AS name, i.indexdef AS definition,
+                           pg_size_pretty(pg_relation_size(quote_ident(i.indexname)::regclass)) AS size,
+                           x.indisvalid AS valid
+                    FROM pg_indexes i
+                    JOIN pg_index x ON x.indexrelid = quote_ident(i.indexname)::regclass
+                    WHERE i.tablename = 'documents' AND (i.indexdef ILIKE '% USING hnsw %' OR i.indexdef ILIKE '% USING ivfflat %')
+                    ORDER BY i.indexname
+                """)
+                return cur.fetchall()
+
+    def ensure_vector_index(self, column='embedding', rebuild=False):
+        """
+        Creates the configured ANN index (plus optional per-level partial indexes) on a vector column.
+
+        Uses `CREATE INDEX CONCURRENTLY` so writes are not blocked while the index
+        builds. A failed concurrent build leaves an INVALID index behind, which
+        `IF NOT EXISTS` would count as present; invalid indexes are dropped and
+        rebuilt. With `rebuild=True`, existing ANN indexes on the column are dropped
+        first (e.g. after changing `vector_index` settings or an IVFFlat build on
+        a much smaller table).
+
+        Called from the Settings tab and after re-index/schema migrations only.
+
+        Returns:
+            bool: True if the index exists afterwards, False otherwise.
+        """
+        if column not in EMBEDDING_COLUMNS:
+            raise ValueError(f"Unknown embedding column: {column}")
+        dim = self.get_embedding_dim(column)
+        if not dim:
+            return False
+        if dim > VECTOR_INDEX_MAX_DIM:
+            logger.warning(f"{column} has {dim} dimensions (> {VECTOR_INDEX_MAX_DIM}); skipping ANN index, search will scan.")
+            return False
+
+        cfg = self.vector_index
+        method = cfg['method'] if cfg['method'] in ('hnsw', 'ivfflat') else 'hnsw'
+        if method == 'hnsw':
+            with_clause = f"WITH (m = {int(cfg['m'])}, ef_construction = {int(cfg['ef_construction'])})"
+        else:
+            with_clause = f"WITH (lists = {int(cfg['lists'])})"
+
+        targets = [(self._vector_index_name(column, method), "")]
+        for lvl in cfg.get('partial_levels') or []:
+            if lvl in ('L0', 'L1', 'L2', 'L3'):
+                targets.append((self._vector_index_name(column, method, lvl), f" WHERE level = '{lvl}'"))
+
+        with self.get_conn() as conn:
+            old_autocommit = conn.autocommit
+            try:
+                # CONCURRENTLY cannot run inside a transaction block
+                conn.autocommit = True
+                with conn.cursor() as cur:
+                    if rebuild:
+                        cur.execute("""
+                            SELECT indexname FROM pg_indexes
+                            WHERE tablename = 'documents' AND indexname LIKE %s
+                        """, (f"idx_docs_{column}_%",))
+                        for (name,) in cur.fetchall():
+                            # Don't let 'embedding' match 'embedding_shadow'/'embedding_previous'
+                            if name.startswith(f"idx_docs_{column}_hnsw") or name.startswith(f"idx_docs_{column}_ivfflat"):
+                                cur.execute(f"DROP INDEX CONCURRENTLY IF EXISTS {name};")
+                    cur.execute("""
+                        SELECT c.relname FROM pg_index x JOIN pg_class c ON c.oid = x.indexrelid
+                        WHERE x.indrelid = 'documents'::regclass AND NOT x.indisvalid AND c.relname = ANY(%s)
+                    """, ([name for name, _ in targets],))
+                    for (name,) in cur.fetchall():
+                        logger.warning(f"Dropping invalid vector index {name} (failed build) before rebuilding it.")
+                        cur.execute(f"DROP INDEX CONCURRENTLY IF EXISTS {name};")
+                    for name, where in targets:
+                        cur.execute(
+                            f"CREATE INDEX CONCURRENTLY IF NOT EXISTS {name} "
+                            f"ON documents USING {method} ({column} vector_cosine_ops) {with_clause}{where};"
+                        )
+                return True
+            except Exception as e:
+                logger.error(f"Error creating vector index on {column}: {e}")
+                return False
+            finally:
+                conn.autocommit = old_autocommit
+
+    def enqueue_task(self, doc_id, config=None):
+        with self.get_conn() as conn:
+            try:
+                with conn.cursor() as cur:
+                    cur.execute("""
+                        INSERT INTO processing_tasks (doc_id, status, config)
+                        VALUES (%s, 'created', %s)
+                        ON CONFLICT (doc_id) DO UPDATE SET
+                            status = 'created',
+                            config = EXCLUDED.config,
+                            attempts = 0,
+                            last_error = NULL,
+                            next_attempt_at = NULL,
+                            queued_at = CURRENT_TIMESTAMP,
                             updated_at = CURRENT_TIMESTAMP;
                     """, (doc_id, Json(config or {})))
+                    self._notify_task(cur, 'created')
                 conn.commit()
                 # Trigger worker check/start
                 ensure_worker_running()
@@ -440,12 +1537,25 @@ class DBManager:
                 conn.rollback()
                 return False
 
-    def update_task(self, doc_id, status=None, results=None, config=None, results_l=None, results_r=None):
+    def update_task(self, doc_id, status=None, results=None, config=None, results_l=None, results_r=None, claimed_by=None):
+        """
+        Updates a task's status/results.
+
+        When `claimed_by` is given the update is fenced: it only applies if that
+        worker still holds the claim (its lease was not expired and re-claimed by
+        another worker), and it releases the claim.
+
+        A status change starts the new stage fresh (attempt counter and backoff reset);
+        failed attempts go through `fail_task` instead.
+
+        Returns:
+            bool: True if a row was updated.
+        """
         sql = "UPDATE processing_tasks SET updated_at = CURRENT_TIMESTAMP"
         params = []
         
         if status:
-            sql += ", status = %s"
+            sql += ", status = %s, attempts = 0, last_error = NULL, next_attempt_at = NULL, queued_at = CURRENT_TIMESTAMP"
             params.append(status)
         if results:
             sql += ", results = %s"
@@ -460,19 +1570,519 @@ class DBManager:
             sql += ", results_model_r = %s"
             params.append(Json(results_r))
             
+        if claimed_by:
+            sql += ", claimed_by = NULL, lease_expires_at = NULL"
+            
         sql += " WHERE doc_id = %s"
         params.append(str(doc_id))
+        if claimed_by:
+            sql += " AND claimed_by = %s"
+            params.append(claimed_by)
         
         with self.get_conn() as conn:
             with conn.cursor() as cur:
                 cur.execute(sql, tuple(params))
+                updated = cur.rowcount > 0
+                if updated and status:
+                    self._notify_task(cur, status)
+            conn.commit()
+        return updated
+
+    @staticmethod
+    def _notify_task(cur, status):
+        """Queues a NOTIFY on the task channel; delivered to listeners when the transaction commits."""
+        cur.execute("SELECT pg_notify(%s, %s)", (TASK_CHANNEL, status))
+
+    def listen_tasks(self):
+        """
+        Opens a dedicated (non-pooled, autocommit) connection that LISTENs on the task channel.
+
+        Call this *before* checking the queue: notifications sent while the caller
+        is busy are buffered on the connection and returned by the next `wait_for_tasks`.
+        """
+        self.close_task_listener()
+        conn = psycopg2.connect(**self.conn_params)
+        conn.set_session(autocommit=True)
+        with conn.cursor() as cur:
+            cur.execute(f"LISTEN {TASK_CHANNEL};")
+        self._listen_conn = conn
+
+    def close_task_listener(self):
+        conn = getattr(self, '_listen_conn', None)
+        self._listen_conn = None
+        if conn is not None:
+            try:
+                conn.close()
+            except Exception:
+                pass
+
+    def wait_for_tasks(self, timeout):
+        """
+        Blocks until a task notification arrives or `timeout` seconds pass.
+
+        Returns:
+            list: Statuses carried by the received notifications (empty on timeout).
+                  If the listener connection is lost it is re-opened and ['reconnect']
+                  is returned so the caller re-checks the queue.
+        """
+        try:
+            if getattr(self, '_listen_conn', None) is None or self._listen_conn.closed:
+                self.listen_tasks()
+                return ['reconnect']
+            conn = self._listen_conn
+            conn.poll()
+            if not conn.notifies and select.select([conn], [], [], timeout) != ([], [], []):
+                conn.poll()
+            statuses = [n.payload for n in conn.notifies]
+            conn.notifies.clear()
+            return statuses
+        except Exception as e:
+            logger.error(f"Task listener error: {e}")
+            self.close_task_listener()
+            time.sleep(min(timeout, 5))  # avoid a hot loop while the DB is unreachable
+            return ['reconnect']
+
+    def claim_tasks(self, from_status, to_status, worker_id, limit=1, lease_seconds=1800):
+        """
+        Atomically claims up to `limit` tasks for one worker.
+
+        `FOR UPDATE SKIP LOCKED` lets any number of workers (on any machine) claim
+        concurrently without blocking each other or double-claiming a task. The
+        claim carries a lease; tasks whose lease expires (crashed worker) are
+        returned to their queue by `requeue_expired_leases`.
+
+        Each claim is recorded as a 'claimed' task event whose duration is the time
+        the task waited in `from_status` (since it was queued, or since its retry
+        became due).
+
+        Returns:
+            list: The claimed task rows (already in `to_status`).
+        """
+        with self.get_conn() as conn:
+            try:
+                with conn.cursor(cursor_factory=RealDictCursor) as cur:
+                    cur.execute("""
+                        WITH claimed AS (
+                            UPDATE processing_tasks
+                            SET status = %s,
+                                claimed_by = %s,
+                                lease_expires_at = CURRENT_TIMESTAMP + make_interval(secs => %s),
+                                claimed_at = CURRENT_TIMESTAMP,
+                                updated_at = CURRENT_TIMESTAMP
+                            WHERE doc_id IN (
+                                SELECT doc_id FROM processing_tasks
+                                WHERE status = %s
+                                  AND (next_attempt_at IS NULL OR next_attempt_at <= CURRENT_TIMESTAMP)
+                                ORDER BY created_at ASC
+                                FOR UPDATE SKIP LOCKED
+                                LIMIT %s
+                            )
+                            RETURNING *
+                        ), events AS (
+                            INSERT INTO task_events (doc_id, event, stage, worker_id, duration_ms)
+                            SELECT doc_id, 'claimed', %s, %s,
+                                   EXTRACT(EPOCH FROM claimed_at - GREATEST(queued_at, COALESCE(next_attempt_at, queued_at))) * 1000
+                            FROM claimed
+                        )
+                        SELECT * FROM claimed
+                    """, (to_status, worker_id, lease_seconds, from_status, limit, from_status, worker_id))
+                    claimed = cur.fetchall()
+                conn.commit()
+                return claimed
+            except Exception as e:
+                logger.error(f"Error claiming tasks ({from_status}): {e}")
+                conn.rollback()
+                return []
+
+    def seconds_until_next_retry(self, status):
+        """
+        Seconds until the earliest backoff in `status` expires (retries are not announced
+        by NOTIFY), or None if no task in `status` is waiting for one.
+        """
+        with self.get_conn() as conn:
+            with conn.cursor() as cur:
+                cur.execute("""
+                    SELECT EXTRACT(EPOCH FROM MIN(next_attempt_at) - CURRENT_TIMESTAMP)
+                    FROM processing_tasks
+                    WHERE status = %s AND next_attempt_at > CURRENT_TIMESTAMP
+                """, (status,))
+                row = cur.fetchone()
+            conn.rollback()
+        return max(float(row[0]), 0.0) if row and row[0] is not None else None
+
+    def renew_leases(self, doc_ids, worker_id, lease_seconds=1800):
+        """Extends the leases of claims held by `worker_id`. Returns the number of leases renewed."""
+        if not doc_ids:
+            return 0
+        with self.get_conn() as conn:
+            with conn.cursor() as cur:
+                cur.execute("""
+                    UPDATE processing_tasks
+                    SET lease_expires_at = CURRENT_TIMESTAMP + make_interval(secs => %s)
+                    WHERE doc_id = ANY(%s::uuid[]) AND claimed_by = %s
+                """, (lease_seconds, [str(d) for d in doc_ids], worker_id))
+                renewed = cur.rowcount
+            conn.commit()
+        return renewed
+
+    def fail_task(self, doc_id, worker_id, retry_status, error, max_attempts=5, backoff_base=30, backoff_max=1800):
+        """
+        Records a failed attempt of a claimed task.
+
+        The task goes back to `retry_status` with `next_attempt_at` set by exponential
+        backoff with jitter (base * 2^attempts, capped at `backoff_max`, then scaled by a
+        random 0.5-1.0 factor so failed tasks don't retry in lockstep). After
+        `max_attempts` it is parked in the dead-letter state 'failed' until retried
+        from the Batch tab.
+
+        Returns:
+            str: The task's new status ('failed' or `retry_status`), or None if the
+                 worker no longer held the claim.
+        """
+        with self.get_conn() as conn:
+            try:
+                with conn.cursor() as cur:
+                    cur.execute("""
+                        UPDATE processing_tasks
+                        SET attempts = COALESCE(attempts, 0) + 1,
+                            last_error = %s,
+                            status = CASE WHEN COALESCE(attempts, 0) + 1 >= %s THEN 'failed' ELSE %s END,
+                            next_attempt_at = CURRENT_TIMESTAMP + make_interval(secs =>
+                                LEAST(%s, %s * power(2, COALESCE(attempts, 0))) * (0.5 + random() / 2)),
+                            queued_at = CURRENT_TIMESTAMP,
+                            claimed_by = NULL,
+                            lease_expires_at = NULL,
+                            updated_at = CURRENT_TIMESTAMP
+                        WHERE doc_id = %s AND claimed_by = %s
+                        RETURNING status
+                    """, (str(error)[:2000], max_attempts, retry_status, backoff_max, backoff_base, str(doc_id), worker_id))
+                    row = cur.fetchone()
+                conn.commit()
+                return row[0] if row else None
+            except Exception as e:
+                logger.error(f"Error recording task failure: {e}")
+                conn.rollback()
+                return None
+
+    def retry_failed_tasks(self, doc_ids=None):
+        """
+        Returns 'failed' tasks to their queue with a fresh attempt budget.
+
+        Tasks that already have Stage 1 results resume at Queue 2.
+
+        Returns:
+            int: Number of tasks re-queued.
+        """
+        sql = """
+            UPDATE processing_tasks
+            SET status = CASE WHEN results_model_l IS NOT NULL THEN 'queued_r' ELSE 'queued' END,
+                attempts = 0,
+                last_error = NULL,
+                next_attempt_at = NULL,
+                queued_at = CURRENT_TIMESTAMP,
+                updated_at = CURRENT_TIMESTAMP
+            WHERE status = 'failed'
+        """
+        params = []
+        if doc_ids:
+            sql += " AND doc_id = ANY(%s::uuid[])"
+            params.append([str(d) for d in doc_ids])
+        with self.get_conn() as conn:
+            with conn.cursor() as cur:
+                cur.execute(sql, tuple(params))
+                count = cur.rowcount
+                if count:
+                    self._notify_task(cur, 'requeued')
             conn.commit()
+        return count
+
+    def requeue_expired_leases(self, max_attempts=5):
+        """
+        Returns in-flight tasks whose lease expired (or that predate leases) to their queue.
+
+        An expired lease counts as a failed attempt, so a document that keeps crashing
+        workers ends up 'failed' instead of cycling forever.
+
+        Returns:
+            int: Number of tasks re-queued.
+        """
+        with self.get_conn() as conn:
+            with conn.cursor() as cur:
+                cur.execute("""
+                    UPDATE processing_tasks
+                    SET status = CASE
+                            WHEN lease_expires_at IS NOT NULL AND COALESCE(attempts, 0) + 1 >= %s THEN 'failed'
+                            WHEN status = 'processing_r' THEN 'queued_r'
+                            WHEN status = 'processing' AND results_model_l IS NOT NULL THEN 'queued_r'
+                            ELSE 'queued'
+                        END,
+                        attempts = COALESCE(attempts, 0) + CASE WHEN lease_expires_at IS NOT NULL THEN 1 ELSE 0 END,
+                        last_error = CASE WHEN lease_expires_at IS NOT NULL THEN 'Lease expired (worker died or stalled)' ELSE last_error END,
+                        queued_at = CURRENT_TIMESTAMP,
+                        claimed_by = NULL,
+                        lease_expires_at = NULL,
+                        updated_at = CURRENT_TIMESTAMP
+                    WHERE status IN ('processing_l', 'processing_r', 'processing')
+                      AND (lease_expires_at IS NULL OR lease_expires_at < CURRENT_TIMESTAMP)
+                """, (max_attempts,))
+                count = cur.rowcount
+                if count:
+                    self._notify_task(cur, 'requeued')
+            conn.commit()
+        return count
+
+    def log_task_event(self, doc_id, event, stage=None, model=None, kind=None, worker_id=None, duration_ms=None,
+                       prompt_tokens=None, completion_tokens=None, cached=False):
+        """
+        Appends one worker telemetry row to `task_events`.
+
+        Events written by the worker: 'llm_call' (one request: latency, token usage,
+        cache hit), 'finished' / 'failed' (one stage of a task, duration since claim).
+        'claimed' events (queue wait) are written by `claim_tasks`.
+        Telemetry must never break processing, so errors are only logged.
+        """
+        with self.get_conn() as conn:
+            try:
+                with conn.cursor() as cur:
+                    cur.execute("""
+                        INSERT INTO task_events (doc_id, event, stage, model, kind, worker_id, duration_ms,
+                                                 prompt_tokens, completion_tokens, cached)
+                        VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
+                    """, (str(doc_id) if doc_id else None, event, stage, model, kind, worker_id, duration_ms,
+                          prompt_tokens, completion_tokens, cached))
+                conn.commit()
+            except Exception as e:
+                logger.error(f"Error logging task event ({event}): {e}")
+                conn.rollback()
+
+    def get_task_stats(self, window_minutes=60):
+        """
+        Worker telemetry aggregated over the last `window_minutes`.
+
+        Returns:
+            dict:
+                "stages": [{stage, finished, failed, docs_per_hour, p50_ms, p90_ms}]
+                    per claim stage ('queued' = Queue 1, 'queued_r' = Queue 2), durations
+                    from claim to finish.
+                "queue_wait": [{stage, claims, p50_ms, p90_ms, max_ms}] time spent waiting in each queue.
+                "models": [{model, kind, calls, cache_hits, p50_ms, p90_ms, p99_ms,
+                    prompt_tokens, completion_tokens, tokens_per_sec}] per model and request kind
+                    (latency percentiles and tokens/sec over real requests, cache hits excluded).
+                "hosts": [{host, calls, completion_tokens, tokens_per_sec}] generation
+                    throughput per worker host over the window.
+        """
+        window = (window_minutes,)
+        stats = {}
+        with self.get_conn() as conn:
+            with conn.cursor(cursor_factory=RealDictCursor) as cur:
+                cur.execute("""
+                    SELECT stage,
+                           COUNT(*) FILTER (WHERE event = 'finished') AS finished,
+                           COUNT(*) FILTER (WHERE event = 'failed') AS failed,
+                           COUNT(*) FILTER (WHERE event = 'finished') * 60.0 / %s AS docs_per_hour,
+                           percentile_cont(0.5) WITHIN GROUP (ORDER BY duration_ms) FILTER (WHERE event = 'finished') AS p50_ms,
+                           percentile_cont(0.9) WITHIN GROUP (ORDER BY duration_ms) FILTER (WHERE event = 'finished') AS p90_ms
+                    FROM task_events
+                    WHERE event IN ('finished', 'failed')
+                      AND created_at > CURRENT_TIMESTAMP - make_interval(mins => %s)
+                    GROUP BY stage ORDER BY stage
+                """, (window_minutes,) + window)
+                stats["stages"] = cur.fetchall()
+
+                cur.execute("""
+                    SELECT stage, COUNT(*) AS claims,
+                           percentile_cont(0.5) WITHIN GROUP (ORDER BY duration_ms) AS p50_ms,
+                           percentile_cont(0.9) WITHIN GROUP (ORDER BY duration_ms) AS p90_ms,
+                           MAX(duration_ms) AS max_ms
+                    FROM task_events
+                    WHERE event = 'claimed'
+                      AND created_at > CURRENT_TIMESTAMP - make_interval(mins => %s)
+                    GROUP BY stage ORDER BY stage
+                """, window)
+                stats["queue_wait"] = cur.fetchall()
+
+                cur.execute("""
+                    SELECT model, kind, COUNT(*) AS calls,
+                           COUNT(*) FILTER (WHERE cached) AS cache_hits,
+                           percentile_cont(0.5) WITHIN GROUP (ORDER BY duration_ms) FILTER (WHERE NOT cached) AS p50_ms,
+                           percentile_cont(0.9) WITHIN GROUP (ORDER BY duration_ms) FILTER (WHERE NOT cached) AS p90_ms,
+                           percentile_cont(0.99) WITHIN GROUP (ORDER BY duration_ms) FILTER (WHERE NOT cached) AS p99_ms,
+                           SUM(prompt_tokens) AS prompt_tokens,
+                           SUM(completion_tokens) AS completion_tokens,
+                           SUM(completion_tokens) / NULLIF(SUM(duration_ms) FILTER (WHERE NOT cached AND completion_tokens IS NOT NULL), 0) * 1000
+                               AS tokens_per_sec
+                    FROM task_events
+                    WHERE event = 'llm_call'
+                      AND created_at > CURRENT_TIMESTAMP - make_interval(mins => %s)
+                    GROUP BY model, kind ORDER BY model, kind
+                """, window)
+                stats["models"] = cur.fetchall()
+
+                cur.execute("""
+                    SELECT split_part(worker_id, ':', 1) AS host,
+                           COUNT(*) FILTER (WHERE NOT cached) AS calls,
+                           COALESCE(SUM(completion_tokens), 0) AS completion_tokens,
+                           COALESCE(SUM(completion_tokens), 0) / (%s * 60.0) AS tokens_per_sec
+                    FROM task_events
+                    WHERE event = 'llm_call'
+                      AND created_at > CURRENT_TIMESTAMP - make_interval(mins => %s)
+                    GROUP BY host ORDER BY host
+                """, (window_minutes,) + window)
+                stats["hosts"] = cur.fetchall()
+        return stats
+
+    def prune_task_events(self, retention_days=30):
+        """Deletes telemetry older than `retention_days`. Returns the number of rows removed."""
+        with self.get_conn() as conn:
+            with conn.cursor() as cur:
+                cur.execute("DELETE FROM task_events WHERE created_at < CURRENT_TIMESTAMP - make_interval(days => %s)",
+                            (int(retention_days),))
+                count = cur.rowcount
+            conn.commit()
+        return count
+
+    def worker_heartbeat(self, worker_id, host, pid, slot=None, status='idle', current_tasks=None):
+        """Upserts a worker's heartbeat row (status: 'idle', 'busy' or 'draining')."""
+        with self.get_conn() as conn:
+            try:
+                with conn.cursor() as cur:
+                    cur.execute("""
+                        INSERT INTO worker_heartbeats (worker_id, host, pid, slot, status, current_tasks)
+                        VALUES (%s, %s, %s, %s, %s, %s::uuid[])
+                        ON CONFLICT (worker_id) DO UPDATE SET
+                            status = EXCLUDED.status,
+                            current_tasks = EXCLUDED.current_tasks,
+                            last_beat = CURRENT_TIMESTAMP
+                    """, (worker_id, host, pid, slot, status, [str(t) for t in (current_tasks or [])]))
+                conn.commit()
+                return True
+            except Exception as e:
+                logger.error(f"Error writing heartbeat for {worker_id}: {e}")
+                conn.rollback()
+                return False
+
+    def remove_worker_heartbeat(self, worker_id):
+        with self.get_conn() as conn:
+            with conn.cursor() as cur:
+                cur.execute("DELETE FROM worker_heartbeats WHERE worker_id = %s", (worker_id,))
+            conn.commit()
+
+    def get_worker_heartbeats(self, host=None):
+        """
+        Heartbeat rows (optionally of one host) with `age_seconds` since the last beat.
+        """
+        sql = """
+            SELECT *, EXTRACT(EPOCH FROM CURRENT_TIMESTAMP - last_beat) AS age_seconds
+            FROM worker_heartbeats
+        """
+        params = []
+        if host:
+            sql += " WHERE host = %s"
+            params.append(host)
+        sql += " ORDER BY host, slot, worker_id"
+        with self.get_conn() as conn:
+            with conn.cursor(cursor_factory=RealDictCursor) as cur:
+                cur.execute(sql, params)
+                return cur.fetchall()
+
+    def prune_worker_heartbeats(self, max_age_seconds=3600):
+        """Removes heartbeat rows of workers that stopped beating long ago (e.g. killed hosts)."""
+        with self.get_conn() as conn:
+            with conn.cursor() as cur:
+                cur.execute("DELETE FROM worker_heartbeats WHERE last_beat < CURRENT_TIMESTAMP - make_interval(secs => %s)",
+                            (max_age_seconds,))
+                count = cur.rowcount
+            conn.commit()
+        return count
+
+    def get_llm_cache(self, cache_key):
+        """Cached LLM result for `cache_key` (or None). Counts the hit."""
+        with self.get_conn() as conn:
+            try:
+                with conn.cursor() as cur:
+                    cur.execute("""
+                        UPDATE llm_cache SET hits = hits + 1, last_hit_at = CURRENT_TIMESTAMP
+                        WHERE cache_key = %s
+                        RETURNING result
+                    """, (cache_key,))
+                    row = cur.fetchone()
+                conn.commit()
+                return row[0]['value'] if row else None
+            except Exception as e:
+                logger.error(f"Error reading LLM cache: {e}")
+                conn.rollback()
+                return None
+
+    def put_llm_cache(self, cache_key, kind, model, result):
+        """Stores (or replaces, e.g. after a cache-bypassing re-sample) an LLM result."""
+        with self.get_conn() as conn:
+            try:
+                with conn.cursor() as cur:
+                    cur.execute("""
+                        INSERT INTO llm_cache (cache_key, kind, model, result)
+                        VALUES (%s, %s, %s, %s)
+                        ON CONFLICT (cache_key) DO UPDATE SET
+                            result = EXCLUDED.result,
+                            created_at = CURRENT_TIMESTAMP
+                    """, (cache_key, kind, model, Json({"value": result})))
+                conn.commit()
+            except Exception as e:
+                logger.error(f"Error writing LLM cache: {e}")
+                conn.rollback()
+
     def get_tasks_by_status(self, status):
         with self.get_conn() as conn:
             with conn.cursor(cursor_factory=RealDictCursor) as cur:
                 cur.execute("SELECT * FROM processing_tasks WHERE status = %s ORDER BY created_at ASC", (status,))
                 return cur.fetchall()
 
+    def queue_summary(self):
+        """
+        Task counts per status from a single GROUP BY (no task rows are fetched).
+
+        Returns:
+            dict: {status: count}; statuses without tasks are absent.
+        """
+        with self.get_conn() as conn:
+            with conn.cursor() as cur:
+                cur.execute("SELECT status, COUNT(*) FROM processing_tasks GROUP BY status")
+                return dict(cur.fetchall())
+
+    def list_tasks(self, statuses=None, limit=50, after=None):
+        """
+        Lightweight task listing for dashboards.
+
+        Projects only what the lists display (no result blobs or prompt config):
+        doc_id, status, filename, attempts, next_attempt_at, last_error, created_at.
+        Ordered by (created_at, doc_id); pass the `(created_at, doc_id)` of the last
+        row as `after` to fetch the next page.
+
+        Args:
+            statuses (list, optional): Only tasks in these statuses.
+            limit (int): Page size.
+            after (tuple, optional): Keyset cursor from the previous page.
+        """
+        where_clauses, params = [], []
+        if statuses:
+            where_clauses.append("status = ANY(%s)")
+            params.append(list(statuses))
+        if after:
+            where_clauses.append("(created_at, doc_id) > (%s, %s)")
+            params.extend([after[0], str(after[1])])
+        where_sql = f"WHERE {' AND '.join(where_clauses)}" if where_clauses else ""
+        params.append(limit)
+        with self.get_conn() as conn:
+            with conn.cursor(cursor_factory=RealDictCursor) as cur:
+                cur.execute(f"""
+                    SELECT doc_id, status, COALESCE(config->>'filename', doc_id::text) AS filename,
+                           attempts, next_attempt_at, last_error, created_at
+                    FROM processing_tasks
+                    {where_sql}
+                    ORDER BY created_at, doc_id
+                    LIMIT %s
+                """, params)
+                return cur.fetchall()
+
     def get_task(self, doc_id):
         with self.get_conn() as conn:
             with conn.cursor(cursor_factory=RealDictCursor) as cur:
@@ -486,11 +2096,15 @@ class DBManager:
                 return {str(t['doc_id']): t for t in cur.fetchall()}
 
     def get_documents_by_ids(self, doc_ids):
+        """Batch fetch (full content, no vectors) keyed by id string."""
         if not doc_ids:
             return {}
         with self.get_conn() as conn:
             with conn.cursor(cursor_factory=RealDictCursor) as cur:
-                cur.execute("SELECT * FROM documents WHERE id IN %s", (tuple(doc_ids),))
+                cur.execute(f"""
+                    SELECT id, title, category, level, metadata, content, {_link_arrays('documents')}, created_at
+                    FROM documents WHERE id IN %s
+                """, (tuple(doc_ids),))
                 return {str(d['id']): d for d in cur.fetchall()}
 
     def delete_task(self, doc_id):
@@ -518,10 +2132,25 @@ class DBManager:
                 conn.rollback()
                 return False
 
+    def get_embedding_dim(self, column='embedding'):
+        """Returns the declared dimension of a documents vector column (vector typmod), or None."""
+        with self.get_conn() as conn:
+            with conn.cursor() as cur:
+                cur.execute("""
+                    SELECT atttypmod FROM pg_attribute
+                    WHERE attrelid = 'documents'::regclass AND attname = %s AND NOT attisdropped
+                """, (column,))
+                row = cur.fetchone()
+                return row[0] if row and row[0] > 0 else None
+
     def migrate_embedding_schema(self, new_dim):
         """
         Alters the embedding column to match the new dimension of the selected model.
         
+        In-place: search is broken until re-embedding finishes. Prefer the shadow
+        migration (`begin_shadow_migration` -> re-index job -> `swap_shadow_embeddings`)
+        when switching models on a live knowledge base.
+        
         CRITICAL DATABASE OPERATION:
         1. This runs `ALTER TABLE ... TYPE vector(new_dim)`.
         2. If the dimensions differ (e.g., changing from 384 to 768), Postgres may 
@@ -541,33 +2170,425 @@ class DBManager:
                     # Using string interpolation for DDL statement (cannot use parameters for ALTER TABLE)
                     # This is safe because new_dim is derived from the model instance, not user input.
                     cur.execute(f"ALTER TABLE documents ALTER COLUMN embedding TYPE vector({new_dim});")
+                    cur.execute("""
+                        UPDATE embedding_versions SET dim = %s, updated_at = CURRENT_TIMESTAMP WHERE slot = 'active'
+                    """, (new_dim,))
+                    self._reset_chunks(cur)
                 conn.commit()
-                return True
             except Exception as e:
                 logger.error(f"Error migrating schema_embedding: {e}")
                 conn.rollback()
                 return False
+        # ALTER TYPE rebuilds existing indexes; make sure one exists for the new dimension
+        self.ensure_vector_index('embedding')
+        return True
+
+    def get_embedding_versions(self):
+        """Returns {slot: {model_name, dim, updated_at}} for the 'active', 'shadow' and 'previous' slots."""
+        with self.get_conn() as conn:
+            with conn.cursor(cursor_factory=RealDictCursor) as cur:
+                cur.execute("SELECT * FROM embedding_versions")
+                return {r['slot']: r for r in cur.fetchall()}
+
+    def get_active_embedding_model(self):
+        """Name of the model whose vectors are in `documents.embedding` (None if unknown)."""
+        try:
+            active = self.get_embedding_versions().get('active')
+            return active['model_name'] if active else None
+        except Exception as e:
+            logger.error(f"Error reading embedding versions: {e}")
+            return None
+
+    def begin_shadow_migration(self, model_name, new_dim):
+        """
+        Starts a zero-downtime model migration by (re)creating `embedding_shadow`.
 
-    def reindex_all_documents(self, embedder, progress_callback=None):
+        Search keeps serving `embedding` while a re-index job with
+        target_column='embedding_shadow' fills the shadow column. Any previous
+        unfinished shadow build is discarded.
+
+        Returns:
+            bool: True if successful, False otherwise.
+        """
+        with self.get_conn() as conn:
+            try:
+                with conn.cursor() as cur:
+                    cur.execute("ALTER TABLE documents DROP COLUMN IF EXISTS embedding_shadow;")
+                    cur.execute("ALTER TABLE documents DROP COLUMN IF EXISTS embedding_shadow_hash;")
+                    # new_dim is derived from the model instance, not user input
+                    cur.execute(f"ALTER TABLE documents ADD COLUMN embedding_shadow vector({int(new_dim)});")
+                    # Content hash each shadow vector was computed from (becomes embedding_hash on swap)
+                    cur.execute("ALTER TABLE documents ADD COLUMN embedding_shadow_hash CHAR(64);")
+                    cur.execute("""
+                        INSERT INTO embedding_versions (slot, model_name, dim)
+                        VALUES ('shadow', %s, %s)
+                        ON CONFLICT (slot) DO UPDATE SET
+                            model_name = EXCLUDED.model_name,
+                            dim = EXCLUDED.dim,
+                            updated_at = CURRENT_TIMESTAMP;
+                    """, (model_name, new_dim))
+                    cur.execute("""
+                        UPDATE reindex_jobs SET status = 'cancelled', updated_at = CURRENT_TIMESTAMP
+                        WHERE target_column = 'embedding_shadow' AND status IN ('pending', 'running', 'failed')
+                    """)
+                conn.commit()
+                return True
+            except Exception as e:
+                logger.error(f"Error starting shadow migration: {e}")
+                conn.rollback()
+                return False
+
+    def count_missing_shadow_embeddings(self):
+        """Documents that still need a (fresh) shadow vector before the swap is allowed."""
+        with self.get_conn() as conn:
+            with conn.cursor() as cur:
+                cur.execute(f"SELECT COUNT(*) FROM documents WHERE content IS NOT NULL AND {_SHADOW_STALE_SQL}")
+                return cur.fetchone()[0]
+
+    def swap_shadow_embeddings(self):
+        """
+        Atomically promotes `embedding_shadow` to `embedding`.
+
+        The old vectors are kept as `embedding_previous` (for side-by-side comparison
+        and rollback) until `finalize_embedding_migration` drops them. Column renames
+        are transactional in Postgres, so readers see either the old or the new
+        vectors, never a mix. The content hashes move along with their vectors, and
+        the swap is refused while any shadow vector is missing or was computed from
+        content that has since changed.
+
+        Returns:
+            tuple: (bool success, str message)
+        """
+        with self.get_conn() as conn:
+            try:
+                with conn.cursor() as cur:
+                    cur.execute("SELECT 1 FROM embedding_versions WHERE slot = 'shadow'")
+                    if not cur.fetchone():
+                        return False, "No shadow migration in progress."
+                    cur.execute("LOCK TABLE documents IN ACCESS EXCLUSIVE MODE;")
+                    cur.execute(f"SELECT COUNT(*) FROM documents WHERE content IS NOT NULL AND {_SHADOW_STALE_SQL}")
+                    missing = cur.fetchone()[0]
+                    if missing:
+                        conn.rollback()
+                        return False, (f"{missing} document(s) have no shadow vector for their current content. "
+                                       "Run the shadow job again to backfill.")
+
+                    cur.execute("ALTER TABLE documents DROP COLUMN IF EXISTS embedding_previous;")
+                    cur.execute("ALTER TABLE documents DROP COLUMN IF EXISTS embedding_previous_hash;")
+                    cur.execute("ALTER TABLE documents RENAME COLUMN embedding TO embedding_previous;")
+                    cur.execute("ALTER TABLE documents RENAME COLUMN embedding_hash TO embedding_previous_hash;")
+                    cur.execute("ALTER TABLE documents RENAME COLUMN embedding_shadow TO embedding;")
+                    cur.execute("ALTER TABLE documents RENAME COLUMN embedding_shadow_hash TO embedding_hash;")
+                    self._rename_vector_indexes(cur, 'embedding', 'embedding_previous')
+                    self._rename_vector_indexes(cur, 'embedding_shadow', 'embedding')
+
+                    cur.execute("DELETE FROM embedding_versions WHERE slot = 'previous'")
+                    cur.execute("UPDATE embedding_versions SET slot = 'previous', updated_at = CURRENT_TIMESTAMP WHERE slot = 'active'")
+                    cur.execute("UPDATE embedding_versions SET slot = 'active', updated_at = CURRENT_TIMESTAMP WHERE slot = 'shadow'")
+                    # Chunk vectors belong to the old model
+                    self._reset_chunks(cur)
+                conn.commit()
+                return True, "Shadow embeddings are now active. Previous vectors kept for comparison/rollback."
+            except Exception as e:
+                logger.error(f"Error swapping shadow embeddings: {e}")
+                conn.rollback()
+                return False, f"Swap failed: {e}"
+
+    def _rename_vector_indexes(self, cur, old_column, new_column):
+        """Keeps ANN index names in step with column renames (idx_docs_<column>_<method>[_<level>])."""
+        cur.execute("""
+            SELECT indexname FROM pg_indexes
+            WHERE tablename = 'documents' AND (indexname LIKE %s OR indexname LIKE %s)
+        """, (f"idx_docs_{old_column}_hnsw%", f"idx_docs_{old_column}_ivfflat%"))
+        for (name,) in cur.fetchall():
+            new_name = f"idx_docs_{new_column}_" + name[len(f"idx_docs_{old_column}_"):]
+            cur.execute(f"ALTER INDEX {name} RENAME TO {new_name};")
+
+    def rollback_embedding_migration(self):
+        """
+        Undoes the current migration step.
+
+        - Shadow build in progress: drops `embedding_shadow` (search was never affected).
+        - Already swapped: swaps `embedding` and `embedding_previous` back. Documents
+          written after the swap have no previous vector and need a re-index.
+
+        Returns:
+            tuple: (bool success, str message)
+        """
+        with self.get_conn() as conn:
+            try:
+                with conn.cursor() as cur:
+                    cur.execute("SELECT slot FROM embedding_versions")
+                    slots = {r[0] for r in cur.fetchall()}
+
+                    if 'shadow' in slots:
+                        cur.execute("ALTER TABLE documents DROP COLUMN IF EXISTS embedding_shadow;")
+                        cur.execute("ALTER TABLE documents DROP COLUMN IF EXISTS embedding_shadow_hash;")
+                        self._drop_embedding_cache(cur, 'shadow')
+                        cur.execute("DELETE FROM embedding_versions WHERE slot = 'shadow'")
+                        cur.execute("""
+                            UPDATE reindex_jobs SET status = 'cancelled', updated_at = CURRENT_TIMESTAMP
+                            WHERE target_column = 'embedding_shadow' AND status IN ('pending', 'running', 'failed')
+                        """)
+                        conn.commit()
+                        return True, "Shadow build discarded."
+
+                    if 'previous' in slots:
+                        cur.execute("LOCK TABLE documents IN ACCESS EXCLUSIVE MODE;")
+                        cur.execute("ALTER TABLE documents RENAME COLUMN embedding TO embedding_rollback_tmp;")
+                        cur.execute("ALTER TABLE documents RENAME COLUMN embedding_previous TO embedding;")
+                        cur.execute("ALTER TABLE documents RENAME COLUMN embedding_rollback_tmp TO embedding_previous;")
+                        # Previous vectors are current only for documents unchanged since the swap
+                        cur.execute("ALTER TABLE documents ADD COLUMN IF NOT EXISTS embedding_previous_hash CHAR(64);")
+                        cur.execute("ALTER TABLE documents RENAME COLUMN embedding_hash TO embedding_hash_rollback_tmp;")
+                        cur.execute("ALTER TABLE documents RENAME COLUMN embedding_previous_hash TO embedding_hash;")
+                        cur.execute("ALTER TABLE documents RENAME COLUMN embedding_hash_rollback_tmp TO embedding_previous_hash;")
+                        self._rename_vector_indexes(cur, 'embedding', 'embedding_rollback_tmp')
+                        self._rename_vector_indexes(cur, 'embedding_previous', 'embedding')
+                        self._rename_vector_indexes(cur, 'embedding_rollback_tmp', 'embedding_previous')
+                        cur.execute("UPDATE embedding_versions SET slot = 'rollback_tmp' WHERE slot = 'active'")
+                        cur.execute("UPDATE embedding_versions SET slot = 'active', updated_at = CURRENT_TIMESTAMP WHERE slot = 'previous'")
+                        cur.execute("UPDATE embedding_versions SET slot = 'previous', updated_at = CURRENT_TIMESTAMP WHERE slot = 'rollback_tmp'")
+                        self._reset_chunks(cur)
+                        cur.execute("SELECT COUNT(*) FROM documents WHERE content IS NOT NULL AND embedding IS NULL")
+                        missing = cur.fetchone()[0]
+                        conn.commit()
+                        msg = "Rolled back to the previous embeddings."
+                        if missing:
+                            msg += f" {missing} document(s) added after the swap need re-indexing."
+                        return True, msg
+
+                    return False, "Nothing to roll back."
+            except Exception as e:
+                logger.error(f"Error rolling back embedding migration: {e}")
+                conn.rollback()
+                return False, f"Rollback failed: {e}"
+
+    def finalize_embedding_migration(self):
+        """Drops `embedding_previous` (and the retired model's cached vectors) once the new vectors have been accepted."""
+        with self.get_conn() as conn:
+            try:
+                with conn.cursor() as cur:
+                    cur.execute("ALTER TABLE documents DROP COLUMN IF EXISTS embedding_previous;")
+                    cur.execute("ALTER TABLE documents DROP COLUMN IF EXISTS embedding_previous_hash;")
+                    self._drop_embedding_cache(cur, 'previous')
+                    cur.execute("DELETE FROM embedding_versions WHERE slot = 'previous'")
+                conn.commit()
+                return True
+            except Exception as e:
+                logger.error(f"Error finalizing embedding migration: {e}")
+                conn.rollback()
+                return False
+
+    def get_reindex_job(self, job_id=None):
+        """Returns the given re-index job, or the most recent one if job_id is None."""
+        with self.get_conn() as conn:
+            with conn.cursor(cursor_factory=RealDictCursor) as cur:
+                if job_id is None:
+                    cur.execute("SELECT * FROM reindex_jobs ORDER BY id DESC LIMIT 1")
+                else:
+                    cur.execute("SELECT * FROM reindex_jobs WHERE id = %s", (job_id,))
+                return cur.fetchone()
+
+    def start_reindex_job(self, model_name, new_dim, batch_size=64, target_column='embedding'):
+        """
+        Creates a re-index job, or resumes the unfinished one for the same model.
+
+        If the column's declared dimension differs from `new_dim`, the schema is
+        migrated here, before any document is touched.
+
+        Args:
+            model_name (str): Name of the embedding model (for bookkeeping).
+            new_dim (int): Embedding dimension produced by the model.
+            batch_size (int): Number of documents encoded and written per checkpoint.
+            target_column (str): 'embedding' (in place) or 'embedding_shadow'. Shadow
+                jobs only cover documents without a shadow vector for their current
+                content, so a new job after uploads/edits during the migration just
+                backfills the gap.
+
+        Returns:
+            int: The job id, or None if the job could not be created.
+        """
+        if target_column not in ('embedding', 'embedding_shadow'):
+            raise ValueError(f"Invalid re-index target: {target_column}")
+        shadow = target_column == 'embedding_shadow'
+        with self.get_conn() as conn:
+            try:
+                with conn.cursor(cursor_factory=RealDictCursor) as cur:
+                    cur.execute("""
+                        SELECT id FROM reindex_jobs
+                        WHERE status IN ('pending', 'running', 'failed')
+                          AND model_name = %s AND dim = %s AND target_column = %s
+                        ORDER BY id DESC LIMIT 1
+                    """, (model_name, new_dim, target_column))
+                    existing = cur.fetchone()
+                    if existing:
+                        cur.execute("""
+                            UPDATE reindex_jobs
+                            SET status = 'pending', batch_size = %s, error = NULL, updated_at = CURRENT_TIMESTAMP
+                            WHERE id = %s
+                        """, (batch_size, existing['id']))
+                        job_id = existing['id']
+                        logger.info(f"Resuming re-index job {job_id} for {model_name}")
+                    else:
+                        cur.execute(
+                            "SELECT COUNT(*) AS cnt FROM documents WHERE content IS NOT NULL"
+                            + (f" AND {_SHADOW_STALE_SQL}" if shadow else "")
+                        )
+                        total = cur.fetchone()['cnt']
+                        cur.execute("""
+                            INSERT INTO reindex_jobs (status, model_name, dim, batch_size, total, target_column)
+                            VALUES ('pending', %s, %s, %s, %s, %s)
+                            RETURNING id
+                        """, (model_name, new_dim, batch_size, total, target_column))
+                        job_id = cur.fetchone()['id']
+                conn.commit()
+            except Exception as e:
+                logger.error(f"Error creating re-index job: {e}")
+                conn.rollback()
+                return None
+
+        if shadow:
+            if self.get_embedding_dim('embedding_shadow') != new_dim:
+                self._update_reindex_job(job_id, status='failed', error="Shadow column missing or wrong dimension.")
+                return None
+        elif self.get_embedding_dim() != new_dim and not self.migrate_embedding_schema(new_dim):
+            self._update_reindex_job(job_id, status='failed', error="Schema migration failed.")
+            return None
+        return job_id
+
+    def _update_reindex_job(self, job_id, **fields):
+        sets = ", ".join(f"{k} = %s" for k in fields)
+        with self.get_conn() as conn:
+            with conn.cursor() as cur:
+                cur.execute(
+                    f"UPDATE reindex_jobs SET {sets}, updated_at = CURRENT_TIMESTAMP WHERE id = %s",
+                    tuple(fields.values()) + (job_id,)
+                )
+            conn.commit()
+
+    def run_reindex_job(self, job_id, embedder):
+        """
+        Executes a re-index job until all documents are re-embedded.
+
+        Documents are streamed in id order through a server-side cursor, encoded in
+        batches of `batch_size`, and written with one bulk UPDATE per batch. Each
+        batch is committed together with the job's `last_doc_id` checkpoint, so a
+        crashed or interrupted job resumes right after the last committed batch.
+
+        Progress is reported through the `reindex_jobs` row (see `get_reindex_job`).
+        When an in-place job re-embeds with a model other than the active one, the
+        'active' embedding version is switched to it on success and the chunk vectors
+        (still from the old model) are reset and rebuilt.
+
+        Returns:
+            tuple: (bool success, str message)
+        """
+        job = self.get_reindex_job(job_id)
+        if not job:
+            return False, f"Re-index job {job_id} not found."
+
+        target = job.get('target_column') or 'embedding'
+        if target not in ('embedding', 'embedding_shadow'):
+            return False, f"Invalid re-index target: {target}"
+        # Shadow jobs skip documents whose shadow vector matches their content
+        pending_filter = f" AND {_SHADOW_STALE_SQL}" if target == 'embedding_shadow' else ""
+        # In-place jobs with an unchanged model skip vectors that match their content
+        same_model = target == 'embedding' and job['model_name'] == self.get_active_embedding_model()
+        current_filter = (f"(embedding IS NOT NULL AND embedding_hash = {_CONTENT_HASH_SQL}) AS is_current"
+                          if same_model else "false AS is_current")
+        batch_size = job['batch_size'] or 64
+        processed = job['processed'] or 0
+        self._update_reindex_job(job_id, status='running', error=None)
+        logger.info(f"Running re-index job {job_id} from checkpoint {job['last_doc_id']}")
+
+        read_conn = self.pool.getconn()
+        try:
+            with self.get_conn() as write_conn:
+                # Named cursor => server-side, rows are fetched `itersize` at a time
+                with read_conn.cursor(name=f"reindex_job_{job_id}", cursor_factory=RealDictCursor) as read_cur:
+                    read_cur.itersize = batch_size * 4
+                    if job['last_doc_id']:
+                        read_cur.execute(
+                            f"SELECT id, content, {current_filter} FROM documents WHERE content IS NOT NULL{pending_filter} AND id > %s ORDER BY id",
+                            (job['last_doc_id'],)
+                        )
+                    else:
+                        read_cur.execute(f"SELECT id, content, {current_filter} FROM documents WHERE content IS NOT NULL{pending_filter} ORDER BY id")
+
+                    while True:
+                        batch = read_cur.fetchmany(batch_size)
+                        if not batch:
+                            break
+
+                        stale = [d for d in batch if not d['is_current']]
+                        embeddings = self.encode_cached(embedder, [d['content'] for d in stale], batch_size=batch_size)
+                        rows = [(str(d['id']), emb, content_hash(d['content'])) for d, emb in zip(stale, embeddings)]
+                        processed += len(batch)
+
+                        with write_conn.cursor() as cur:
+                            if rows:
+                                execute_values(cur, f"""
+                                    UPDATE documents AS d SET {target} = v.emb::vector, {target}_hash = v.hash
+                                    FROM (VALUES %s) AS v(id, emb, hash)
+                                    WHERE d.id = v.id::uuid
+                                """, rows, template="(%s, %s::float4[], %s)", page_size=batch_size)
+                            cur.execute("""
+                                UPDATE reindex_jobs
+                                SET processed = %s, last_doc_id = %s, updated_at = CURRENT_TIMESTAMP
+                                WHERE id = %s
+                            """, (processed, str(batch[-1]['id']), job_id))
+                        write_conn.commit()
+            read_conn.rollback()
+        except Exception as e:
+            logger.error(f"Re-index job {job_id} failed: {e}")
+            read_conn.rollback()
+            self._update_reindex_job(job_id, status='failed', error=str(e))
+            return False, f"Re-index failed after {processed} documents: {e}"
+        finally:
+            self.pool.putconn(read_conn)
+
+        if target == 'embedding' and not same_model and (job['model_name'] or 'unknown').lower() != 'unknown':
+            with self.get_conn() as conn:
+                try:
+                    with conn.cursor() as cur:
+                        cur.execute("""
+                            UPDATE embedding_versions SET model_name = %s, dim = %s, updated_at = CURRENT_TIMESTAMP
+                            WHERE slot = 'active'
+                        """, (job['model_name'], job['dim']))
+                        self._reset_chunks(cur)
+                    conn.commit()
+                    logger.info(f"Active embedding model is now {job['model_name']}.")
+                except Exception as e:
+                    logger.error(f"Error recording the active embedding model: {e}")
+                    conn.rollback()
+                    self._update_reindex_job(job_id, status='failed', error=f"Could not record the active model: {e}")
+                    return False, f"Vectors re-embedded, but the active model could not be recorded: {e}"
+
+        # Build the ANN index after the bulk load (much faster than maintaining it per row)
+        self.ensure_vector_index(target)
+        if target == 'embedding':
+            self.rebuild_chunks(embedder)
+        self._update_reindex_job(job_id, status='done')
+        return True, f"Successfully re-indexed {processed}/{job['total']} documents."
+
+    def reindex_all_documents(self, embedder, model_name=None, batch_size=64):
         """
         Re-calculates embeddings for ALL documents using the provided embedder.
         
-        Process:
+        Synchronous convenience wrapper around the job API:
         1. Dimension Check: Gets the dimension from the new model.
-        2. Schema Migration: Alters the DB column to match this dimension.
-        3. Fetch Docs: Loads all documents (id, content).
-        4. Re-Embed: Generates new vectors for each document.
-        5. Update DB: Saves the new vectors back to the 'documents' table.
+        2. Job: Creates (or resumes) a `reindex_jobs` row; migrates the schema if needed.
+        3. Run: Streams, batch-encodes and bulk-updates documents with checkpoints.
         
         Args:
             embedder (SentenceTransformer): The loaded embedding model instance.
-            progress_callback (function, optional): Callback(current, total) for UI updates.
+            model_name (str, optional): Model name recorded on the job.
+            batch_size (int): Documents per encode/write checkpoint.
             
         Returns:
             tuple: (bool success, str message)
         """
-        
-        # 1. Get new dimension
         try:
             # sentence-transformers model.get_sentence_embedding_dimension()
             new_dim = embedder.get_sentence_embedding_dimension()
@@ -576,39 +2597,8 @@ class DBManager:
             new_dim = 384
             
         logger.info(f"Starting Re-indexing. New Dimension: {new_dim}")
-        
-        # 2. Migrate Schema
-        if not self.migrate_embedding_schema(new_dim):
-            return False, "Schema migration failed."
-            
-        # 3. Fetch all documents
-        docs = []
-        with self.get_conn() as conn:
-            with conn.cursor(cursor_factory=RealDictCursor) as cur:
-                cur.execute("SELECT id, content FROM documents WHERE content IS NOT NULL")
-                docs = cur.fetchall()
-        
-        total = len(docs)
-        logger.info(f"Found {total} documents to re-index.")
-        
-        if progress_callback:
-            progress_callback(0, total)
-            
-        success_count = 0
-        
-        # 4. Process (Batching could be optimized for huge datasets)
-        with self.get_conn() as conn:
-            with conn.cursor() as cur:
-                for i, doc in enumerate(docs):
-                    try:
-                        embedding = embedder.encode(doc['content']).tolist()
-                        cur.execute("UPDATE documents SET embedding = %s WHERE id = %s", (embedding, doc['id']))
-                        success_count += 1
-                    except Exception as e:
-                        logger.error(f"Failed to re-embed doc {doc['id']}: {e}")
-                    
-                    if progress_callback and i % 5 == 0:
-                        progress_callback(i + 1, total)
-            conn.commit()
-            
-        return True, f"Successfully re-indexed {success_count}/{total} documents."
+        model_name = model_name or getattr(embedder, 'model_name_or_path', None) or "unknown"
+        job_id = self.start_reindex_job(str(model_name), new_dim, batch_size)
+        if job_id is None:
+            return False, "Could not create re-index job."
+        return self.run_reindex_job(job_id, embedder)
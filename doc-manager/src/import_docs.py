@@ -0,0 +1,169 @@
+"""
+Bulk Markdown Importer
+----------------------
+Imports a directory tree or a .zip archive of Markdown files (e.g. an existing note
+vault) through the same path as the Upload tab (`DBManager.bulk_ingest`): documents
+are embedded in batches and queued as 'created' tasks (Pending Config in the Batch tab).
+
+- Files are read and parsed (`MDProcessor.parse`) in a process pool.
+- Parsed documents are ingested `--batch-size` at a time, one transaction per batch.
+- Files without a UUID get a new UUID v7 dated by `--date` or the file's modification
+  time. (Such files get a new id on every import; give them an `id` in the
+  frontmatter to make re-imports update in place.)
+- Hidden files/directories (.obsidian, .git, ...) are skipped.
+
+Usage:
+    cd src && python import_docs.py ~/vault --category Notes
+    cd src && python import_docs.py notes.zip --category Notes --workers 8 --dry-run
+"""
+import os
+import sys
+import time
+import zipfile
+import argparse
+import logging
+import multiprocessing
+from datetime import datetime
+from functools import partial
+from concurrent.futures import ProcessPoolExecutor
+
+from utils.md_processor import MDProcessor
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger("Importer")
+
+MD_EXTENSIONS = ('.md', '.markdown')
+
+# Per-process handle of the archive being imported (opened once per pool worker)
+_zip = None
+
+
+def _is_hidden(rel_path):
+    return any(part.startswith('.') or part == '__MACOSX' for part in rel_path.replace('\\', '/').split('/'))
+
+
+def iter_sources(path):
+    """Yields (archive or None, relative path, mtime) for every Markdown file under `path`."""
+    if zipfile.is_zipfile(path):
+        with zipfile.ZipFile(path) as zf:
+            for info in zf.infolist():
+                if info.is_dir() or not info.filename.lower().endswith(MD_EXTENSIONS) or _is_hidden(info.filename):
+                    continue
+                yield path, info.filename, datetime(*info.date_time).timestamp()
+        return
+
+    for root, dirs, files in os.walk(path):
+        dirs[:] = sorted(d for d in dirs if not d.startswith('.'))
+        for name in sorted(files):
+            if name.lower().endswith(MD_EXTENSIONS) and not name.startswith('.'):
+                full = os.path.join(root, name)
+                yield None, os.path.relpath(full, path), os.path.getmtime(full)
+
+
+def _parse_source(source, root, date_ms=None):
+    """Pool worker: reads and parses one file. Returns a bulk_ingest doc dict or {"error"}."""
+    global _zip
+    archive, rel_path, mtime = source
+    try:
+        if archive:
+            if _zip is None or _zip.filename != archive:
+                _zip = zipfile.ZipFile(archive)
+            raw = _zip.read(rel_path)
+        else:
+            with open(os.path.join(root, rel_path), 'rb') as f:
+                raw = f.read()
+        content = raw.decode('utf-8-sig')
+    except Exception as e:
+        return {"error": f"{rel_path}: {e}"}
+
+    filename = os.path.basename(rel_path)
+    doc_uuid, meta, body = MDProcessor.parse(content, filename)
+    if not doc_uuid:
+        ts_ms = date_ms if date_ms is not None else int(mtime * 1000)
+        doc_uuid = MDProcessor.generate_uuid_v7(timestamp=ts_ms)
+        meta['date'] = datetime.fromtimestamp(ts_ms / 1000).strftime("%Y-%m-%d")
+    meta['source_path'] = rel_path
+    return {
+        "id": doc_uuid,
+        "title": filename,
+        "metadata": meta,
+        "content": body,
+        "task_config": {"filename": filename, "title": filename},
+    }
+
+
+def _ingest(db, embedder, batch, category, stats):
+    for doc in batch:
+        doc['category'] = category
+    started = time.monotonic()
+    result = db.bulk_ingest(batch, embedder=embedder)
+    if not result['inserted'] and not result['updated']:
+        stats['failed_batches'] += 1
+        logger.error(f"Batch of {len(batch)} documents failed (see log above).")
+        return
+    stats['inserted'] += result['inserted']
+    stats['updated'] += result['updated']
+    logger.info(f"Ingested {len(batch)} documents in {time.monotonic() - started:.1f}s "
+                f"({stats['inserted']} new, {stats['updated']} updated so far)")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Import a directory or .zip of Markdown files into the document DB.")
+    parser.add_argument("path", help="Directory or .zip archive")
+    parser.add_argument("--category", required=True, help="Category assigned to every imported document")
+    parser.add_argument("--date", help="YYYY-MM-DD for UUIDs of files without one (default: file modification time)")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="Parser processes")
+    parser.add_argument("--batch-size", type=int, default=200, help="Documents per ingest transaction")
+    parser.add_argument("--no-embed", action="store_true",
+                        help="Skip embedding (vectors are filled in later by re-indexing stale vectors)")
+    parser.add_argument("--embed-cache", default="/app/embed" if os.path.isdir("/app/embed") else None,
+                        help="Model cache folder for in-process embedding")
+    parser.add_argument("--dry-run", action="store_true", help="Parse only; print what would be imported")
+    args = parser.parse_args(argv)
+
+    if not os.path.exists(args.path):
+        parser.error(f"{args.path} does not exist")
+    date_ms = int(datetime.strptime(args.date, "%Y-%m-%d").timestamp() * 1000) if args.date else None
+    root = args.path if os.path.isdir(args.path) else os.path.dirname(os.path.abspath(args.path))
+
+    db = embedder = None
+    if not args.dry_run:
+        from db_manager import DBManager
+        db = DBManager()
+        db.add_category(args.category)
+        if not args.no_embed:
+            from utils.config_loader import load_config
+            from embed_client import load_embedder
+            from utils.embedder import DEFAULT_EMBEDDING_MODEL
+            model = db.get_active_embedding_model() or load_config().get("embedding_model", DEFAULT_EMBEDDING_MODEL)
+            embedder = load_embedder(model, cache_folder=args.embed_cache)
+
+    stats = {"files": 0, "errors": 0, "inserted": 0, "updated": 0, "failed_batches": 0}
+    started = time.monotonic()
+    batch = []
+    # spawn: parser processes must not inherit the parent's DB connections
+    with ProcessPoolExecutor(max_workers=max(args.workers, 1), mp_context=multiprocessing.get_context('spawn')) as pool:
+        parse = partial(_parse_source, root=root, date_ms=date_ms)
+        for doc in pool.map(parse, iter_sources(args.path), chunksize=32):
+            if "error" in doc:
+                stats['errors'] += 1
+                logger.error(f"Skipped {doc['error']}")
+                continue
+            stats['files'] += 1
+            if args.dry_run:
+                print(f"{doc['id']}  {doc['metadata']['source_path']}")
+                continue
+            batch.append(doc)
+            if len(batch) >= args.batch_size:
+                _ingest(db, embedder, batch, args.category, stats)
+                batch = []
+    if batch:
+        _ingest(db, embedder, batch, args.category, stats)
+
+    logger.info(f"Done in {time.monotonic() - started:.1f}s: {stats['files']} files parsed, {stats['errors']} unreadable, "
+                f"{stats['inserted']} inserted, {stats['updated']} updated, {stats['failed_batches']} failed batch(es).")
+    return 1 if stats['errors'] or stats['failed_batches'] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,227 @@
+"""
+Knowledge-Base Snapshots
+------------------------
+Exports the `documents` table (content, metadata, links, embeddings) to a Parquet or
+JSONL file and imports it back, e.g. to move the corpus between machines or into
+offline evaluation.
+
+- **Export** streams rows through a server-side cursor (`DBManager.iter_documents_for_export`),
+  so memory stays bounded by `--batch-size`. In Parquet, embeddings are stored as
+  fixed-size float32 lists; the embedding model and dimension go into the file metadata.
+  JSONL files start with a `{"_snapshot": {...}}` header line (`.gz` is compressed);
+  files without it are imported as plain rows.
+- **Import** reads the file batch by batch and bulk-loads each batch with COPY
+  (`DBManager.import_documents`); links are restored in a second, equally batched
+  pass over the file (`import_links`).
+  Vectors from a different model/dimension than the active one are dropped and
+  reported as stale (re-index from the Settings tab). Chunk vectors are rebuilt from
+  the Settings tab as well.
+
+Usage:
+    cd src && python kb_snapshot.py export corpus.parquet
+    cd src && python kb_snapshot.py export corpus.jsonl.gz
+    cd src && python kb_snapshot.py import corpus.parquet [--keep-existing] [--no-embeddings]
+"""
+import sys
+import gzip
+import json
+import time
+import argparse
+import logging
+from datetime import datetime, timezone
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+    pq = None
+
+from db_manager import DBManager
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger("Snapshot")
+
+FORMAT_VERSION = 1
+SNAPSHOT_META_KEY = b"kb_snapshot"
+
+
+def _format_of(path):
+    name = path.lower()
+    if name.endswith(".parquet"):
+        return "parquet"
+    if name.endswith((".jsonl", ".jsonl.gz", ".ndjson")):
+        return "jsonl"
+    raise ValueError(f"Unknown snapshot format: {path} (use .parquet, .jsonl or .jsonl.gz)")
+
+
+def _open_text(path, mode):
+    return gzip.open(path, mode + "t", encoding="utf-8") if path.lower().endswith(".gz") else open(path, mode, encoding="utf-8")
+
+
+def _require_pyarrow():
+    if pa is None:
+        raise SystemExit("Parquet snapshots need pyarrow (pip install pyarrow). Use a .jsonl file instead.")
+
+
+def _parquet_schema(dim, header):
+    embedding_type = pa.list_(pa.float32(), dim) if dim else pa.list_(pa.float32())
+    schema = pa.schema([
+        ("id", pa.string()),
+        ("title", pa.string()),
+        ("category", pa.string()),
+        ("level", pa.string()),
+        ("metadata", pa.string()),  # JSON text: metadata keys differ per document
+        ("content", pa.string()),
+        ("created_at", pa.timestamp("us", tz="UTC")),
+        ("embedding", embedding_type),
+        ("links", pa.list_(pa.struct([("child_id", pa.string()), ("kind", pa.string())]))),
+    ])
+    return schema.with_metadata({SNAPSHOT_META_KEY: json.dumps(header).encode("utf-8")})
+
+
+def export_snapshot(db, path, batch_size=500):
+    """Streams every document into `path`. Returns the number of documents written."""
+    fmt = _format_of(path)
+    dim = db.get_embedding_dim()
+    header = {
+        "format_version": FORMAT_VERSION,
+        "embedding_model": db.get_active_embedding_model(),
+        "embedding_dim": dim,
+        "exported_at": datetime.now(timezone.utc).isoformat(),
+    }
+    count = 0
+    batch = []
+
+    if fmt == "parquet":
+        _require_pyarrow()
+        schema = _parquet_schema(dim, header)
+        with pq.ParquetWriter(path, schema, compression="zstd") as writer:
+            for row in db.iter_documents_for_export(batch_size):
+                row['metadata'] = json.dumps(row['metadata'] or {}, ensure_ascii=False)
+                batch.append(row)
+                if len(batch) >= batch_size:
+                    writer.write_table(pa.Table.from_pylist(batch, schema=schema))
+                    count += len(batch)
+                    batch = []
+            if batch:
+                writer.write_table(pa.Table.from_pylist(batch, schema=schema))
+                count += len(batch)
+        return count
+
+    with _open_text(path, "w") as f:
+        f.write(json.dumps({"_snapshot": header}) + "\n")
+        for row in db.iter_documents_for_export(batch_size):
+            row['created_at'] = row['created_at'].isoformat() if row['created_at'] else None
+            f.write(json.dumps(row, ensure_ascii=False) + "\n")
+            count += 1
+    return count
+
+
+def _read_batches(path, batch_size, columns=None):
+    """
+    Returns (header dict, iterator of row-dict batches) for a snapshot file.
+
+    `columns` limits the fields read (Parquet reads only those columns). A JSONL file
+    without a `{"_snapshot": ...}` first line is read as rows only.
+    """
+    if _format_of(path) == "parquet":
+        _require_pyarrow()
+        pf = pq.ParquetFile(path)
+        meta = (pf.schema_arrow.metadata or {}).get(SNAPSHOT_META_KEY)
+        header = json.loads(meta) if meta else {}
+
+        def batches():
+            for record_batch in pf.iter_batches(batch_size=batch_size, columns=columns):
+                rows = record_batch.to_pylist()
+                if 'metadata' in record_batch.schema.names:
+                    for row in rows:
+                        row['metadata'] = json.loads(row['metadata']) if row['metadata'] else {}
+                yield rows
+        return header, batches()
+
+    header = {}
+    with _open_text(path, "r") as f:
+        for line in f:
+            if line.strip():
+                first = json.loads(line)
+                if isinstance(first, dict) and isinstance(first.get("_snapshot"), dict):
+                    header = first["_snapshot"]
+                break
+
+    def batches():
+        with _open_text(path, "r") as f:
+            batch = []
+            for line in f:
+                if not line.strip():
+                    continue
+                row = json.loads(line)
+                if isinstance(row.get("_snapshot"), dict):
+                    continue
+                batch.append({k: row.get(k) for k in columns} if columns else row)
+                if len(batch) >= batch_size:
+                    yield batch
+                    batch = []
+            if batch:
+                yield batch
+    return header, batches()
+
+
+def import_snapshot(db, path, batch_size=500, overwrite=True, with_embeddings=True):
+    """
+    Loads a snapshot into the database. Returns (documents imported, links imported).
+
+    Two passes over the file, each holding one batch at a time: documents first, then
+    links (an edge can point to a document from a later batch).
+    """
+    header, batches = _read_batches(path, batch_size)
+
+    if with_embeddings:
+        active_model, active_dim = db.get_active_embedding_model(), db.get_embedding_dim()
+        snap_model, snap_dim = header.get("embedding_model"), header.get("embedding_dim")
+        if (snap_model and active_model and snap_model != active_model) or (snap_dim and active_dim and snap_dim != active_dim):
+            logger.warning(f"Snapshot vectors are from {snap_model} ({snap_dim}), the active model is "
+                           f"{active_model} ({active_dim}). Importing without vectors; re-index afterwards.")
+            with_embeddings = False
+
+    imported = 0
+    for batch in batches:
+        imported += db.import_documents(batch, with_embeddings=with_embeddings, overwrite=overwrite)
+        logger.info(f"Imported {imported} documents...")
+
+    links = 0
+    _, batches = _read_batches(path, batch_size, columns=["id", "links"])
+    for batch in batches:
+        links += db.import_links([(row['id'], link['child_id'], link.get('kind'))
+                                  for row in batch for link in (row.get('links') or [])])
+    return imported, links
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Export or import the knowledge base as Parquet/JSONL.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    p_exp = sub.add_parser("export", help="Write all documents to a snapshot file")
+    p_exp.add_argument("path", help="Output file (.parquet, .jsonl or .jsonl.gz)")
+    p_exp.add_argument("--batch-size", type=int, default=500, help="Rows fetched/written at a time")
+    p_imp = sub.add_parser("import", help="Load a snapshot file")
+    p_imp.add_argument("path", help="Snapshot file (.parquet, .jsonl or .jsonl.gz)")
+    p_imp.add_argument("--batch-size", type=int, default=500, help="Rows per COPY transaction")
+    p_imp.add_argument("--keep-existing", action="store_true", help="Do not overwrite documents that already exist")
+    p_imp.add_argument("--no-embeddings", action="store_true", help="Ignore stored vectors (re-index afterwards)")
+    args = parser.parse_args(argv)
+
+    db = DBManager()
+    started = time.monotonic()
+    if args.command == "export":
+        count = export_snapshot(db, args.path, args.batch_size)
+        logger.info(f"Exported {count} documents to {args.path} in {time.monotonic() - started:.1f}s.")
+    else:
+        docs, links = import_snapshot(db, args.path, args.batch_size,
+                                      overwrite=not args.keep_existing, with_embeddings=not args.no_embeddings)
+        logger.info(f"Imported {docs} documents and {links} links from {args.path} in {time.monotonic() - started:.1f}s. "
+                    f"Stale vectors: {db.count_stale_embeddings()}, documents to chunk: {db.count_chunk_backlog()}.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,7 +1,9 @@
 import requests
 import json
+import hashlib
 import logging
 import os
+import threading
 from utils.config_loader import load_config
 
 logger = logging.getLogger(__name__)
@@ -10,7 +12,75 @@ class RetryableLLMError(Exception):
     """Raised when the LLM provider is busy or unavailable (429, 503, Timeout)"""
     pass
 
+class StructuredOutputError(Exception):
+    """Raised when the backend rejects the JSON-schema `response_format` for a model"""
+    pass
+
+class InvalidStructuredResponse(Exception):
+    """Raised when one schema-constrained reply is not valid, schema-conforming JSON (e.g. truncated)"""
+    pass
+
+# Combined metadata + summary response (OpenAI-style `response_format: json_schema`)
+COMBINED_SCHEMA = {
+    "name": "document_analysis",
+    "strict": True,
+    "schema": {
+        "type": "object",
+        "properties": {
+            "keywords": {"type": "array", "items": {"type": "string"}},
+            "title": {"type": "string"},
+            "summary": {"type": "string"},
+        },
+        "required": ["keywords", "title", "summary"],
+        "additionalProperties": False,
+    },
+}
+
+# Sampling parameters per request kind. Part of the result-cache key, so changing
+# them invalidates cached results for that kind.
+GENERATION_PARAMS = {
+    "summary": {"temperature": 0.3, "max_tokens": 4096},
+    "metadata": {"temperature": 0.1, "max_tokens": 1024},
+    "combined": {"temperature": 0.2, "max_tokens": 4096},
+}
+
+def _sha256(text):
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+# Token usage of the last request made by each thread (see LLMClient.last_usage)
+_usage = threading.local()
+
+def _record_usage(data):
+    usage = data.get('usage') or {}
+    _usage.value = {
+        "prompt_tokens": usage.get('prompt_tokens'),
+        "completion_tokens": usage.get('completion_tokens'),
+    }
+
 class LLMClient:
+    @staticmethod
+    def cache_key(kind, model, prompt, content):
+        """Content-addressed key of one LLM request: (kind, model, prompt hash, content hash, params)."""
+        parts = {
+            "kind": kind,
+            "model": model,
+            "prompt": _sha256(prompt),
+            "content": _sha256(content),
+            "params": GENERATION_PARAMS[kind],
+        }
+        return _sha256(json.dumps(parts, sort_keys=True))
+
+    @staticmethod
+    def last_usage():
+        """
+        Token usage reported by the API for the calling thread's last request.
+
+        Returns:
+            dict: {"prompt_tokens", "completion_tokens"} (values None if the backend
+                  did not report usage), or None if the request failed.
+        """
+        return getattr(_usage, 'value', None)
+
     def __init__(self):
         config = load_config()
         self.base_url = config.get("llm_base_url", "http://192.168.1.238:8080/v1")
@@ -21,14 +91,15 @@ class LLMClient:
         payload = {
             "model": model,
             "messages": [{"role": "user", "content": f"{prompt_template}\n\nContent:\n{content}"}],
-            "temperature": 0.3,
-            "max_tokens": 4096,
+            **GENERATION_PARAMS["summary"],
         }
         
+        _usage.value = None
         try:
             response = requests.post(url, headers=headers, json=payload, timeout=180)
             response.raise_for_status()
             data = response.json()
+            _record_usage(data)
             return data['choices'][0]['message']['content']
         except requests.exceptions.HTTPError as he:
             if he.response.status_code in [429, 503]:
@@ -56,9 +127,9 @@ class LLMClient:
         payload = {
             "model": model,
             "messages": [{"role": "user", "content": full_prompt}],
-            "temperature": 0.1,
-            "max_tokens": 1024
+            **GENERATION_PARAMS["metadata"],
         }
+        _usage.value = None
         try:
             logger.info(f"Extracting metadata with timeout=1200 for model {model} (JSON mode: OFF)")
             response = requests.post(url, headers=headers, json=payload, timeout=1200)
@@ -66,7 +137,9 @@ class LLMClient:
             
             # Robust JSON extraction
             import re
-            raw_content = response.json()['choices'][0]['message']['content']
+            data = response.json()
+            _record_usage(data)
+            raw_content = data['choices'][0]['message']['content']
             json_match = re.search(r'\{.*\}', raw_content, re.DOTALL)
             if json_match:
                 return json.loads(json_match.group(0))
@@ -82,6 +155,62 @@ class LLMClient:
             logger.error(f"Metadata extract error: {e}")
             return {"keywords": [], "title": "unknown"}
             
+    def extract_all(self, content, model, prompt_meta, prompt_summary):
+        """
+        Metadata and summary in one schema-constrained call (the content is prefilled once).
+
+        Returns:
+            tuple: (metadata dict {"keywords", "title"}, summary str)
+
+        Raises:
+            StructuredOutputError: The backend rejected `response_format` (a 400 naming
+                it); use the two-call path for this model.
+            InvalidStructuredResponse: This reply was not schema-conforming JSON (e.g.
+                truncated at max_tokens); use the two-call path for this document.
+            RetryableLLMError: Busy, timed out or a transient server error (429, 5xx).
+            requests.HTTPError: Any other HTTP error (e.g. unknown model, context too long).
+        """
+        url = f"{self.base_url}/chat/completions"
+        headers = {"Content-Type": "application/json"}
+        full_prompt = (
+            f"Task 1 (metadata):\n{prompt_meta}\n\n"
+            f"Task 2 (summary):\n{prompt_summary}\n\n"
+            f"Content:\n{content}\n\n"
+            "Answer with a single JSON object with the fields \"keywords\", \"title\" (Task 1) and \"summary\" (Task 2)."
+        )
+        payload = {
+            "model": model,
+            "messages": [{"role": "user", "content": full_prompt}],
+            **GENERATION_PARAMS["combined"],
+            "response_format": {"type": "json_schema", "json_schema": COMBINED_SCHEMA},
+        }
+        _usage.value = None
+        try:
+            response = requests.post(url, headers=headers, json=payload, timeout=1200)
+            response.raise_for_status()
+        except requests.exceptions.HTTPError as he:
+            status = he.response.status_code
+            if status == 429 or status >= 500:
+                raise RetryableLLMError(f"LLM Busy (Status {status})")
+            # Only a rejection of the schema itself means "this backend/model can't do it"
+            if status == 400 and any(k in (he.response.text or "") for k in ("response_format", "json_schema")):
+                raise StructuredOutputError(f"HTTP error: {he}")
+            raise
+        except requests.exceptions.Timeout:
+            raise RetryableLLMError("LLM Timeout (combined request)")
+
+        body = response.json()
+        _record_usage(body)
+        try:
+            data = json.loads(body['choices'][0]['message']['content'])
+        except (ValueError, KeyError, IndexError, TypeError) as e:
+            raise InvalidStructuredResponse(f"Invalid structured response: {e}")
+
+        if not isinstance(data, dict) or not isinstance(data.get('summary'), str) or not isinstance(data.get('keywords'), list):
+            raise InvalidStructuredResponse("Response does not match the schema")
+        metadata = {"keywords": data['keywords'], "title": data.get('title') or "unknown"}
+        return metadata, data['summary']
+
     def get_available_models(self):
         try:
             response = requests.get(f"{self.base_url}/models", timeout=5)
@@ -0,0 +1,250 @@
+"""
+Worker Supervisor
+-----------------
+Runs `worker.slots` worker processes (src/worker.py) on this host and keeps them alive.
+
+- **Restart**: a worker that exits, or whose heartbeat (`worker_heartbeats`) is older
+  than `worker.heartbeat_timeout` seconds, is killed if needed and restarted. Workers
+  that keep dying right after start are restarted with a growing delay.
+- **Scaling**: `worker.slots` is re-read from config.json while running; new slots
+  are started, surplus slots are drained.
+- **Graceful shutdown**: SIGTERM/SIGINT drains every worker (no new claims, tasks in
+  progress finish), then exits. Workers still running after `worker.drain_timeout`
+  seconds are killed; their tasks return to the queue when their lease expires.
+- **One per host**: the supervisor holds an exclusive lock on `supervisor.lock`
+  (see `utils.worker_manager.is_worker_running`).
+
+Usage:
+    python src/supervisor.py
+"""
+import os
+import sys
+import time
+import fcntl
+import signal
+import socket
+import logging
+import subprocess
+
+from db_manager import DBManager
+from utils.config_loader import load_config
+from utils.worker_manager import SRC_DIR, SUPERVISOR_LOCK
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+    handlers=[
+        logging.FileHandler(os.path.join(SRC_DIR, "supervisor.log")),
+        logging.StreamHandler()
+    ]
+)
+logger = logging.getLogger("Supervisor")
+
+WORKER_PATH = os.path.join(SRC_DIR, 'worker.py')
+CHECK_INTERVAL = 2
+# A worker that dies within this many seconds of starting counts as a crash loop
+MIN_UPTIME = 30
+# Seconds to retry the supervisor lock before concluding another supervisor holds it
+LOCK_WAIT = 5
+
+
+class Supervisor:
+    """
+    Keeps one worker process per slot alive.
+
+    Attributes:
+        slots (dict): slot number -> {"proc", "started", "failures", "next_start"}.
+    """
+    def __init__(self):
+        self.host = socket.gethostname()
+        self.slots = {}
+        self._stopping = False
+        self._db = None
+        self._last_prune = 0
+        self._load_settings()
+
+    def _load_settings(self):
+        worker_conf = load_config().get("worker", {})
+        self.num_slots = max(int(worker_conf.get("slots", 1)), 0)
+        self.heartbeat_timeout = float(worker_conf.get("heartbeat_timeout", 60))
+        self.drain_timeout = float(worker_conf.get("drain_timeout", 600))
+
+    @property
+    def db(self):
+        """
+        Connected lazily (once): the supervisor keeps restarting crashed workers while the
+        DB is down at startup. After that the pool discards broken connections and opens
+        new ones, so a DB outage needs no new DBManager.
+        """
+        if self._db is None:
+            self._db = DBManager()
+        return self._db
+
+    def _spawn(self, slot):
+        state = self.slots.setdefault(slot, {"proc": None, "started": 0, "failures": 0, "next_start": 0})
+        with open(os.path.join(SRC_DIR, 'worker_stdout.log'), 'a') as out:
+            state["proc"] = subprocess.Popen(
+                [sys.executable, WORKER_PATH],
+                cwd=SRC_DIR,
+                env={**os.environ, "WORKER_SLOT": str(slot)},
+                stdout=out,
+                stderr=subprocess.STDOUT,
+            )
+        state["started"] = time.monotonic()
+        logger.info(f"Started worker slot {slot} (pid {state['proc'].pid})")
+
+    def _forget_heartbeat(self, pid):
+        try:
+            self.db.remove_worker_heartbeat(f"{self.host}:{pid}")
+        except Exception as e:
+            logger.error(f"Could not remove heartbeat of pid {pid}: {e}")
+
+    def _reap(self, slot, state):
+        """Handles an exited worker: schedule its restart (with backoff if it crash-loops)."""
+        proc = state["proc"]
+        uptime = time.monotonic() - state["started"]
+        state["proc"] = None
+        self._forget_heartbeat(proc.pid)
+        if self._stopping or slot >= self.num_slots:
+            return
+        state["failures"] = state["failures"] + 1 if uptime < MIN_UPTIME else 0
+        delay = min(2 ** state["failures"], 60) if state["failures"] else 0
+        state["next_start"] = time.monotonic() + delay
+        logger.warning(f"Worker slot {slot} (pid {proc.pid}) exited with code {proc.returncode}. "
+                       f"Restarting{f' in {delay}s' if delay else ''}.")
+
+    def _check_heartbeats(self):
+        """Kills workers whose heartbeat is stale (hung process); they are restarted on the next pass."""
+        try:
+            beats = {hb['pid']: hb for hb in self.db.get_worker_heartbeats(host=self.host)}
+        except Exception as e:
+            logger.error(f"Could not read heartbeats: {e}")
+            return
+        now = time.monotonic()
+        for slot, state in self.slots.items():
+            proc = state["proc"]
+            if proc is None or proc.poll() is not None:
+                continue
+            hb = beats.get(proc.pid)
+            # No beat yet: give the worker heartbeat_timeout seconds to start up
+            stale = (float(hb['age_seconds']) > self.heartbeat_timeout if hb
+                     else now - state["started"] > self.heartbeat_timeout)
+            if stale:
+                logger.error(f"Worker slot {slot} (pid {proc.pid}) missed its heartbeat. Killing it.")
+                proc.kill()
+                proc.wait()
+
+        if time.time() - self._last_prune >= 3600:
+            self._last_prune = time.time()
+            try:
+                self.db.prune_worker_heartbeats(max_age_seconds=max(self.heartbeat_timeout * 10, 3600))
+            except Exception as e:
+                logger.error(f"Could not prune heartbeats: {e}")
+
+    def _reconcile(self):
+        """One supervision pass: reap, restart, scale to `worker.slots`."""
+        try:
+            self._load_settings()
+        except Exception as e:
+            logger.error(f"Could not reload config (keeping {self.num_slots} slots): {e}")
+
+        self._check_heartbeats()
+        now = time.monotonic()
+        for slot, state in list(self.slots.items()):
+            proc = state["proc"]
+            if proc is not None and proc.poll() is not None:
+                self._reap(slot, state)
+            elif proc is not None and slot >= self.num_slots and not state.get("draining"):
+                logger.info(f"Scaling down: draining worker slot {slot} (pid {proc.pid})")
+                proc.terminate()
+                state["draining"] = True
+
+        for slot in range(self.num_slots):
+            state = self.slots.get(slot)
+            if state is None or (state["proc"] is None and now >= state["next_start"]):
+                if state:
+                    state.pop("draining", None)
+                self._spawn(slot)
+
+        # Drop bookkeeping of removed slots once their worker has exited
+        for slot in [s for s, st in self.slots.items() if s >= self.num_slots and st["proc"] is None]:
+            del self.slots[slot]
+
+    def _drain_orphans(self):
+        """
+        Asks workers left behind by a previous supervisor on this host (e.g. one that
+        was killed) to drain, so restarting the supervisor does not double the workers.
+        """
+        try:
+            beats = self.db.get_worker_heartbeats(host=self.host)
+        except Exception as e:
+            logger.error(f"Could not read heartbeats: {e}")
+            return
+        for hb in beats:
+            try:
+                with open(f"/proc/{hb['pid']}/cmdline", 'rb') as f:
+                    is_worker = WORKER_PATH.encode() in f.read()
+            except OSError:
+                is_worker = False
+            if is_worker:
+                logger.warning(f"Draining orphaned worker pid {hb['pid']} (slot {hb['slot']}).")
+                os.kill(hb['pid'], signal.SIGTERM)
+            else:
+                self._forget_heartbeat(hb['pid'])
+
+    def stop(self, *_):
+        if not self._stopping:
+            logger.info("Shutdown requested.")
+            self._stopping = True
+
+    def _drain(self):
+        """Asks every worker to drain, waits up to `drain_timeout`, then kills the rest."""
+        running = [s["proc"] for s in self.slots.values() if s["proc"] is not None and s["proc"].poll() is None]
+        logger.info(f"Draining {len(running)} worker(s) (timeout {self.drain_timeout:.0f}s)...")
+        for proc in running:
+            proc.terminate()
+        deadline = time.monotonic() + self.drain_timeout
+        for proc in running:
+            try:
+                proc.wait(timeout=max(deadline - time.monotonic(), 0))
+            except subprocess.TimeoutExpired:
+                logger.warning(f"Worker pid {proc.pid} did not drain in time. Killing it.")
+                proc.kill()
+                proc.wait()
+                # A killed worker cannot remove its own heartbeat
+                self._forget_heartbeat(proc.pid)
+
+    def run(self):
+        logger.info(f"Supervisor started on {self.host} with {self.num_slots} worker slot(s).")
+        self._drain_orphans()
+        while not self._stopping:
+            try:
+                self._reconcile()
+            except Exception as e:
+                logger.error(f"Supervisor loop error: {e}")
+            time.sleep(CHECK_INTERVAL)
+        self._drain()
+        if self._db is not None:
+            self._db.close()
+        logger.info("Supervisor stopped.")
+
+
+if __name__ == "__main__":
+    lock_file = open(SUPERVISOR_LOCK, 'a')
+    # is_worker_running() probes by taking the lock for an instant: retry for a few
+    # seconds so a probe racing with our start does not look like a running supervisor
+    deadline = time.monotonic() + LOCK_WAIT
+    while True:
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            break
+        except BlockingIOError:
+            if time.monotonic() >= deadline:
+                logger.info("A supervisor is already running on this host. Exiting.")
+                sys.exit(0)
+            time.sleep(0.2)
+
+    supervisor = Supervisor()
+    signal.signal(signal.SIGTERM, supervisor.stop)
+    signal.signal(signal.SIGINT, supervisor.stop)
+    supervisor.run()
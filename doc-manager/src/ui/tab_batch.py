@@ -2,6 +2,81 @@ import streamlit as st
 import os
 import json
 
+# Rows shown per dashboard list (counts come from queue_summary)
+LIST_LIMIT = 50
+
+def _more_caption(total):
+    if total > LIST_LIMIT:
+        st.caption(f"... and {total - LIST_LIMIT} more")
+
+def _fmt_ms(ms):
+    if ms is None:
+        return "-"
+    return f"{ms / 1000:.1f}s" if ms >= 1000 else f"{ms:.0f}ms"
+
+def _fmt_eta(hours):
+    if hours is None:
+        return "-"
+    minutes = int(hours * 60)
+    return f"{minutes // 60}h {minutes % 60:02d}m" if minutes >= 60 else f"{minutes}m"
+
+def render_worker_stats(counts):
+    """Throughput, backlog ETA and latency percentiles from worker telemetry (task_events)."""
+    with st.expander("📈 Worker Throughput & Latency"):
+        window = st.select_slider("Window", options=[15, 60, 360, 1440], value=60,
+                                  format_func=lambda m: f"{m // 60}h" if m >= 60 else f"{m}m", key="stats_window")
+        stats = st.session_state.db.get_task_stats(window_minutes=window)
+        stages = {r['stage']: r for r in stats['stages']}
+        waits = {r['stage']: r for r in stats['queue_wait']}
+
+        # Backlog per stage: every task not yet past a stage still has to go through it
+        backlog = {
+            'queued': counts.get('queued', 0) + counts.get('processing_l', 0),
+            'queued_r': counts.get('queued', 0) + counts.get('processing_l', 0)
+                        + counts.get('queued_r', 0) + counts.get('processing_r', 0),
+        }
+        etas = []
+        cols = st.columns(2)
+        for col, (stage, label) in zip(cols, (('queued', "Queue 1"), ('queued_r', "Queue 2"))):
+            row = stages.get(stage) or {}
+            rate = float(row.get('docs_per_hour') or 0)
+            eta = backlog[stage] / rate if rate else None
+            if backlog[stage]:
+                etas.append(eta)
+            wait = waits.get(stage) or {}
+            with col:
+                st.markdown(f"**{label}**")
+                st.metric("Throughput", f"{rate:.1f} docs/h", help=f"Finished in the last {window} minutes, per hour.")
+                st.caption(f"Processing p50 {_fmt_ms(row.get('p50_ms'))} · p90 {_fmt_ms(row.get('p90_ms'))} · "
+                           f"failed attempts: {row.get('failed') or 0}")
+                st.caption(f"Queue wait p50 {_fmt_ms(wait.get('p50_ms'))} · p90 {_fmt_ms(wait.get('p90_ms'))} · "
+                           f"max {_fmt_ms(wait.get('max_ms'))}")
+                st.caption(f"Backlog {backlog[stage]} · ETA {_fmt_eta(eta) if backlog[stage] else '-'}")
+
+        if etas:
+            st.info(f"Estimated time to drain the backlog: **{_fmt_eta(max(etas)) if None not in etas else 'unknown (no recent throughput)'}**")
+
+        if stats['models']:
+            st.markdown("**LLM latency per model** (cache hits excluded from percentiles)")
+            st.dataframe([
+                {
+                    "model": r['model'], "kind": r['kind'], "calls": r['calls'], "cache hits": r['cache_hits'],
+                    "p50": _fmt_ms(r['p50_ms']), "p90": _fmt_ms(r['p90_ms']), "p99": _fmt_ms(r['p99_ms']),
+                    "prompt tokens": r['prompt_tokens'], "completion tokens": r['completion_tokens'],
+                    "tokens/s": round(r['tokens_per_sec'], 1) if r['tokens_per_sec'] is not None else None,
+                }
+                for r in stats['models']
+            ], use_container_width=True)
+        if stats['hosts']:
+            st.markdown("**Generation throughput per host**")
+            st.dataframe([
+                {"host": r['host'], "LLM calls": r['calls'], "completion tokens": r['completion_tokens'],
+                 "tokens/s": round(float(r['tokens_per_sec']), 2)}
+                for r in stats['hosts']
+            ], use_container_width=True)
+        if not stats['stages'] and not stats['models']:
+            st.caption("No worker activity in this window.")
+
 def render_batch_tab():
     st.header("Batch LLM Processing")
     
@@ -13,91 +88,88 @@ def render_batch_tab():
         if st.button("Refresh Status", key="refresh_top"):
             st.rerun()
 
-    # Fetch all relevant statuses
-    tasks_created = st.session_state.db.get_tasks_by_status('created')
-    
-    # Queue 1
-    tasks_q1_wait = st.session_state.db.get_tasks_by_status('queued')
-    tasks_q1_proc = st.session_state.db.get_tasks_by_status('processing_l')
-    
-    # Queue 2
-    tasks_q2_wait = st.session_state.db.get_tasks_by_status('queued_r')
-    tasks_q2_proc = st.session_state.db.get_tasks_by_status('processing_r')
-    
+    # One GROUP BY for all counters; lists below fetch only a page of light rows
+    counts = st.session_state.db.queue_summary()
+    n_created = counts.get('created', 0)
+    n_q1_wait, n_q1_proc = counts.get('queued', 0), counts.get('processing_l', 0)
+    n_q2_wait, n_q2_proc = counts.get('queued_r', 0), counts.get('processing_r', 0)
     # Legacy fallbacks (just in case)
-    tasks_legacy_proc = st.session_state.db.get_tasks_by_status('processing')
+    n_legacy_proc = counts.get('processing', 0)
+    # Dead-letter: tasks that used up their retry attempts
+    n_failed = counts.get('failed', 0)
 
     # Metrics
-    m1, m2, m3 = st.columns(3)
-    m1.metric("1. Pending Config", len(tasks_created), help="Files uploaded but not yet configured for LLM.")
+    m1, m2, m3, m4 = st.columns(4)
+    m1.metric("1. Pending Config", n_created, help="Files uploaded but not yet configured for LLM.")
     
-    q1_total = len(tasks_q1_wait) + len(tasks_q1_proc)
-    m2.metric("2. Queue 1 (Left)", f"{len(tasks_q1_proc)} / {q1_total}", help="Processing / Total (Wait + Proc)")
+    q1_total = n_q1_wait + n_q1_proc
+    m2.metric("2. Queue 1 (Left)", f"{n_q1_proc} / {q1_total}", help="Processing / Total (Wait + Proc)")
     
-    q2_total = len(tasks_q2_wait) + len(tasks_q2_proc)
-    m3.metric("3. Queue 2 (Right)", f"{len(tasks_q2_proc)} / {q2_total}", help="Processing / Total (Wait + Proc)")
+    q2_total = n_q2_wait + n_q2_proc
+    m3.metric("3. Queue 2 (Right)", f"{n_q2_proc} / {q2_total}", help="Processing / Total (Wait + Proc)")
+    m4.metric("Failed", n_failed, help="Tasks that failed on every retry attempt.")
+
+    if n_failed:
+        with st.expander(f"❌ Failed Tasks ({n_failed})"):
+            for t in st.session_state.db.list_tasks(['failed'], limit=LIST_LIMIT):
+                st.markdown(f"**{t['filename']}** · {t.get('attempts') or 0} attempt(s)")
+                if t.get('last_error'):
+                    st.caption(t['last_error'])
+            _more_caption(n_failed)
+            if st.button("Retry All Failed", key="retry_failed"):
+                count = st.session_state.db.retry_failed_tasks()
+                st.success(f"Re-queued {count} task(s).")
+                st.rerun()
 
     st.divider()
     
     # Detailed Lists (Expanders)
-    if tasks_created or q1_total > 0 or q2_total > 0 or tasks_legacy_proc:
+    if n_created or q1_total > 0 or q2_total > 0 or n_legacy_proc:
         with st.expander("📂 Show Detailed Queue Lists", expanded=True):
             cols_list = st.columns(3)
             
             with cols_list[0]:
                 st.markdown("**Pending Config**")
-                if tasks_created:
-                    for t in tasks_created:
-                        fname = t['config'].get('filename', str(t['doc_id']))
-                        st.caption(f"- {fname}")
+                if n_created:
+                    for t in st.session_state.db.list_tasks(['created'], limit=LIST_LIMIT):
+                        st.caption(f"- {t['filename']}")
+                    _more_caption(n_created)
                 else:
                     st.caption("(Empty)")
 
-            with cols_list[1]:
-                st.markdown("**Queue 1 (Left Model)**")
-                if tasks_q1_proc:
-                    st.caption(f"**Processing ({len(tasks_q1_proc)}):**")
-                    for t in tasks_q1_proc:
-                        fname = t['config'].get('filename', str(t['doc_id']))
-                        st.text(f"▶ {fname}")
-                
-                if tasks_q1_wait:
-                    st.caption(f"**Waiting ({len(tasks_q1_wait)}):**")
-                    for t in tasks_q1_wait:
-                        fname = t['config'].get('filename', str(t['doc_id']))
-                        st.caption(f"- {fname}")
-                
-                if not tasks_q1_proc and not tasks_q1_wait:
-                     st.caption("(Empty)")
-
-            with cols_list[2]:
-                st.markdown("**Queue 2 (Right Model)**")
-                if tasks_q2_proc:
-                    st.caption(f"**Processing ({len(tasks_q2_proc)}):**")
-                    for t in tasks_q2_proc:
-                        fname = t['config'].get('filename', str(t['doc_id']))
-                        st.text(f"▶ {fname}")
-                
-                if tasks_q2_wait:
-                    st.caption(f"**Waiting ({len(tasks_q2_wait)}):**")
-                    for t in tasks_q2_wait:
-                        fname = t['config'].get('filename', str(t['doc_id']))
-                        st.caption(f"- {fname}")
-
-                if not tasks_q2_proc and not tasks_q2_wait:
-                     st.caption("(Empty)")
+            for col, label, proc_status, wait_status, n_proc, n_wait in (
+                (cols_list[1], "Queue 1 (Left Model)", 'processing_l', 'queued', n_q1_proc, n_q1_wait),
+                (cols_list[2], "Queue 2 (Right Model)", 'processing_r', 'queued_r', n_q2_proc, n_q2_wait),
+            ):
+                with col:
+                    st.markdown(f"**{label}**")
+                    if n_proc:
+                        st.caption(f"**Processing ({n_proc}):**")
+                        for t in st.session_state.db.list_tasks([proc_status], limit=LIST_LIMIT):
+                            st.text(f"▶ {t['filename']}")
+                        _more_caption(n_proc)
+                    
+                    if n_wait:
+                        st.caption(f"**Waiting ({n_wait}):**")
+                        for t in st.session_state.db.list_tasks([wait_status], limit=LIST_LIMIT):
+                            retry = f" (retry #{t['attempts']} after {t['next_attempt_at']:%H:%M:%S})" if t.get('attempts') and t.get('next_attempt_at') else ""
+                            st.caption(f"- {t['filename']}{retry}")
+                        _more_caption(n_wait)
+                    
+                    if not n_proc and not n_wait:
+                         st.caption("(Empty)")
     
+    render_worker_stats(counts)
+
     st.divider()
 
     # --- 1. Configuration Section ---
     st.subheader("Batch Configuration")
     
-    tasks_to_config = tasks_created # Alias for compatibility with logic below
-    
-    if not tasks_to_config:
+    if not n_created:
         st.info("No new tasks to configure. Upload more files to add to the 'Pending Config' list.")
     else:
-        st.write(f"Configuring **{len(tasks_to_config)}** pending files...")
+        st.write(f"Configuring **{n_created}** pending files...")
         
         # Helper to load/save prefs
         PREFS_FILE = "user_prefs.json"
@@ -193,17 +265,21 @@ def render_batch_tab():
             if model_l != prefs.get("model_l"): save_prefs("model_l", model_l)
             if model_r != prefs.get("model_r"): save_prefs("model_r", model_r)
             
+            bypass_cache = st.checkbox("Bypass LLM Cache", value=False, help="Request new samples even if a cached result exists for the same model, prompt and content.")
+            
             if st.button("Start Batch Execution", type="primary"):
                 
                 # Update all 'created' tasks to 'queued' with config
+                # Full rows (with config) are only needed here
                 count = 0
-                for task in tasks_to_config:
+                for task in st.session_state.db.get_tasks_by_status('created'):
                     new_config = task['config'] or {}
                     new_config.update({
                         "model_l": model_l,
                         "model_r": model_r,
                         "prompt_summary": prompt_summary,
-                        "prompt_meta": prompt_meta
+                        "prompt_meta": prompt_meta,
+                        "bypass_cache": bypass_cache
                     })
                     st.session_state.db.update_task(task['doc_id'], status='queued', config=new_config)
                     count += 1
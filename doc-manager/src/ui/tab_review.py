@@ -145,9 +145,10 @@ def render_review_tab():
                     
                     st.session_state.db.upsert_document(doc_id, existing_doc['category'], "L0", final_meta_l0, existing_doc['content'], title=existing_doc.get('title'))
                     
-                    summary_emb = st.session_state.embedder.encode(final_summary_text).tolist()
+                    summary_emb = st.session_state.db.encode_cached(st.session_state.embedder, final_summary_text)
                     l1_title = l1_title_input.strip() if l1_title_input.strip() else f"L1_{parent_title}"
                     st.session_state.db.upsert_document(summary_id, existing_doc['category'], "L1", final_meta_l1, final_summary_text, summary_emb, title=l1_title)
+                    st.session_state.db.sync_chunks(summary_id, final_summary_text, st.session_state.embedder)
                     
                     st.session_state.db.link_documents(doc_id, summary_id)
                     st.session_state.db.delete_task(doc_id)
@@ -156,8 +157,11 @@ def render_review_tab():
                     st.rerun()
 
         with col_btn2:
+            fresh_sample = st.checkbox("Fresh sample", key=f"bypass_cache_{selected_task_id}",
+                                       help="Bypass the LLM result cache. Unchanged documents and prompts are otherwise served from cache.")
             if st.button("Re-queue (Re-summarize)", use_container_width=True):
-                st.session_state.db.update_task(selected_task_id, status='queued')
+                requeue_config = {**(current_task.get('config') or {}), "bypass_cache": fresh_sample}
+                st.session_state.db.update_task(selected_task_id, status='queued', config=requeue_config)
                 st.info("Task returned to queue for re-processing!")
                 st.rerun()
 
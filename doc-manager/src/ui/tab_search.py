@@ -2,6 +2,9 @@ import streamlit as st
 import pandas as pd
 import json
 
+# Documents per page in keyword/listing mode
+PAGE_SIZE = 50
+
 def render_search_tab():
     st.header("Search Knowledge Base")
     col_s1, col_s2, col_s3, col_s4 = st.columns([2, 1, 1, 1])
@@ -14,6 +17,11 @@ def render_search_tab():
     with col_s4:
         search_uuid = st.text_input("UUID Search")
     
+    search_mode = st.radio(
+        "Search Mode", ["Hybrid", "Keyword"], horizontal=True,
+        help="Hybrid fuses keyword matches with semantic (vector) similarity and ranks by relevance."
+    )
+    
     st.divider()
     col_opt1, col_opt2 = st.columns(2)
     with col_opt1:
@@ -25,14 +33,41 @@ def render_search_tab():
     lvl_filter = None if search_lvl == "ALL" else search_lvl
     uuid_filter = search_uuid if search_uuid else None
     
-    results = st.session_state.db.search_documents(query_text=search_query, category=cat_filter, level=lvl_filter, doc_id=uuid_filter)
+    if search_query.strip() and search_mode == "Hybrid" and not uuid_filter:
+        query_emb = st.session_state.embedder.encode(search_query).tolist()
+        results = st.session_state.db.hybrid_search(search_query, query_emb, category=cat_filter, level=lvl_filter,
+                                                    no_task=filter_no_task)
+        if not st.session_state.db.has_trgm:
+            st.caption("Keyword ranking is unavailable (pg_trgm extension missing): showing vector matches only.")
+    else:
+        # Keyset pagination: a stack of page cursors, reset whenever the filters change
+        filters = dict(query_text=search_query, category=cat_filter, level=lvl_filter, doc_id=uuid_filter,
+                       no_task=filter_no_task)
+        if st.session_state.get("search_filters") != filters:
+            st.session_state.search_filters = filters
+            st.session_state.search_cursors = [None]
+        cursors = st.session_state.search_cursors
+
+        results = st.session_state.db.search_documents(**filters, limit=PAGE_SIZE, after=cursors[-1])
+        total = st.session_state.db.count_documents(**filters)
+
+        c_prev, c_info, c_next = st.columns([1, 4, 1])
+        with c_prev:
+            if st.button("◀ Prev", disabled=len(cursors) <= 1, key="search_prev"):
+                cursors.pop()
+                st.rerun()
+        with c_info:
+            start = (len(cursors) - 1) * PAGE_SIZE
+            st.caption(f"Showing {start + 1 if results else 0}-{start + len(results)} of {total} documents")
+        with c_next:
+            if st.button("Next ▶", disabled=len(results) < PAGE_SIZE, key="search_next"):
+                cursors.append((results[-1]['created_at'], str(results[-1]['id'])))
+                st.rerun()
     
     if results:
         # --- Performance Optimization: Pre-fetch all related data ---
-        # 1. Get all tasks for task status check
-        all_tasks = st.session_state.db.get_all_tasks()
-        
-        # 2. Collect all parent and child IDs for batch fetch
+        # (task status comes with each row: `task_status`, joined in SQL)
+        # 1. Collect all parent and child IDs for batch fetch
         doc_ids_to_fetch = set()
         for r in results:
             if r.get('summary_uuids'):
@@ -46,15 +81,12 @@ def render_search_tab():
                         parent_uuids = [m_p_id]
                 doc_ids_to_fetch.update([str(p) for p in parent_uuids])
         
-        # 3. Batch fetch all related documents
+        # 2. Batch fetch all related documents
         related_docs = st.session_state.db.get_documents_by_ids(list(doc_ids_to_fetch)) if doc_ids_to_fetch else {}
 
-        if filter_no_task:
-            results = [r for r in results if str(r['id']) not in all_tasks]
-
     if results:
         df = pd.DataFrame(results)
-        display_df = df.drop(columns=['embedding']) if 'embedding' in df.columns else df
+        display_df = df.drop(columns=[c for c in df.columns if c.startswith('embedding')])
         st.dataframe(display_df, use_container_width=True)
         
         for idx, row in df.iterrows():
@@ -69,20 +101,26 @@ def render_search_tab():
             
             with container:
                 display_name = row['title'] if row['title'] else doc_id_str
-                with st.expander(f"[{row['category']} / {row['level']}] {display_name}"):
-                    c_info, c_down = st.columns([4, 1])
-                    with c_down:
-                        st.download_button("Download MD", data=row['content'], file_name=f"{display_name}.md", mime="text/markdown", key=f"dl_{doc_id_str}")
-                    
-                    with c_info:
-                        st.write(f"**Title:** {row['title']}")
-                        st.write(f"**Metadata:** {json.dumps(row['metadata'], ensure_ascii=False)}")
-                        st.write(f"**Content Snippet:** {row['content'][:500]}...")
+                score_label = f" · relevance {row['score']:.4f}" if 'score' in row and pd.notna(row['score']) else ""
+                with st.expander(f"[{row['category']} / {row['level']}] {display_name}{score_label}"):
+                    st.write(f"**Title:** {row['title']}")
+                    st.write(f"**Metadata:** {json.dumps(row['metadata'], ensure_ascii=False)}")
+                    st.write(f"**Content Snippet:** {row['snippet']}...")
+
+                    # Full content is only fetched for documents the user opens
+                    full_doc = None
+                    if st.toggle("Load full content", key=f"full_{doc_id_str}"):
+                        full_doc = st.session_state.db.get_document(row['id'])
+                    if full_doc:
+                        c_full, c_down = st.columns([4, 1])
+                        with c_down:
+                            st.download_button("Download MD", data=full_doc['content'], file_name=f"{display_name}.md", mime="text/markdown", key=f"dl_{doc_id_str}")
+                        with c_full:
+                            st.markdown(full_doc['content'])
                     
-                    # Task Status (Using pre-fetched tasks)
-                    task = all_tasks.get(doc_id_str)
-                    if task:
-                        st.info(f"**Task Status:** `{task['status']}`")
+                    # Task Status (joined into the search row)
+                    if pd.notna(row.get('task_status')):
+                        st.info(f"**Task Status:** `{row['task_status']}`")
                     else:
                         st.warning("No Active Task in Queue")
                         if st.button("Add to Process Queue", key=f"re_q_{doc_id_str}"):
@@ -92,12 +130,13 @@ def render_search_tab():
                             st.rerun()
 
                     # Edit (Simplified for L0)
-                    if row['category'] == 'L0':
+                    if full_doc and row['category'] == 'L0':
                         with st.expander("Edit Content"):
-                            new_content = st.text_area("Update Content", value=row['content'], height=200, key=f"edit_{doc_id_str}")
+                            new_content = st.text_area("Update Content", value=full_doc['content'], height=200, key=f"edit_{doc_id_str}")
                             if st.button("Save & Reset Summaries", key=f"save_{doc_id_str}"):
-                                new_emb = st.session_state.embedder.encode(new_content).tolist()
+                                new_emb = st.session_state.db.encode_cached(st.session_state.embedder, new_content)
                                 st.session_state.db.upsert_document(row['id'], row['category'], row['level'], row['metadata'], new_content, new_emb)
+                                st.session_state.db.sync_chunks(row['id'], new_content, st.session_state.embedder)
                                 for sum_id in (row.get('summary_uuids') or []):
                                     st.session_state.db.delete_document(sum_id)
                                 st.session_state.db.clear_summary_links(row['id'])
@@ -1,22 +1,45 @@
 import streamlit as st
+import threading
 import time
+from utils.embedder import get_embedder
+
+@st.cache_resource
+def _reindex_threads():
+    """Process-wide registry of running re-index threads (job_id -> Thread)."""
+    return {}
+
+def _start_reindex_thread(db, embedder, job_id):
+    threads = _reindex_threads()
+    t = threads.get(job_id)
+    if t and t.is_alive():
+        return
+    t = threading.Thread(target=db.run_reindex_job, args=(job_id, embedder), daemon=True, name=f"reindex-{job_id}")
+    t.start()
+    threads[job_id] = t
+
+def _is_reindex_thread_alive(job_id):
+    t = _reindex_threads().get(job_id)
+    return bool(t and t.is_alive())
 
 def render_settings_tab():
     st.header("System Settings")
-    
-    st.markdown("### 🛠 Embedding Model Migration")
+
+    st.markdown("### 🛠 Re-index Embeddings (In Place)")
     st.info(
         """
         **When to use this?**  
-        If you change the `embedding_model` in `config.json`, the new model may produce vectors with different dimensions (e.g., 384 vs 768).  
+        To refresh all vectors with the currently active model (e.g. after restoring data).  
+        To switch to a *different* model without downtime, use the Shadow Migration below instead.  
         This tool will:
-        1. Alter the database schema to match the new model's dimensions.
-        2. Fetch all existing documents.
+        1. Alter the database schema if the column dimension differs from the model.
+        2. Stream all existing documents in batches.
         3. Re-calculate embeddings using the currently loaded model.
-        4. Save the new embeddings back to the database.
+        4. Save the new embeddings back to the database, checkpointing after every batch.
+
+        The job runs in the background; you can leave this tab and come back. An interrupted job resumes from its last checkpoint.
         """
     )
-    
+
     # Check current status
     embedder = st.session_state.embedder
     try:
@@ -25,29 +48,201 @@ def render_settings_tab():
     except:
         current_dim = "Unknown"
         model_name = "Unknown"
-        
-    c1, c2 = st.columns(2)
+
+    c1, c2, c3 = st.columns(3)
     c1.metric("Current Model", str(model_name))
     c2.metric("Vector Dimension", str(current_dim))
-    
-    st.warning("⚠️ **Warning**: This process can take a long time for large datasets. Do not close this tab during migration.")
-    
-    if st.button("Start Re-indexing / Migration", type="primary"):
-        progress_bar = st.progress(0, text="Initializing...")
-        status_text = st.empty()
-        
-        def update_progress(current, total):
-            pct = current / total
-            progress_bar.progress(pct, text=f"Processing {current}/{total} documents...")
-
-        with st.spinner("Migrating..."):
-            success, msg = st.session_state.db.reindex_all_documents(
-                embedder=st.session_state.embedder,
-                progress_callback=update_progress
-            )
-            
-        if success:
-            progress_bar.progress(1.0, text="Completed!")
-            st.success(f"✅ {msg}")
+    c3.metric("Stale Vectors", st.session_state.db.count_stale_embeddings(),
+              help="Documents without a vector or whose content changed since it was embedded. Re-indexing skips up-to-date vectors.")
+
+    job = st.session_state.db.get_reindex_job()
+    job_active = bool(job) and _is_reindex_thread_alive(job['id'])
+    in_place_job = bool(job) and (job.get('target_column') or 'embedding') == 'embedding'
+
+    if job and in_place_job:
+        total = job['total'] or 0
+        processed = job['processed'] or 0
+        pct = min(processed / total, 1.0) if total else 1.0
+        st.progress(pct, text=f"Job #{job['id']} ({job['model_name']}, dim {job['dim']}): {processed}/{total} documents - `{job['status']}`")
+        if job['status'] == 'failed' and job.get('error'):
+            st.error(f"❌ Last run failed: {job['error']}")
+        elif job['status'] == 'done':
+            st.success(f"✅ Job #{job['id']} completed.")
+        elif job['status'] in ('pending', 'running') and not job_active:
+            st.warning("This job was interrupted. Start again to resume from the last checkpoint.")
+
+    batch_size = st.number_input("Batch Size", min_value=1, max_value=1024, value=64, step=16, help="Documents encoded and written per checkpoint.")
+
+    if job_active:
+        st.info("Re-indexing in progress...")
+        if st.button("Refresh Progress"):
+            st.rerun()
+    elif st.button("Start / Resume Re-indexing", type="primary"):
+        if not isinstance(current_dim, int):
+            st.error("❌ Could not determine the embedding dimension of the loaded model.")
+            return
+        job_id = st.session_state.db.start_reindex_job(str(model_name), current_dim, batch_size=int(batch_size))
+        if job_id is None:
+            st.error("❌ Migration Failed: could not create re-index job.")
+        else:
+            _start_reindex_thread(st.session_state.db, embedder, job_id)
+            time.sleep(0.5)
+            st.rerun()
+
+    st.divider()
+    render_shadow_migration(job, job_active, int(batch_size))
+
+    st.divider()
+    render_vector_index_settings()
+
+    st.divider()
+    render_chunk_settings()
+
+def render_chunk_settings():
+    """Chunk-level vectors for long documents (settings come from `chunking` in config.json)."""
+    db = st.session_state.db
+    st.markdown("### 🧩 Chunk Vectors (Long Documents)")
+    cfg = db.chunking
+    st.caption(
+        f"Enabled: `{cfg['enabled']}` · chunk size: `{cfg['chunk_size']}` · overlap: `{cfg['overlap']}` · "
+        f"aggregate: `{cfg['aggregate']}` · candidates: `{cfg['candidates']}`"
+    )
+    if not cfg['enabled']:
+        return
+
+    backlog = db.count_chunk_backlog()
+    st.metric("Documents to Chunk", backlog,
+              help=f"Documents longer than {cfg['chunk_size']} characters without up-to-date chunk vectors. "
+                   "They are matched by their document vector until chunked.")
+    if backlog and st.button("Rebuild Chunks"):
+        bar = st.progress(0.0)
+        n = db.rebuild_chunks(st.session_state.embedder,
+                              progress_callback=lambda i, total: bar.progress(i / total, text=f"{i}/{total}"))
+        st.success(f"Chunked {n} document(s).")
+
+def render_vector_index_settings():
+    """ANN index status and rebuild (settings come from `vector_index` in config.json)."""
+    db = st.session_state.db
+    st.markdown("### ⚡ Vector Index (ANN)")
+    cfg = db.vector_index
+    st.caption(
+        f"Method: `{cfg['method']}` · ef_search: `{cfg['ef_search']}` · probes: `{cfg['probes']}` · "
+        f"partial levels: `{cfg.get('partial_levels') or '-'}` · pgvector {'.'.join(map(str, db.pgvector_version))}"
+    )
+
+    indexes = db.get_vector_indexes()
+    if indexes:
+        for idx in indexes:
+            st.text(f"{idx['name']} ({idx['size']})" + ("" if idx['valid'] else " - INVALID (failed build)"))
+    else:
+        st.warning("No ANN index on documents: vector search scans every row.")
+
+    if not indexes and st.button("Build ANN Index"):
+        with st.spinner("Building index (concurrently)..."):
+            ok = db.ensure_vector_index('embedding')
+        (st.success if ok else st.error)("Index built." if ok else "Index build failed (see logs).")
+    if indexes and st.button("Rebuild ANN Index"):
+        with st.spinner("Building index (concurrently)..."):
+            ok = db.ensure_vector_index('embedding', rebuild=True)
+        (st.success if ok else st.error)("Index rebuilt." if ok else "Index build failed (see logs).")
+
+def render_shadow_migration(job, job_active, batch_size):
+    """Zero-downtime model switch: build -> compare -> swap -> finalize (or rollback)."""
+    db = st.session_state.db
+    st.markdown("### 🔀 Shadow Migration (Switch Model)")
+    st.info(
+        """
+        Builds vectors for a new model in a separate **shadow** column while search keeps serving the current ones.  
+        1. **Build**: re-embed all documents into the shadow column (background, resumable).
+        2. **Compare**: run the same query against both vector sets.
+        3. **Swap**: atomically make the shadow vectors active. The old vectors are kept.
+        4. **Finalize** to drop the old vectors, or **Rollback** to switch back.
+        """
+    )
+
+    versions = db.get_embedding_versions()
+    active, shadow, previous = versions.get('active'), versions.get('shadow'), versions.get('previous')
+
+    c1, c2, c3 = st.columns(3)
+    c1.metric("Active", f"{active['model_name']} ({active['dim']})" if active else "Unknown")
+    c2.metric("Shadow", f"{shadow['model_name']} ({shadow['dim']})" if shadow else "-")
+    c3.metric("Previous", f"{previous['model_name']} ({previous['dim']})" if previous else "-")
+
+    shadow_job = job if job and job.get('target_column') == 'embedding_shadow' else None
+
+    if not shadow:
+        target_model = st.text_input("Target Model", placeholder="e.g. intfloat/multilingual-e5-base", key="shadow_target_model")
+        if st.button("Build Shadow Embeddings", disabled=job_active or not target_model.strip()):
+            with st.spinner(f"Loading {target_model}..."):
+                target = get_embedder(target_model.strip())
+                dim = target.get_sentence_embedding_dimension()
+            if db.begin_shadow_migration(target_model.strip(), dim):
+                job_id = db.start_reindex_job(target_model.strip(), dim, batch_size=batch_size, target_column='embedding_shadow')
+                if job_id is not None:
+                    _start_reindex_thread(db, target, job_id)
+                    time.sleep(0.5)
+                    st.rerun()
+            st.error("❌ Could not start the shadow migration.")
+    else:
+        if shadow_job:
+            total = shadow_job['total'] or 0
+            processed = shadow_job['processed'] or 0
+            pct = min(processed / total, 1.0) if total else 1.0
+            st.progress(pct, text=f"Shadow job #{shadow_job['id']}: {processed}/{total} documents - `{shadow_job['status']}`")
+            if shadow_job['status'] == 'failed' and shadow_job.get('error'):
+                st.error(f"❌ Last run failed: {shadow_job['error']}")
+
+        missing = db.count_missing_shadow_embeddings()
+        if job_active:
+            st.info("Shadow build in progress...")
+            if st.button("Refresh Progress", key="shadow_refresh"):
+                st.rerun()
+        elif missing:
+            st.warning(f"{missing} document(s) still need a shadow vector (new, or edited since the build).")
+            if st.button("Resume / Backfill Shadow Build"):
+                target = get_embedder(shadow['model_name'])
+                job_id = db.start_reindex_job(shadow['model_name'], shadow['dim'], batch_size=batch_size, target_column='embedding_shadow')
+                if job_id is not None:
+                    _start_reindex_thread(db, target, job_id)
+                    time.sleep(0.5)
+                    st.rerun()
         else:
-            st.error(f"❌ Migration Failed: {msg}")
+            st.success("✅ Shadow vectors complete.")
+            if st.button("Swap to Shadow Embeddings", type="primary"):
+                ok, msg = db.swap_shadow_embeddings()
+                (st.success if ok else st.error)(msg)
+                if ok:
+                    st.rerun()
+
+    # Side-by-side comparison: active vs shadow (before swap) or active vs previous (after swap)
+    other_slot, other_column = (('shadow', 'embedding_shadow') if shadow and not job_active
+                                else ('previous', 'embedding_previous') if previous else (None, None))
+    if active and other_slot:
+        other = versions[other_slot]
+        with st.expander(f"🔍 Compare Active vs {other_slot.title()}"):
+            query = st.text_input("Query", key="shadow_compare_query")
+            if query:
+                col_a, col_b = st.columns(2)
+                res_a = db.vector_search(get_embedder(active['model_name']).encode(query).tolist(), limit=10)
+                res_b = db.vector_search(get_embedder(other['model_name']).encode(query).tolist(), limit=10, column=other_column)
+                for col, label, res in ((col_a, active['model_name'], res_a), (col_b, other['model_name'], res_b)):
+                    with col:
+                        st.markdown(f"**{label}**")
+                        for r in res:
+                            st.caption(f"{r['cosine_similarity']:.3f} · [{r['level']}] {r['title']}")
+
+    if previous and not shadow:
+        c_fin, c_rb = st.columns(2)
+        if c_fin.button("Finalize (Drop Previous Vectors)"):
+            if db.finalize_embedding_migration():
+                st.rerun()
+            st.error("❌ Finalize failed.")
+        if c_rb.button("Rollback to Previous Model"):
+            ok, msg = db.rollback_embedding_migration()
+            (st.success if ok else st.error)(msg)
+    elif shadow and not job_active:
+        if st.button("Discard Shadow Build"):
+            ok, msg = db.rollback_embedding_migration()
+            (st.success if ok else st.error)(msg)
+            if ok:
+                st.rerun()
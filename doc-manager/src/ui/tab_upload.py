@@ -1,7 +1,13 @@
 import streamlit as st
 from datetime import datetime
 from utils.md_processor import MDProcessor
-import subprocess
+from utils.worker_manager import is_worker_running, start_worker
+
+# Task statuses listed under "Manage Active Queue", and tasks per page
+MANAGED_STATUSES = ['created', 'queued', 'queued_r', 'processing', 'processing_l', 'processing_r', 'done']
+QUEUE_PAGE_SIZE = 20
+# Heartbeats older than this are shown as stale
+WORKER_STALE_SECONDS = 60
 
 def render_upload_tab():
     st.header("Upload or Input")
@@ -75,7 +81,7 @@ def render_upload_tab():
             manual_meta['date'] = doc_date.strftime("%Y-%m-%d")
 
             # Upsert L0
-            parent_emb = st.session_state.embedder.encode(manual_text).tolist()
+            parent_emb = st.session_state.db.encode_cached(st.session_state.embedder, manual_text)
             st.session_state.db.upsert_document(
                 m_uuid, 
                 active_cat, # Use global category
@@ -85,6 +91,7 @@ def render_upload_tab():
                 parent_emb,
                 title=m_title
             )
+            st.session_state.db.sync_chunks(m_uuid, manual_text, st.session_state.embedder)
             
             # Add to Queue
             st.session_state.db.enqueue_task(m_uuid, config={"filename": m_filename, "title": m_title})
@@ -101,11 +108,18 @@ def render_upload_tab():
         st.subheader("Detected Files")
         # No longer need separate selectbox here as it's at the top
         
+        parsed = []
         for u_file in uploaded_files:
             content = u_file.read().decode("utf-8")
             u_file.seek(0) # Reset pointer
-            doc_uuid, clean_content = MDProcessor.extract_uuid(content, u_file.name)
-            
+            # One parse: UUID, frontmatter metadata and body
+            doc_uuid, meta, clean_content = MDProcessor.parse(content, u_file.name)
+            parsed.append((u_file, meta, doc_uuid, clean_content))
+
+        # One existence check for every file with a preserved UUID
+        existing_ids = st.session_state.db.get_existing_ids([p[2] for p in parsed if p[2]])
+
+        for u_file, meta, doc_uuid, clean_content in parsed:
             col1, col2 = st.columns([3, 1])
             with col1:
                 st.write(f"**File:** {u_file.name}")
@@ -117,14 +131,12 @@ def render_upload_tab():
             with col2:
                 # Check DB
                 if doc_uuid:
-                    existing = st.session_state.db.get_document(doc_uuid)
-                    if existing:
+                    if str(doc_uuid) in existing_ids:
                         st.warning("Already in DB")
                     else:
                         st.success("New Document")
             
             # If no UUID, generate one now using the DEFAULT DATE
-            meta = MDProcessor.prepare_metadata(content)
             if not doc_uuid:
                 dt_obj = datetime.combine(default_upload_date, datetime.min.time())
                 ts_ms = int(dt_obj.timestamp() * 1000)
@@ -142,52 +154,72 @@ def render_upload_tab():
         
     if valid_docs:
         if st.button(f"Add {len(valid_docs)} Documents to DB Processing Queue"):
-            count = 0
-            for doc in valid_docs:
-                # Add to DB Processing Queue
-                st.session_state.db.enqueue_task(doc['id'], config={"filename": doc['filename'], "title": doc['filename']}) # Save filename in config for display
-                
-                # Upsert partial L0
-                parent_emb = st.session_state.embedder.encode(doc['content']).tolist()
-                st.session_state.db.upsert_document(doc['id'], active_cat, "L0", doc['metadata'], doc['content'], parent_emb, title=doc['filename'])
-                
-                count += 1
-            st.success(f"Added {count} documents to DB Queue. Go to 'Batch Processing'.")
+            with st.spinner(f"Embedding and saving {len(valid_docs)} documents..."):
+                result = st.session_state.db.bulk_ingest([
+                    {
+                        "id": doc['id'],
+                        "title": doc['filename'],
+                        "category": active_cat,
+                        "metadata": doc['metadata'],
+                        "content": doc['content'],
+                        "task_config": {"filename": doc['filename'], "title": doc['filename']}, # Save filename in config for display
+                    }
+                    for doc in valid_docs
+                ], embedder=st.session_state.embedder)
+            count = result['inserted'] + result['updated']
+            if count:
+                st.success(f"Added {count} documents to DB Queue ({result['updated']} updated). Go to 'Batch Processing'.")
+            else:
+                st.error("Failed to add documents (see logs).")
 
     # Show Queue status from DB
     st.divider()
     st.subheader("DB Processing Queue Status")
     
-    # We can fetch count by status
-    tasks_created = st.session_state.db.get_tasks_by_status('created')
-    tasks_queued = st.session_state.db.get_tasks_by_status('queued')
-    tasks_processing = st.session_state.db.get_tasks_by_status('processing')
-    tasks_done = st.session_state.db.get_tasks_by_status('done')
+    # One GROUP BY for the counters
+    counts = st.session_state.db.queue_summary()
+    n_queued = counts.get('queued', 0) + counts.get('queued_r', 0)
+    n_processing = counts.get('processing', 0) + counts.get('processing_l', 0) + counts.get('processing_r', 0)
     
     cols = st.columns(4)
-    cols[0].metric("Created", len(tasks_created))
-    cols[1].metric("Queued", len(tasks_queued))
-    cols[2].metric("Processing", len(tasks_processing))
-    cols[3].metric("Done (Wait Review)", len(tasks_done))
+    cols[0].metric("Created", counts.get('created', 0))
+    cols[1].metric("Queued", n_queued)
+    cols[2].metric("Processing", n_processing)
+    cols[3].metric("Done (Wait Review)", counts.get('done', 0))
 
     # Manage Active Queue
     st.divider()
     st.subheader("Manage Active Queue")
     with st.expander("Show Detailed Queue Management"):
-        all_task_list = tasks_created + tasks_queued + tasks_processing + tasks_done
-        if not all_task_list:
+        total_tasks = sum(counts.get(s, 0) for s in MANAGED_STATUSES)
+        if not total_tasks:
             st.info("No tasks in any status.")
         else:
-            if tasks_done:
+            if counts.get('done'):
                 if st.button("Clear All 'Done' Tasks"):
-                    for t in tasks_done:
+                    for t in st.session_state.db.get_tasks_by_status('done'):
                         st.session_state.db.delete_task(t['doc_id'])
                     st.rerun()
             
+            # Keyset pagination over light task rows (stack of page cursors)
+            cursors = st.session_state.setdefault("queue_cursors", [None])
+            all_task_list = st.session_state.db.list_tasks(MANAGED_STATUSES, limit=QUEUE_PAGE_SIZE, after=cursors[-1])
+            c_prev, c_info, c_next = st.columns([1, 4, 1])
+            with c_prev:
+                if st.button("◀ Prev", disabled=len(cursors) <= 1, key="queue_prev"):
+                    cursors.pop()
+                    st.rerun()
+            with c_info:
+                start = (len(cursors) - 1) * QUEUE_PAGE_SIZE
+                st.caption(f"Showing {start + 1 if all_task_list else 0}-{start + len(all_task_list)} of {total_tasks} tasks")
+            with c_next:
+                if st.button("Next ▶", disabled=len(all_task_list) < QUEUE_PAGE_SIZE, key="queue_next"):
+                    cursors.append((all_task_list[-1]['created_at'], str(all_task_list[-1]['doc_id'])))
+                    st.rerun()
+            
             st.divider()
             for t in all_task_list:
-                fname = t.get('config', {}).get('filename', str(t['doc_id']))
-                with st.expander(f"**{fname}** - `{t['status']}`"):
+                with st.expander(f"**{t['filename']}** - `{t['status']}`"):
                     doc = st.session_state.db.get_document(t['doc_id'])
                     if doc:
                         new_content = st.text_area("Edit Content", value=doc['content'], height=200, key=f"edit_q_{t['doc_id']}")
@@ -195,10 +227,11 @@ def render_upload_tab():
                         c1, c2, c3 = st.columns([1, 1, 1])
                         if c1.button("Save Changes", key=f"save_q_{t['doc_id']}", type="primary"):
                             # Re-embed and update
-                            new_emb = st.session_state.embedder.encode(new_content).tolist()
+                            new_emb = st.session_state.db.encode_cached(st.session_state.embedder, new_content)
                             st.session_state.db.upsert_document(
                                 doc['id'], doc['category'], doc['level'], doc['metadata'], new_content, new_emb
                             )
+                            st.session_state.db.sync_chunks(doc['id'], new_content, st.session_state.embedder)
                             st.success("Changes saved!")
                             st.rerun()
                         
@@ -216,26 +249,25 @@ def render_upload_tab():
                             st.session_state.db.delete_task(t['doc_id'])
                             st.rerun()
 
-    # Worker Status Check
-    def is_worker_running():
-        try:
-            # Check if ps exists and if the worker is running
-            cmd = "ps aux | grep '[w]orker.py'"
-            result = subprocess.check_output(cmd, shell=True).decode()
-            return len(result.strip()) > 0
-        except subprocess.CalledProcessError:
-            # grep returns 1 if not found, which triggers this
-            return False
-        except Exception as e:
-            # ps might be missing (common in slim docker images)
-            return False
-
+    # Worker Status (supervisor lock + per-process heartbeats)
     st.sidebar.divider()
-    worker_ok = is_worker_running()
-    if worker_ok:
-        st.sidebar.success("✅ Worker: Running")
+    heartbeats = st.session_state.db.get_worker_heartbeats()
+    live = [hb for hb in heartbeats if float(hb['age_seconds']) <= WORKER_STALE_SECONDS]
+    supervised = is_worker_running()
+    if supervised:
+        st.sidebar.success(f"✅ Worker: Running ({len(live)} process(es))")
+    elif live:
+        st.sidebar.info(f"ℹ️ Worker: {len(live)} process(es), no local supervisor")
     else:
         st.sidebar.error("❌ Worker: Stopped")
+    if not supervised:
         if st.sidebar.button("Try Start Worker"):
-            subprocess.Popen(["python3", "src/worker.py"], start_new_session=True)
+            start_worker()
             st.rerun()
+    if heartbeats:
+        with st.sidebar.expander("Worker Processes"):
+            for hb in heartbeats:
+                state = hb['status'] if float(hb['age_seconds']) <= WORKER_STALE_SECONDS else "stale"
+                tasks = f" · {len(hb['current_tasks'])} task(s)" if hb.get('current_tasks') else ""
+                st.caption(f"{hb['host']}:{hb['pid']} (slot {hb['slot'] if hb['slot'] is not None else '-'}) · "
+                           f"`{state}`{tasks} · beat {float(hb['age_seconds']):.0f}s ago")
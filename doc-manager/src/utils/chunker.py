@@ -0,0 +1,47 @@
+import re
+
+def split_markdown(text, chunk_size=800, overlap=100):
+    """
+    Splits a Markdown document into chunks for embedding.
+
+    The text is cut at headings and blank lines, and the resulting blocks are packed
+    into chunks of up to `chunk_size` characters. A block longer than `chunk_size`
+    is split into fixed windows. Each chunk starts with the last `overlap` characters
+    of the previous one, so a chunk is at most about `chunk_size + overlap` long.
+
+    Args:
+        text (str): Document content.
+        chunk_size (int): Target chunk length in characters.
+        overlap (int): Characters carried over from the previous chunk.
+
+    Returns:
+        list: Chunk strings (empty for empty text).
+    """
+    if not text or not text.strip():
+        return []
+    overlap = max(0, min(overlap, chunk_size // 2))
+
+    blocks = [b.strip() for b in re.split(r'\n(?=#{1,6}\s)|\n\s*\n', text) if b.strip()]
+    pieces = []
+    for block in blocks:
+        if len(block) <= chunk_size:
+            pieces.append(block)
+            continue
+        step = chunk_size - overlap
+        for start in range(0, len(block), step):
+            pieces.append(block[start:start + chunk_size])
+            if start + chunk_size >= len(block):
+                break
+
+    chunks = []
+    current = ""
+    for piece in pieces:
+        if current and len(current) + 2 + len(piece) > chunk_size:
+            chunks.append(current)
+            tail = current[-overlap:] if overlap else ""
+            current = f"{tail}\n\n{piece}" if tail else piece
+        else:
+            current = f"{current}\n\n{piece}" if current else piece
+    if current:
+        chunks.append(current)
+    return chunks
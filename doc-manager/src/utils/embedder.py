@@ -0,0 +1,31 @@
+import streamlit as st
+from embed_client import load_embedder
+
+DEFAULT_EMBEDDING_MODEL = 'paraphrase-multilingual-MiniLM-L12-v2'
+
+@st.cache_resource
+def get_embedder(model_name=DEFAULT_EMBEDDING_MODEL):
+    """
+    Initializes and caches a SentenceTransformer model (one instance per model name).
+    
+    CRITICAL CONFIGURATION NOTE:
+    The `cache_folder` is explicitly set to "/app/embed".
+    This path corresponds to a directory inside the Docker container.
+    
+    1. Docker Mount: The host machine's `./embed` directory is mounted to `/app/embed`.
+       (See `docker-compose.yml` services: doc-manager: volumes)
+    2. Shared Storage: This ensures that downloaded models are stored persistently 
+       on the host (not inside the container's ephemeral file system) and can be 
+       shared across different projects (e.g., RAG) by mounting the same host directory.
+    3. User Transparency: Users don't need to configure this path in config.json 
+       as it is an internal structural decision for the Docker environment.
+    4. Keyed by Name: During a shadow migration the Settings tab loads the target
+       model alongside the active one; both stay cached.
+    5. Shared Server: If `EMBED_SERVER_URL` is set, encoding goes to the shared
+       embedding server (see embed-server/client/embed_client.py) and the model is only loaded
+       in-process as a fallback.
+
+    `model_name_or_path` always holds the configured name (used for bookkeeping
+    in embedding_versions).
+    """
+    return load_embedder(model_name, cache_folder="/app/embed")
@@ -2,8 +2,12 @@ import frontmatter
 import uuid_utils as uuid
 import re
 import os
+import json
 from datetime import datetime
 
+# Standard UUID pattern
+_UUID_RE = re.compile(r'[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}', re.IGNORECASE)
+
 class MDProcessor:
     @staticmethod
     def generate_uuid_v7(timestamp=None):
@@ -30,43 +34,55 @@ class MDProcessor:
         return datetime.today().strftime("%Y-%m-%d")
 
     @staticmethod
-    def extract_uuid(content, filename=None):
+    def parse(content, filename=None):
         """
-        Extract UUID from frontmatter or content.
-        If filename is a UUID, use it.
+        Single-pass parse of a Markdown file: UUID, frontmatter metadata and body.
+
+        The frontmatter is parsed once. The UUID comes from the frontmatter (`id` or
+        `uuid`), then the first UUID in the text, then the filename.
+        The body has the frontmatter removed when the UUID came from it; otherwise the
+        text is kept as is (same as the previous extract_uuid behaviour, so re-imported
+        files keep their content hash).
+        Metadata is made JSON-safe (YAML dates and other objects become strings).
+
+        Returns:
+            tuple: (uuid str or None, metadata dict, body str)
         """
-        # 1. Try frontmatter
         try:
             post = frontmatter.loads(content)
-            if 'id' in post.metadata:
-                return str(post.metadata['id']), post.content
-            if 'uuid' in post.metadata:
-                return str(post.metadata['uuid']), post.content
-        except:
-            pass
+            meta, fm_body = post.metadata, post.content
+        except Exception:
+            meta, fm_body = {}, None
+        meta = json.loads(json.dumps(meta, default=str)) if meta else {}
 
-        # 2. Try regex (standard UUID pattern)
-        uuid_pattern = r'[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}'
-        match = re.search(uuid_pattern, content, re.IGNORECASE)
+        # 1. Frontmatter
+        for key in ('id', 'uuid'):
+            if key in meta:
+                return str(meta[key]), meta, fm_body
+
+        # 2. First UUID anywhere in the text
+        match = _UUID_RE.search(content)
         if match:
-            # We assume the content remains the same unless it's specifically frontmatter
-            return match.group(0), content
+            return match.group(0), meta, content
 
-        # 3. Check filename
+        # 3. Filename
         if filename:
             name_without_ext = os.path.splitext(os.path.basename(filename))[0]
-            if re.match(uuid_pattern, name_without_ext, re.IGNORECASE):
-                return name_without_ext, content
+            if _UUID_RE.match(name_without_ext):
+                return name_without_ext, meta, content
+
+        return None, meta, content
 
-        return None, content
+    @staticmethod
+    def extract_uuid(content, filename=None):
+        """
+        Extract UUID from frontmatter or content.
+        If filename is a UUID, use it.
+        """
+        doc_uuid, _, body = MDProcessor.parse(content, filename)
+        return doc_uuid, body
 
     @staticmethod
     def prepare_metadata(content):
         """Extract basic keywords/metadata if possible from MD structure"""
-        meta = {}
-        try:
-            post = frontmatter.loads(content)
-            meta = post.metadata
-        except:
-            pass
-        return meta
+        return MDProcessor.parse(content)[1]
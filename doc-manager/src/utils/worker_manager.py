@@ -1,67 +1,66 @@
 import subprocess
 import logging
+import fcntl
 import os
 import sys
 
 logger = logging.getLogger(__name__)
 
+SRC_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SUPERVISOR_PATH = os.path.join(SRC_DIR, 'supervisor.py')
+# Held (flock) by the running supervisor for its whole lifetime: one supervisor per host
+SUPERVISOR_LOCK = os.path.join(SRC_DIR, 'supervisor.lock')
+
 def is_worker_running():
-    """Check if src/worker.py is currently running using ps."""
+    """
+    Check if the worker supervisor (src/supervisor.py) is running on this host.
+
+    The supervisor holds an exclusive lock on `SUPERVISOR_LOCK`; if we can take the
+    lock, nobody is running. Unlike matching process names, this cannot be fooled by
+    an unrelated process (an editor, a `tail worker.log`, ...).
+    """
     try:
-        # Check for python process running worker.py
-        # We use pgrep -f which matches against the full command line
-        result = subprocess.run(['pgrep', '-f', 'worker.py'], stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-        return result.returncode == 0
+        with open(SUPERVISOR_LOCK, 'a') as f:
+            try:
+                fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                return True
+            fcntl.flock(f, fcntl.LOCK_UN)
+            return False
     except Exception as e:
         logger.error(f"Error checking worker status: {e}")
         return False
 
 def start_worker():
-    """Start the worker.py process in the background."""
+    """Start the worker supervisor in the background (it starts and restarts the worker processes)."""
     try:
-        # Assuming we are running from the project root or src directory
-        # We need to find the absolute path to worker.py
-        
-        # Get the directory of this file (src/utils)
-        current_dir = os.path.dirname(os.path.abspath(__file__))
-        # Go up one level to src
-        src_dir = os.path.dirname(current_dir)
-        project_root = os.path.dirname(src_dir)
-        
-        worker_path = os.path.join(src_dir, 'worker.py')
-        
-        if not os.path.exists(worker_path):
-            logger.error(f"Worker script not found at {worker_path}")
+        if not os.path.exists(SUPERVISOR_PATH):
+            logger.error(f"Supervisor script not found at {SUPERVISOR_PATH}")
             return False
 
-        # Use the same python interpreter as the current process
-        python_executable = sys.executable
+        logger.info(f"Starting worker supervisor: {sys.executable} {SUPERVISOR_PATH}")
 
-        logger.info(f"Starting worker: {python_executable} {worker_path}")
-        
-        # Start the worker detached
-        # We redirect stdout/stderr to files to avoid blocking
-        with open(os.path.join(src_dir, 'worker_stdout.log'), 'a') as out, \
-             open(os.path.join(src_dir, 'worker.log'), 'a') as err:
+        # Detached, with absolute paths: works from any working directory
+        with open(os.path.join(SRC_DIR, 'worker_stdout.log'), 'a') as out:
             subprocess.Popen(
-                [python_executable, worker_path],
-                cwd=src_dir,
+                [sys.executable, SUPERVISOR_PATH],
+                cwd=SRC_DIR,
                 stdout=out,
-                stderr=err,
+                stderr=subprocess.STDOUT,
                 start_new_session=True # Detach from parent
             )
         return True
     except Exception as e:
-        logger.error(f"Failed to start worker: {e}")
+        logger.error(f"Failed to start worker supervisor: {e}")
         return False
 
 def ensure_worker_running():
-    """Check if worker is running, and start it if not."""
+    """Check if the worker supervisor is running, and start it if not."""
     if not is_worker_running():
-        logger.warning("Worker process not found. Attempting to start...")
+        logger.warning("Worker supervisor not running. Attempting to start...")
         if start_worker():
-            logger.info("Worker process started successfully.")
+            logger.info("Worker supervisor started successfully.")
         else:
-            logger.error("Failed to auto-start worker process.")
+            logger.error("Failed to auto-start worker supervisor.")
     else:
-        logger.debug("Worker is already running.")
+        logger.debug("Worker supervisor is already running.")
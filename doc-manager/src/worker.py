@@ -1,8 +1,14 @@
+import os
+import signal
+import socket
+import threading
 import time
 import json
 import logging
+from concurrent.futures import ThreadPoolExecutor
 from db_manager import DBManager
-from llm_client import LLMClient, RetryableLLMError
+from llm_client import LLMClient, RetryableLLMError, StructuredOutputError, InvalidStructuredResponse
+from utils.config_loader import load_config
 
 # Setup Logging
 logging.basicConfig(
@@ -16,126 +22,375 @@ logging.basicConfig(
 logger = logging.getLogger("Worker")
 
 class BackgroundWorker:
+    """
+    Two-stage LLM queue consumer.
+
+    Tasks are claimed atomically (`DBManager.claim_tasks`, SKIP LOCKED) with a
+    lease, so any number of workers - on this or other machines - can drain the
+    queue in parallel. A crashed worker's tasks return to the queue once their
+    lease expires.
+
+    Within one worker, Stage 1 (model L) and Stage 2 (model R) run as independent
+    consumer threads, so one model's GPU does not idle while the other works.
+    Requests to each model are capped by a per-model semaphore
+    (`worker.model_concurrency` in config.json), and a task's metadata and summary
+    requests are issued in parallel unless `worker.parallel_requests` is false.
+
+    Telemetry goes to `task_events` (see `DBManager.get_task_stats`): queue wait per
+    claim, latency and token usage per LLM call, and duration per finished/failed stage.
+    Stages are identified by the queue they are claimed from ('queued', 'queued_r').
+
+    Liveness: a heartbeat thread refreshes this process's `worker_heartbeats` row
+    (status, tasks in progress) every `worker.heartbeat_interval` seconds; the
+    supervisor (supervisor.py) restarts workers whose beat goes stale. The same
+    thread renews the leases of all tasks in progress (every quarter lease), so a
+    long LLM call on any request path never lets another worker re-claim the task.
+    On SIGTERM the worker drains: it stops claiming, finishes the tasks in progress
+    and exits.
+    """
+    STAGES = {
+        # stage: (claim from, claim to, label)
+        'l': ('queued', 'processing_l', 'Queue 1'),
+        'r': ('queued_r', 'processing_r', 'Queue 2'),
+    }
+
     def __init__(self):
         self.db = DBManager()
         self.llm = LLMClient()
-        logger.info("Worker Initialized")
+        worker_conf = load_config().get("worker", {})
+        self.lease_seconds = int(worker_conf.get("lease_seconds", 1800))
+        # Fallback poll when no NOTIFY arrives (missed notification, manual SQL edits)
+        self.poll_interval = float(worker_conf.get("poll_interval", 60))
+        self.stage_threads = int(worker_conf.get("stage_threads", 2))
+        self.parallel_requests = bool(worker_conf.get("parallel_requests", True))
+        # One JSON-schema call for metadata + summary; models that fail it fall back to two calls
+        self.combined_requests = bool(worker_conf.get("combined_requests", False))
+        self._no_structured_output = set()
+        # Invalid combined replies in a row per model; a model is switched to two calls after this many
+        self.structured_max_failures = int(worker_conf.get("structured_output_max_failures", 3))
+        self._structured_failures = {}
+        self.model_concurrency = {"default": 2, **worker_conf.get("model_concurrency", {})}
+        # Retry policy: exponential backoff with jitter, then the 'failed' dead-letter state
+        self.max_attempts = int(worker_conf.get("max_attempts", 5))
+        self.backoff_base = float(worker_conf.get("backoff_base", 30))
+        self.backoff_max = float(worker_conf.get("backoff_max", 1800))
+        self.host = socket.gethostname()
+        self.worker_id = f"{self.host}:{os.getpid()}"
+        # Slot number assigned by the supervisor (None when started by hand)
+        self.slot = int(os.environ['WORKER_SLOT']) if os.getenv('WORKER_SLOT') else None
+        self.heartbeat_interval = float(worker_conf.get("heartbeat_interval", 10))
+        self.lease_renew_interval = max(self.heartbeat_interval, self.lease_seconds / 4)
+        self.telemetry_retention_days = int(worker_conf.get("telemetry_retention_days", 30))
+        self.embedding_cache_retention_days = int(worker_conf.get("embedding_cache_retention_days", 90))
+
+        self._model_slots = {}
+        self._model_slots_lock = threading.Lock()
+        self._wake = {stage: threading.Event() for stage in self.STAGES}
+        self._stopping = threading.Event()
+        self._stopped = threading.Event()
+        # Consumer thread name -> doc_id in progress (reported in the heartbeat)
+        self._current = {}
+        # Runs the second request of a task (see _generate) next to the stage thread
+        self._request_pool = ThreadPoolExecutor(max_workers=self.stage_threads * len(self.STAGES), thread_name_prefix="llm")
+
+        logger.info(f"Worker Initialized ({self.worker_id})")
         self._recover_stuck_tasks()
 
     def _recover_stuck_tasks(self):
-        """Reset any tasks stuck in processing state back to queued on startup."""
-        # Recover L processing
-        stuck_l = self.db.get_tasks_by_status('processing_l')
-        for task in stuck_l:
-            logger.warning(f"Recovering stuck task {task['doc_id']} from processing_l to queued")
-            self.db.update_task(task['doc_id'], status='queued')
-            
-        # Recover R processing
-        stuck_r = self.db.get_tasks_by_status('processing_r')
-        for task in stuck_r:
-            logger.warning(f"Recovering stuck task {task['doc_id']} from processing_r to queued_r")
-            self.db.update_task(task['doc_id'], status='queued_r')
-
-        # Backward compatibility for old 'processing' status
-        old_processing = self.db.get_tasks_by_status('processing')
-        for task in old_processing:
-             # Assume if results_l exists, it was doing R. Else it was doing L.
-             if task.get('results_model_l'):
-                 self.db.update_task(task['doc_id'], status='queued_r')
-             else:
-                 self.db.update_task(task['doc_id'], status='queued')
-                 
+        """Re-queue tasks whose lease expired (or legacy tasks without a lease)."""
+        recovered = self.db.requeue_expired_leases(self.max_attempts)
+        if recovered:
+            logger.warning(f"Recovered {recovered} task(s) with expired leases.")
         logger.info("Task recovery complete.")
 
+    def _slots(self, model):
+        """Per-model semaphore limiting concurrent requests to that model."""
+        with self._model_slots_lock:
+            if model not in self._model_slots:
+                limit = int(self.model_concurrency.get(model, self.model_concurrency["default"]))
+                self._model_slots[model] = threading.BoundedSemaphore(max(limit, 1))
+            return self._model_slots[model]
+
+    def _log_event(self, doc_id, event, stage, started=None, **fields):
+        duration_ms = (time.monotonic() - started) * 1000 if started is not None else None
+        self.db.log_task_event(doc_id, event, stage=stage, worker_id=self.worker_id, duration_ms=duration_ms, **fields)
+
+    def _log_llm_call(self, doc_id, stage, kind, model, started):
+        """Records one real LLM request (latency measured inside the model slot, tokens from the API)."""
+        usage = LLMClient.last_usage() or {}
+        self._log_event(doc_id, 'llm_call', stage, started, model=model, kind=kind,
+                        prompt_tokens=usage.get('prompt_tokens'), completion_tokens=usage.get('completion_tokens'))
+
+    def _call(self, kind, content, model, prompt, bypass_cache=False, doc_id=None, stage=None):
+        """
+        One LLM request through the result cache.
+
+        Identical (model, prompt, content, params) requests are served from `llm_cache`,
+        so re-queued documents and repeated prompts cost nothing. `bypass_cache` forces a
+        new sample (which then replaces the cached one).
+        """
+        key = LLMClient.cache_key(kind, model, prompt, content)
+        if not bypass_cache:
+            started = time.monotonic()
+            cached = self.db.get_llm_cache(key)
+            if cached is not None:
+                logger.info(f"LLM cache hit ({kind}, {model})")
+                self._log_event(doc_id, 'llm_call', stage, started, model=model, kind=kind, cached=True)
+                return cached
+
+        method = self.llm.extract_metadata if kind == 'metadata' else self.llm.generate_content
+        with self._slots(model):
+            started = time.monotonic()
+            result = method(content, model, prompt)
+            self._log_llm_call(doc_id, stage, kind, model, started)
+
+        # The client returns placeholders instead of raising on hard errors: don't cache those
+        failed = (result.startswith("Error:") if kind == 'summary'
+                  else not result.get('keywords') and result.get('title') == "unknown")
+        if not failed:
+            self.db.put_llm_cache(key, kind, model, result)
+        return result
+
+    def _call_combined(self, content, model, config, bypass_cache=False, doc_id=None, stage=None):
+        prompt = f"{config['prompt_meta']}\n\n{config['prompt_summary']}"
+        key = LLMClient.cache_key('combined', model, prompt, content)
+        if not bypass_cache:
+            started = time.monotonic()
+            cached = self.db.get_llm_cache(key)
+            if cached is not None:
+                logger.info(f"LLM cache hit (combined, {model})")
+                self._log_event(doc_id, 'llm_call', stage, started, model=model, kind='combined', cached=True)
+                return cached
+        with self._slots(model):
+            started = time.monotonic()
+            meta, summary = self.llm.extract_all(content, model, config['prompt_meta'], config['prompt_summary'])
+            self._log_llm_call(doc_id, stage, 'combined', model, started)
+        result = {"metadata": meta, "summary": summary}
+        self.db.put_llm_cache(key, 'combined', model, result)
+        return result
+
+    def _generate(self, doc_id, content, model, config, stage):
+        """Runs metadata extraction and summary generation for one task. Returns the results dict."""
+        bypass = bool(config.get('bypass_cache'))
+        ctx = {"doc_id": doc_id, "stage": stage}
+        if self.combined_requests and model not in self._no_structured_output:
+            try:
+                result = self._call_combined(content, model, config, bypass, **ctx)
+                self._structured_failures.pop(model, None)
+                return result
+            except StructuredOutputError as e:
+                logger.warning(f"Combined request unsupported by {model} ({e}). Using separate requests for this model.")
+                self._no_structured_output.add(model)
+            except InvalidStructuredResponse as e:
+                # One bad reply (e.g. truncated summary): two calls for this document only
+                failures = self._structured_failures.get(model, 0) + 1
+                self._structured_failures[model] = failures
+                if failures >= self.structured_max_failures:
+                    logger.warning(f"{failures} invalid combined replies in a row from {model} ({e}). "
+                                   "Using separate requests for this model.")
+                    self._no_structured_output.add(model)
+                else:
+                    logger.warning(f"Invalid combined reply from {model} for {doc_id} ({e}). Using separate requests for this task.")
+
+        if self.parallel_requests:
+            meta_future = self._request_pool.submit(self._call, 'metadata', content, model, config['prompt_meta'], bypass, **ctx)
+            summary = self._call('summary', content, model, config['prompt_summary'], bypass, **ctx)
+            meta = meta_future.result()
+        else:
+            meta = self._call('metadata', content, model, config['prompt_meta'], bypass, **ctx)
+            summary = self._call('summary', content, model, config['prompt_summary'], bypass, **ctx)
+        return {"metadata": meta, "summary": summary}
+
+    def _process_left(self, task):
+        doc_id = task['doc_id']
+        started = time.monotonic()
+        try:
+            config = task['config']
+            doc = self.db.get_document(doc_id)
+            if not doc: 
+                logger.error(f"Doc {doc_id} not found. Removing orphaned task.")
+                self.db.delete_task(doc_id)
+                return
+
+            logger.info(f"[Queue 1] Processing {doc_id} with {config['model_l']}")
+            
+            # Run LLM
+            res_l = self._generate(doc_id, doc['content'], config['model_l'], config, 'queued')
+            
+            # Update Results & Move to Queue 2 (queued_r)
+            if self.db.update_task(doc_id, status='queued_r', results_l=res_l, claimed_by=self.worker_id):
+                self._log_event(doc_id, 'finished', 'queued', started, model=config['model_l'])
+                logger.info(f"[Queue 1] Task {doc_id} complete. Moved to Queue 2.")
+            else:
+                logger.warning(f"[Queue 1] Lost claim on {doc_id} (lease expired). Result discarded.")
+
+        except RetryableLLMError as re:
+            logger.warning(f"LLM Busy/Timeout during task {doc_id} (L): {re}. Backing off...")
+            self._fail(doc_id, 'queued', re, started)
+        except Exception as e:
+            logger.error(f"Error processing task {doc_id} (L): {e}")
+            self._fail(doc_id, 'queued', e, started)
+
+    def _process_right(self, task):
+        doc_id = task['doc_id']
+        started = time.monotonic()
+        try:
+            config = task['config']
+            doc = self.db.get_document(doc_id)
+            if not doc:
+                logger.error(f"Doc {doc_id} not found. Removing orphaned task.")
+                self.db.delete_task(doc_id)
+                return
+
+            model_r = config.get('model_r')
+            if not model_r: 
+                # No R model configured? Mark done.
+                self.db.update_task(doc_id, status='done', claimed_by=self.worker_id)
+                return
+
+            logger.info(f"[Queue 2] Processing {doc_id} with {model_r}")
+            
+            # Run LLM
+            res_r = self._generate(doc_id, doc['content'], model_r, config, 'queued_r')
+            
+            # Update Results & Mark Done
+            if self.db.update_task(doc_id, status='done', results_r=res_r, claimed_by=self.worker_id):
+                self._log_event(doc_id, 'finished', 'queued_r', started, model=model_r)
+                logger.info(f"[Queue 2] Task {doc_id} FULLY DONE.")
+            else:
+                logger.warning(f"[Queue 2] Lost claim on {doc_id} (lease expired). Result discarded.")
+
+        except RetryableLLMError as re:
+            logger.warning(f"LLM Busy/Timeout during task {doc_id} (R): {re}. Backing off...")
+            self._fail(doc_id, 'queued_r', re, started)
+        except Exception as e:
+            logger.error(f"Error processing task {doc_id} (R): {e}")
+            self._fail(doc_id, 'queued_r', e, started)
+
+    def _fail(self, doc_id, retry_status, error, started=None):
+        """Records a failed attempt; the task is retried after a backoff or parked as 'failed'."""
+        self._log_event(doc_id, 'failed', retry_status, started)
+        status = self.db.fail_task(doc_id, self.worker_id, retry_status, f"{type(error).__name__}: {error}",
+                                   self.max_attempts, self.backoff_base, self.backoff_max)
+        if status == 'failed':
+            logger.error(f"Task {doc_id} failed {self.max_attempts} times. Moved to 'failed'.")
+
+    def _consume(self, stage):
+        """Stage consumer thread: claim one task at a time, sleep on the stage's wake event when empty."""
+        from_status, to_status, label = self.STAGES[stage]
+        process = self._process_left if stage == 'l' else self._process_right
+        wake = self._wake[stage]
+        name = threading.current_thread().name
+        while not self._stopping.is_set():
+            try:
+                # Clear before claiming: a wake-up that races with an empty claim is not lost
+                wake.clear()
+                tasks = self.db.claim_tasks(from_status, to_status, self.worker_id, lease_seconds=self.lease_seconds)
+                for task in tasks:
+                    self._current[name] = task['doc_id']
+                    try:
+                        process(task)
+                    finally:
+                        self._current.pop(name, None)
+                if not tasks:
+                    # Backoffs expire silently: wake up for the earliest retry in this queue
+                    retry_in = self.db.seconds_until_next_retry(from_status)
+                    wake.wait(min(self.poll_interval, retry_in + 0.5) if retry_in is not None else None)
+            except Exception as e:
+                logger.error(f"[{label}] Consumer Error: {e}")
+                self._stopping.wait(5)
+
+    def _beat(self):
+        status = 'draining' if self._stopping.is_set() else ('busy' if self._current else 'idle')
+        self.db.worker_heartbeat(self.worker_id, self.host, os.getpid(), self.slot, status, list(self._current.values()))
+
+    def _renew_leases(self):
+        doc_ids = list(self._current.values())
+        if doc_ids:
+            self.db.renew_leases(doc_ids, self.worker_id, self.lease_seconds)
+
+    def _heartbeat_loop(self):
+        # Keeps beating (and renewing leases) while draining, so the supervisor does not
+        # mistake a long drain for a hang and in-progress tasks keep their claims
+        last_renew = time.monotonic()
+        while not self._stopped.wait(self.heartbeat_interval):
+            try:
+                self._beat()
+                if time.monotonic() - last_renew >= self.lease_renew_interval:
+                    self._renew_leases()
+                    last_renew = time.monotonic()
+            except Exception as e:
+                logger.error(f"Heartbeat error: {e}")
+
+    def stop(self, *_):
+        """Graceful shutdown: stop claiming, let in-progress tasks finish (see run)."""
+        if not self._stopping.is_set():
+            logger.info("Shutdown requested. Draining in-progress tasks...")
+            self._stopping.set()
+            for wake in self._wake.values():
+                wake.set()
+
     def run(self):
         logger.info("Worker Interrupted. Starting loop...")
-        while True:
+        # LISTEN before the consumers' first queue check so no enqueue slips in between
+        try:
+            self.db.listen_tasks()
+        except Exception as e:
+            logger.error(f"Could not LISTEN for task notifications: {e}. Falling back to polling.")
+
+        self._beat()
+        threading.Thread(target=self._heartbeat_loop, daemon=True, name="heartbeat").start()
+
+        consumers = []
+        for stage in self.STAGES:
+            for n in range(self.stage_threads):
+                t = threading.Thread(target=self._consume, args=(stage,), daemon=True, name=f"stage-{stage}-{n}")
+                t.start()
+                consumers.append(t)
+
+        # Main thread: route NOTIFYs to the stage consumers
+        last_poll = time.monotonic()
+        while not self._stopping.is_set():
             try:
-                # --- STAGE 1: LEFT MODEL (Queue 1) ---
-                tasks_q1 = self.db.get_tasks_by_status('queued')
-                
-                if tasks_q1:
-                    logger.info(f"Found {len(tasks_q1)} tasks in Queue 1 (Left). Processing...")
-                    for task in tasks_q1:
-                        doc_id = task['doc_id']
-                        try:
-                            config = task['config']
-                            doc = self.db.get_document(doc_id)
-                            if not doc: 
-                                logger.error(f"Doc {doc_id} not found. Skipping.")
-                                continue
-
-                            # 1. Update Status -> processing_l
-                            self.db.update_task(doc_id, status='processing_l')
-                            logger.info(f"[Queue 1] Processing {doc_id} with {config['model_l']}")
-                            
-                            # 2. Run LLM
-                            meta_l = self.llm.extract_metadata(doc['content'], config['model_l'], config['prompt_meta'])
-                            sum_l = self.llm.generate_content(doc['content'], config['model_l'], config['prompt_summary'])
-                            
-                            res_l = {"metadata": meta_l, "summary": sum_l}
-                            
-                            # 3. Update Results & Move to Queue 2 (queued_r)
-                            self.db.update_task(doc_id, status='queued_r', results_l=res_l)
-                            logger.info(f"[Queue 1] Task {doc_id} complete. Moved to Queue 2.")
-
-                        except RetryableLLMError as re:
-                            logger.warning(f"LLM Busy/Timeout during task {doc_id} (L): {re}. Skipping for now...")
-                            # Revert to queued so it can be picked up again
-                            self.db.update_task(doc_id, status='queued')
-                        except Exception as e:
-                            logger.error(f"Error processing task {doc_id} (L): {e}")
-                            # Keep in processing_l or move to error state? 
-                            # For simplicity, revert to queued to retry or manual fix
-                            self.db.update_task(doc_id, status='queued')
-
-                # --- STAGE 2: RIGHT MODEL (Queue 2) ---
-                tasks_q2 = self.db.get_tasks_by_status('queued_r')
-                
-                if tasks_q2:
-                    logger.info(f"Found {len(tasks_q2)} tasks in Queue 2 (Right). Processing...")
-                    for task in tasks_q2:
-                        doc_id = task['doc_id']
-                        try:
-                            config = task['config']
-                            doc = self.db.get_document(doc_id)
-                            if not doc: continue
-
-                            model_r = config.get('model_r')
-                            if not model_r: 
-                                # No R model configured? Mark done.
-                                self.db.update_task(doc_id, status='done')
-                                continue
-
-                            # 1. Update Status -> processing_r
-                            self.db.update_task(doc_id, status='processing_r')
-                            logger.info(f"[Queue 2] Processing {doc_id} with {model_r}")
-                            
-                            # 2. Run LLM
-                            meta_r = self.llm.extract_metadata(doc['content'], model_r, config['prompt_meta'])
-                            sum_r = self.llm.generate_content(doc['content'], model_r, config['prompt_summary'])
-                            
-                            res_r = {"metadata": meta_r, "summary": sum_r}
-                            
-                            # 3. Update Results & Mark Done
-                            self.db.update_task(doc_id, status='done', results_r=res_r)
-                            logger.info(f"[Queue 2] Task {doc_id} FULLY DONE.")
-
-                        except RetryableLLMError as re:
-                            logger.warning(f"LLM Busy/Timeout during task {doc_id} (R): {re}. Skipping for now...")
-                            self.db.update_task(doc_id, status='queued_r')
-                        except Exception as e:
-                            logger.error(f"Error processing task {doc_id} (R): {e}")
-                            self.db.update_task(doc_id, status='queued_r')
-
-                
-                if not tasks_q1 and not tasks_q2:
-                    time.sleep(2)
-                
+                # Short waits so a shutdown request (the signal handler only sets a flag) is seen quickly
+                statuses = self.db.wait_for_tasks(timeout=min(self.poll_interval, 5))
+                self._sweep_expired_leases()
+                if not statuses and time.monotonic() - last_poll >= self.poll_interval:
+                    # Fallback poll
+                    statuses = ['poll']
+                if 'poll' in statuses:
+                    last_poll = time.monotonic()
+                for stage, (from_status, _, _) in self.STAGES.items():
+                    if any(s in (from_status, 'requeued', 'reconnect', 'poll') for s in statuses):
+                        self._wake[stage].set()
             except Exception as main_e:
                 logger.error(f"Worker Loop Error: {main_e}")
                 time.sleep(5)
 
+        # Drain: consumers exit after their current task
+        self._beat()
+        for t in consumers:
+            t.join()
+        self._stopped.set()
+        self.db.remove_worker_heartbeat(self.worker_id)
+        self.db.close()
+        logger.info("Worker stopped.")
+
+    def _sweep_expired_leases(self):
+        """Periodic lease sweep (any worker may re-queue a dead worker's tasks)."""
+        now = time.time()
+        if now - getattr(self, '_last_sweep', 0) >= 60:
+            self._last_sweep = now
+            recovered = self.db.requeue_expired_leases(self.max_attempts)
+            if recovered:
+                logger.warning(f"Re-queued {recovered} task(s) with expired leases.")
+        if now - getattr(self, '_last_prune', 0) >= 3600:
+            self._last_prune = now
+            self.db.prune_task_events(self.telemetry_retention_days)
+            self.db.prune_embedding_cache(self.embedding_cache_retention_days)
+
 if __name__ == "__main__":
     worker = BackgroundWorker()
+    signal.signal(signal.SIGTERM, worker.stop)
+    signal.signal(signal.SIGINT, worker.stop)
     worker.run()
@@ -12,8 +12,8 @@ from utils.worker_manager import is_worker_running
 def test_auto_start():
     print("Checking initial worker state...")
     if is_worker_running():
-        print("Worker is running. Killing it for test...")
-        os.system("pkill -f worker.py")
+        print("Worker is running. Stopping it for test...")
+        os.system("pkill -f supervisor.py")
         time.sleep(2)
         if is_worker_running():
             print("Failed to kill worker. Test aborted.")
@@ -0,0 +1,101 @@
+"""
+Thin client for the shared embedding server (embed-server/src/embed_server.py).
+
+`load_embedder` returns an object with the subset of the SentenceTransformer API the
+apps use (`encode`, `get_sentence_embedding_dimension`, `model_name_or_path`):
+
+- If `EMBED_SERVER_URL` is set and the server answers, encoding is done remotely
+  (one resident model shared by all apps, requests micro-batched by the server).
+- Otherwise - or if the server goes away later - the model is loaded in-process.
+
+Single shared copy: apps install this directory as the `embed_client` package
+(`pip install embed-server/client`; the Dockerfiles do it through the
+`embed_client` build context, see docker-compose.yml).
+"""
+import os
+import logging
+import threading
+
+import numpy as np
+import requests
+
+logger = logging.getLogger(__name__)
+
+EMBED_SERVER_URL = os.getenv('EMBED_SERVER_URL', '')
+EMBED_SERVER_TIMEOUT = float(os.getenv('EMBED_SERVER_TIMEOUT', 120))
+
+
+def _local_model(model_name, cache_folder=None):
+    from sentence_transformers import SentenceTransformer
+    kwargs = {"cache_folder": cache_folder} if cache_folder else {}
+    return SentenceTransformer(model_name, **kwargs)
+
+
+class RemoteEmbedder:
+    """SentenceTransformer stand-in backed by the embedding server, with in-process fallback."""
+
+    def __init__(self, model_name, server_url, dim, cache_folder=None):
+        self.model_name_or_path = model_name
+        self.server_url = server_url.rstrip('/')
+        self._dim = dim
+        self._cache_folder = cache_folder
+        self._local = None
+        self._local_lock = threading.Lock()
+        self._session = requests.Session()
+
+    def get_sentence_embedding_dimension(self):
+        return self._dim
+
+    def _fallback(self):
+        with self._local_lock:
+            if self._local is None:
+                logger.warning(f"Embedding server unavailable. Loading {self.model_name_or_path} in-process.")
+                self._local = _local_model(self.model_name_or_path, self._cache_folder)
+        return self._local
+
+    def encode(self, sentences, batch_size=32, normalize_embeddings=False, **kwargs):
+        """
+        Same shape contract as SentenceTransformer.encode with convert_to_numpy:
+        a single string gives a 1-D array, a list gives a 2-D array.
+        """
+        if self._local is not None:
+            return self._local.encode(sentences, batch_size=batch_size, normalize_embeddings=normalize_embeddings, **kwargs)
+
+        single = isinstance(sentences, str)
+        texts = [sentences] if single else list(sentences)
+        try:
+            response = self._session.post(
+                f"{self.server_url}/embed",
+                json={"model": self.model_name_or_path, "texts": texts},
+                timeout=EMBED_SERVER_TIMEOUT,
+            )
+            response.raise_for_status()
+            vectors = np.asarray(response.json()["embeddings"], dtype=np.float32).reshape(len(texts), self._dim)
+        except (requests.exceptions.RequestException, KeyError, ValueError) as e:
+            logger.error(f"Embedding server request failed: {e}")
+            return self._fallback().encode(sentences, batch_size=batch_size, normalize_embeddings=normalize_embeddings, **kwargs)
+
+        if normalize_embeddings:
+            norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+            vectors = vectors / np.where(norms == 0, 1, norms)
+        return vectors[0] if single else vectors
+
+
+def load_embedder(model_name, cache_folder=None, server_url=None):
+    """
+    Returns a RemoteEmbedder if the embedding server serves `model_name`,
+    otherwise an in-process SentenceTransformer.
+    """
+    server_url = server_url if server_url is not None else EMBED_SERVER_URL
+    if server_url:
+        try:
+            response = requests.get(f"{server_url.rstrip('/')}/info", params={"model": model_name}, timeout=EMBED_SERVER_TIMEOUT)
+            response.raise_for_status()
+            dim = int(response.json()["dim"])
+            logger.info(f"Using embedding server {server_url} for {model_name} (dim {dim})")
+            return RemoteEmbedder(model_name, server_url, dim, cache_folder)
+        except Exception as e:
+            logger.warning(f"Embedding server {server_url} unavailable ({e}). Loading {model_name} in-process.")
+    model = _local_model(model_name, cache_folder)
+    model.model_name_or_path = model_name
+    return model
@@ -0,0 +1,184 @@
+"""
+Shared Embedding Server
+-----------------------
+Keeps SentenceTransformer models resident in one process and serves them over HTTP
+to doc-manager, the RAG workbench, rag_diary and news-reader (client:
+`client/embed_client.py`, installed into each app).
+
+- **One copy per model**: models are loaded on first use (or preloaded via
+  `EMBED_PRELOAD_MODELS`) and stay in memory.
+- **Micro-batching**: concurrent requests for the same model are coalesced into a
+  single `encode` call (up to `EMBED_MAX_BATCH` texts, waiting at most
+  `EMBED_MAX_WAIT_MS` for more requests to arrive).
+
+Endpoints:
+    GET  /health                  -> {"status": "ok"}
+    GET  /models                  -> {"models": [{"model", "dim"}, ...]}  (loaded models)
+    GET  /info?model=<name>       -> {"model", "dim"}  (loads the model if needed)
+    POST /embed {"model", "texts"} -> {"model", "dim", "embeddings": [[...], ...]}
+
+Usage:
+    python src/embed_server.py
+"""
+import os
+import json
+import time
+import queue
+import logging
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlparse, parse_qs
+
+from sentence_transformers import SentenceTransformer
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger("EmbedServer")
+
+HOST = os.getenv('EMBED_HOST', '0.0.0.0')
+PORT = int(os.getenv('EMBED_PORT', 8520))
+CACHE_FOLDER = os.getenv('EMBED_CACHE_FOLDER', '/app/embed')
+MAX_BATCH = int(os.getenv('EMBED_MAX_BATCH', 64))
+MAX_WAIT_MS = float(os.getenv('EMBED_MAX_WAIT_MS', 10))
+MAX_TEXTS_PER_REQUEST = int(os.getenv('EMBED_MAX_TEXTS_PER_REQUEST', 4096))
+PRELOAD_MODELS = [m.strip() for m in os.getenv('EMBED_PRELOAD_MODELS', '').split(',') if m.strip()]
+
+
+class _Request:
+    """One pending /embed call waiting for its slice of a batch."""
+    def __init__(self, texts):
+        self.texts = texts
+        self.done = threading.Event()
+        self.embeddings = None
+        self.error = None
+
+
+class ModelBatcher:
+    """
+    A resident model plus the thread that drains its request queue in micro-batches.
+
+    Requests are collected until `MAX_BATCH` texts are pending or `MAX_WAIT_MS` has
+    passed since the first one, then encoded together and split back per request.
+    """
+    def __init__(self, model_name):
+        self.model_name = model_name
+        self.model = SentenceTransformer(model_name, cache_folder=CACHE_FOLDER)
+        self.dim = self.model.get_sentence_embedding_dimension()
+        self._queue = queue.Queue()
+        threading.Thread(target=self._run, daemon=True, name=f"batcher-{model_name}").start()
+
+    def encode(self, texts):
+        req = _Request(texts)
+        self._queue.put(req)
+        req.done.wait()
+        if req.error is not None:
+            raise req.error
+        return req.embeddings
+
+    def _run(self):
+        while True:
+            batch = [self._queue.get()]
+            pending = len(batch[0].texts)
+            deadline = time.monotonic() + MAX_WAIT_MS / 1000
+            while pending < MAX_BATCH:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    req = self._queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                batch.append(req)
+                pending += len(req.texts)
+
+            texts = [t for req in batch for t in req.texts]
+            try:
+                vectors = self.model.encode(texts, batch_size=MAX_BATCH, convert_to_numpy=True).tolist()
+                offset = 0
+                for req in batch:
+                    req.embeddings = vectors[offset:offset + len(req.texts)]
+                    offset += len(req.texts)
+            except Exception as e:
+                logger.error(f"Encode failed ({self.model_name}, {len(texts)} texts): {e}")
+                for req in batch:
+                    req.error = e
+            finally:
+                for req in batch:
+                    req.done.set()
+
+
+_batchers = {}
+_batchers_lock = threading.Lock()
+
+def get_batcher(model_name):
+    """Loads (once) and returns the batcher for `model_name`."""
+    with _batchers_lock:
+        if model_name not in _batchers:
+            logger.info(f"Loading model {model_name}...")
+            _batchers[model_name] = ModelBatcher(model_name)
+            logger.info(f"Loaded {model_name} (dim {_batchers[model_name].dim})")
+        return _batchers[model_name]
+
+
+class EmbedHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def _send(self, status, body):
+        data = json.dumps(body).encode('utf-8')
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        if url.path == "/health":
+            return self._send(200, {"status": "ok"})
+        if url.path == "/models":
+            with _batchers_lock:
+                models = [{"model": b.model_name, "dim": b.dim} for b in _batchers.values()]
+            return self._send(200, {"models": models})
+        if url.path == "/info":
+            model_name = (parse_qs(url.query).get("model") or [""])[0]
+            if not model_name:
+                return self._send(400, {"error": "model is required"})
+            try:
+                b = get_batcher(model_name)
+            except Exception as e:
+                return self._send(500, {"error": f"Could not load {model_name}: {e}"})
+            return self._send(200, {"model": b.model_name, "dim": b.dim})
+        self._send(404, {"error": "not found"})
+
+    def do_POST(self):
+        if urlparse(self.path).path != "/embed":
+            return self._send(404, {"error": "not found"})
+        try:
+            length = int(self.headers.get("Content-Length", 0))
+            payload = json.loads(self.rfile.read(length) or b"{}")
+            model_name = payload["model"]
+            texts = payload["texts"]
+            if not isinstance(texts, list) or not all(isinstance(t, str) for t in texts):
+                raise ValueError("texts must be a list of strings")
+            if len(texts) > MAX_TEXTS_PER_REQUEST:
+                raise ValueError(f"at most {MAX_TEXTS_PER_REQUEST} texts per request")
+        except (KeyError, ValueError) as e:
+            return self._send(400, {"error": f"Bad request: {e}"})
+
+        try:
+            b = get_batcher(model_name)
+            embeddings = b.encode(texts) if texts else []
+        except Exception as e:
+            return self._send(500, {"error": str(e)})
+        self._send(200, {"model": b.model_name, "dim": b.dim, "embeddings": embeddings})
+
+    def log_message(self, format, *args):
+        logger.debug(format % args)
+
+
+if __name__ == "__main__":
+    for name in PRELOAD_MODELS:
+        get_batcher(name)
+    server = ThreadingHTTPServer((HOST, PORT), EmbedHandler)
+    server.daemon_threads = True
+    logger.info(f"Embedding server listening on {HOST}:{PORT} (max batch {MAX_BATCH}, max wait {MAX_WAIT_MS}ms)")
+    server.serve_forever()
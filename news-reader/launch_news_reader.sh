@@ -6,7 +6,7 @@ PORT=8503
 
 # 1. Build the image
 echo "Building Docker image..."
-docker build -t $IMAGE_NAME .
+docker build --build-context embed_client=../embed-server/client -t $IMAGE_NAME .
 
 # 2. Stop/Remove existing container
 if [ "$(docker ps -aq -f name=$CONTAINER_NAME)" ]; then
@@ -4,18 +4,21 @@ News Reader Application (Streamlit)
 A comprehensive news aggregation and summarization platform.
 
 Features:
-- **Live Feed**: Fetches RSS feeds from configured sources.
+- **Live Feed**: Fetches RSS feeds into a persistent history table and pages through it.
 - **Auto Summarization**: Uses background threads to summarize articles via LLM.
 - **Database**: Caches summaries and stores saved articles in MariaDB.
+- **Knowledge Base Sync**: Incrementally indexes saved articles into ChromaDB for RAG Chat.
 - **Secrets**: Securely loads credentials from `.env`.
 
 Modules:
 - `modules.news_manager`: Handles RSS fetching and DB storage.
 - `modules.llm_manager`: Manages LLM providers (Ollama, OpenAI, etc).
+- `modules.news_indexer`: Watermark-based tb_news -> ChromaDB indexer.
 """
 import streamlit as st
 
 from modules.news_manager import NewsFetcher, NewsDatabase
+from modules.news_indexer import NewsIndexer
 from modules.llm_manager import LLMManager
 from modules.workers import auto_sum_worker
 from modules.ui_components import render_sidebar
@@ -23,6 +26,9 @@ import time
 import queue
 import threading
 
+# Live News 목록의 페이지당 항목 수
+NEWS_PAGE_SIZE = 20
+
 # 페이지 설정
 st.set_page_config(page_title="News Reader", page_icon=None, layout="wide")
 
@@ -104,35 +110,68 @@ if mode == "Live News":
         else:
             should_refresh = True
     
-    if should_refresh or 'current_source' not in st.session_state or st.session_state.current_source != source:
+    source_changed = st.session_state.get('current_source') != source
+    if should_refresh or source_changed:
         with st.spinner("Fetching news feed..."):
             new_items = fetcher.fetch_feeds(source)
             
             if new_items is None:
                 st.toast("No new articles found.")
-                st.session_state.last_update = time.time() # 변경 사항이 없어도 타이머 재설정
             else:
-                st.session_state.news_items = new_items
-                st.session_state.current_source = source
-                st.session_state.last_update = time.time()
-                if 'stop_event' in st.session_state:
-                    st.session_state.stop_event.set()
-                    
-                # DB에서 요약 미리 가져오기
-                st.session_state.summaries = {}
-                for item in st.session_state.news_items:
-                    cached = db.get_summary_from_cache(item['link'])
-                    if cached:
-                        formatted_cached = {
-                            'text': cached['summary'],
-                            'meta': {
-                                'source': 'Cache',
-                                'time': 'N/A',
-                                'host': 'DB',
-                                'model': cached.get('model', 'Unknown')
-                            }
-                        }
-                        st.session_state.summaries[item['link']] = formatted_cached
+                # 피드 전체를 히스토리 테이블에 누적 (link_hash 중복 제거)
+                db.upsert_feed_entries(new_items)
+            st.session_state.last_update = time.time() # 변경 사항이 없어도 타이머 재설정
+            st.session_state.current_source = source
+            if source_changed:
+                st.session_state.news_page = 0
+
+    # 목록은 항상 DB 히스토리에서 페이지 단위로 조회
+    if 'news_page' not in st.session_state:
+        st.session_state.news_page = 0
+    total_items = db.count_feed_entries(source)
+    total_pages = max(1, (total_items + NEWS_PAGE_SIZE - 1) // NEWS_PAGE_SIZE)
+    st.session_state.news_page = min(st.session_state.news_page, total_pages - 1)
+
+    page_items = db.get_feed_entries(source, limit=NEWS_PAGE_SIZE, offset=st.session_state.news_page * NEWS_PAGE_SIZE)
+    prev_links = [i['link'] for i in st.session_state.get('news_items', [])]
+    if 'news_items' not in st.session_state or [i['link'] for i in page_items] != prev_links:
+        st.session_state.news_items = page_items
+        st.session_state.expanded_id = None
+        if 'stop_event' in st.session_state:
+            st.session_state.stop_event.set()
+
+        # DB에서 요약 미리 가져오기 (현재 페이지 항목만)
+        if 'summaries' not in st.session_state:
+            st.session_state.summaries = {}
+        for item in page_items:
+            if item['link'] in st.session_state.summaries:
+                continue
+            cached = db.get_summary_from_cache(item['link'])
+            if cached:
+                formatted_cached = {
+                    'text': cached['summary'],
+                    'meta': {
+                        'source': 'Cache',
+                        'time': 'N/A',
+                        'host': 'DB',
+                        'model': cached.get('model', 'Unknown')
+                    }
+                }
+                st.session_state.summaries[item['link']] = formatted_cached
+
+    # 페이지 이동
+    if total_pages > 1:
+        c_prev, c_page, c_next = st.columns([0.15, 0.7, 0.15])
+        with c_prev:
+            if st.button("◀", key="news_prev_page", disabled=st.session_state.news_page == 0):
+                st.session_state.news_page -= 1
+                st.rerun()
+        with c_page:
+            st.caption(f"Page {st.session_state.news_page + 1} / {total_pages} ({total_items} articles)")
+        with c_next:
+            if st.button("▶", key="news_next_page", disabled=st.session_state.news_page >= total_pages - 1):
+                st.session_state.news_page += 1
+                st.rerun()
 
     if not st.session_state.news_items:
         st.info("No news items found or unable to fetch.")
@@ -276,6 +315,16 @@ if mode == "Live News":
 
 elif mode == "Saved News":
     st.header("Saved Articles")
+
+    # 저장된 기사를 RAG 지식 베이스(ChromaDB)로 증분 색인
+    if NewsIndexer.is_available():
+        if st.button("🧠 Sync to Knowledge Base", help="Index new or updated saved articles for RAG Chat"):
+            if 'news_indexer' not in st.session_state:
+                st.session_state.news_indexer = NewsIndexer(db=db)
+            with st.spinner("Indexing saved articles..."):
+                rows, chunks = st.session_state.news_indexer.run()
+            st.toast(f"Indexed {rows} articles ({chunks} chunks).")
+
     saved_items = db.get_saved_articles()
     
     if not saved_items:
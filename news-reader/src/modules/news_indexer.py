@@ -0,0 +1,172 @@
+"""
+News Knowledge-Base Indexer
+---------------------------
+tb_news에 저장된 기사를 RAG 워크벤치가 조회하는 ChromaDB 컬렉션(tb_knowledge_base)에
+증분 방식으로 색인합니다.
+
+- **Watermark**: tb_news_index_state에 마지막으로 처리한 (created_at, id)를 저장하고,
+  그 이후에 추가/수정된 행만 가져옵니다. (save_article은 수정 시 created_at을 갱신함)
+- **Batching**: 여러 기사의 청크를 모아 한 번의 encode 호출로 임베딩합니다.
+- **Back-reference**: 각 청크 메타데이터에 source_id(tb_news.id)와 table_name을 기록하여
+  RAG Chat이 MariaDB에서 원문을 역추적할 수 있게 합니다.
+
+사용법:
+    cd src && python -m modules.news_indexer
+"""
+import os
+import logging
+
+from modules.news_manager import NewsDatabase
+
+try:
+    import chromadb
+    from sentence_transformers import SentenceTransformer
+    from embed_client import load_embedder
+except ImportError:
+    chromadb = None
+    SentenceTransformer = None
+
+logger = logging.getLogger(__name__)
+
+# RAG 워크벤치(rag/src/rag_app.py)와 동일한 설정이어야 검색됩니다.
+EMBED_MODEL_ID = 'jhgan/ko-sroberta-multitask'
+CHROMA_HOST = os.getenv('CHROMA_HOST', '100.65.53.9')
+CHROMA_PORT = int(os.getenv('CHROMA_PORT', 8001))
+COLLECTION_NAME = "tb_knowledge_base"
+
+INDEX_NAME = "tb_news"
+NEWS_CATEGORY = "News"
+
+
+def simple_text_split(text, chunk_size=1000, overlap=100):
+    """고정 길이 + 겹침 방식의 단순 청크 분할 (rag_diary와 동일)."""
+    chunks = []
+    start = 0
+    while start < len(text):
+        end = min(start + chunk_size, len(text))
+        chunks.append(text[start:end])
+        if end == len(text):
+            break
+        start += (chunk_size - overlap)
+    return chunks
+
+
+class NewsIndexer:
+    """
+    tb_news -> ChromaDB 증분 색인기.
+
+    Attributes:
+        db (NewsDatabase): 뉴스 DB 접근 객체.
+        batch_size (int): 한 번에 가져와 임베딩할 기사 수.
+    """
+    def __init__(self, db=None, batch_size=32, chunk_size=1000, overlap=100):
+        self.db = db or NewsDatabase()
+        self.batch_size = batch_size
+        self.chunk_size = chunk_size
+        self.overlap = overlap
+        self._model = None
+        self._collection = None
+
+    @staticmethod
+    def is_available():
+        """chromadb / sentence_transformers 설치 여부."""
+        return chromadb is not None and SentenceTransformer is not None
+
+    @property
+    def model(self):
+        if self._model is None:
+            # 공유 임베딩 서버(EMBED_SERVER_URL)가 있으면 사용, 없으면 프로세스 내 로드
+            self._model = load_embedder(EMBED_MODEL_ID)
+        return self._model
+
+    @property
+    def collection(self):
+        if self._collection is None:
+            client = chromadb.HttpClient(host=CHROMA_HOST, port=CHROMA_PORT)
+            self._collection = client.get_or_create_collection(name=COLLECTION_NAME)
+        return self._collection
+
+    def _build_document(self, row):
+        """기사 한 건을 색인용 텍스트로 변환합니다."""
+        parts = [row.get('title') or '']
+        if row.get('summary'):
+            parts.append(row['summary'])
+        if row.get('content'):
+            parts.append(row['content'])
+        return "\n\n".join(p for p in parts if p)
+
+    def _index_rows(self, rows):
+        """기사 묶음을 청크/임베딩하여 컬렉션에 upsert합니다."""
+        ids, chunks, metadatas = [], [], []
+        source_ids = []
+
+        for row in rows:
+            source_id = str(row['id'])
+            source_ids.append(source_id)
+            for i, chunk in enumerate(simple_text_split(self._build_document(row), self.chunk_size, self.overlap)):
+                ids.append(f"news-{source_id}-{i}")
+                chunks.append(chunk)
+                metadatas.append({
+                    "date": str(row.get('published_date') or row['created_at']),
+                    "category": NEWS_CATEGORY,
+                    "source": row.get('source') or '',
+                    "source_id": source_id,
+                    "table_name": f"{self.db.db_config['database']}.tb_news",
+                    "id_column": "id",
+                    "chunk_index": i,
+                })
+
+        # 수정된 기사는 청크 수가 줄어들 수 있으므로 기존 청크를 먼저 제거
+        self.collection.delete(where={"$and": [
+            {"table_name": f"{self.db.db_config['database']}.tb_news"},
+            {"source_id": {"$in": source_ids}},
+        ]})
+
+        if not chunks:
+            return 0
+
+        embeddings = self.model.encode(chunks, batch_size=32).tolist()
+        self.collection.upsert(ids=ids, embeddings=embeddings, documents=chunks, metadatas=metadatas)
+        return len(chunks)
+
+    def run(self, max_batches=None):
+        """
+        워터마크 이후의 기사를 배치 단위로 색인합니다.
+
+        배치마다 색인이 끝난 뒤 워터마크를 커밋하므로, 중간에 실패해도 다음 실행은
+        마지막으로 성공한 배치 이후부터 이어서 처리합니다.
+
+        Args:
+            max_batches (int, optional): 처리할 최대 배치 수 (None이면 끝까지).
+
+        Returns:
+            tuple: (색인된 기사 수, 생성된 청크 수)
+        """
+        if not self.is_available():
+            logger.error("chromadb / sentence_transformers not installed. Skipping news indexing.")
+            return 0, 0
+
+        last_created_at, last_id = self.db.get_index_watermark(INDEX_NAME)
+        total_rows = 0
+        total_chunks = 0
+        batches = 0
+
+        while max_batches is None or batches < max_batches:
+            rows = self.db.get_articles_since(last_created_at, last_id, limit=self.batch_size)
+            if not rows:
+                break
+
+            total_chunks += self._index_rows(rows)
+            total_rows += len(rows)
+            batches += 1
+
+            last_created_at, last_id = rows[-1]['created_at'], rows[-1]['id']
+            self.db.set_index_watermark(INDEX_NAME, last_created_at, last_id)
+
+        logger.info(f"News indexing complete: {total_rows} articles, {total_chunks} chunks.")
+        return total_rows, total_chunks
+
+
+if __name__ == "__main__":
+    rows, chunks = NewsIndexer().run()
+    print(f"Indexed {rows} articles ({chunks} chunks) into '{COLLECTION_NAME}'.")
@@ -7,6 +7,7 @@ import mysql.connector
 import json
 import logging
 from datetime import datetime, timedelta, timezone
+import hashlib
 import os
 
 logging.basicConfig(level=logging.INFO)
@@ -47,7 +48,8 @@ class NewsDatabase:
 
     def ensure_table_exists(self):
         """
-        필요한 데이터베이스 테이블(tb_news, tb_summary_cache)이 존재하는지 확인합니다.
+        필요한 데이터베이스 테이블(tb_news, tb_summary_cache, tb_feed_entries, tb_news_index_state)이
+        존재하는지 확인합니다.
         누락된 경우 생성합니다.
         """
         try:
@@ -105,6 +107,45 @@ class NewsDatabase:
                 cursor.execute(create_cache_table_query)
                 conn.commit()
                 cursor.close()
+
+                # 피드 히스토리 테이블 (모든 RSS 항목 누적, link_hash로 중복 제거)
+                cursor = conn.cursor()
+                create_feed_table_query = """
+                CREATE TABLE IF NOT EXISTS tb_feed_entries (
+                    id INT AUTO_INCREMENT PRIMARY KEY,
+                    link_hash CHAR(32) NOT NULL,
+                    link TEXT NOT NULL,
+                    title VARCHAR(500) NOT NULL,
+                    published_date VARCHAR(100),
+                    published_at DATETIME NOT NULL,
+                    source VARCHAR(50) NOT NULL,
+                    first_seen_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    last_seen_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    UNIQUE KEY unique_feed_link_hash (link_hash),
+                    KEY idx_feed_source_published (source, published_at)
+                )
+                """
+                cursor.execute(create_feed_table_query)
+                conn.commit()
+                cursor.close()
+
+                # 벡터 색인 워터마크 테이블 (news_indexer 증분 처리용)
+                cursor = conn.cursor()
+                create_index_state_query = """
+                CREATE TABLE IF NOT EXISTS tb_news_index_state (
+                    name VARCHAR(50) PRIMARY KEY,
+                    last_created_at TIMESTAMP NULL,
+                    last_id INT NOT NULL DEFAULT 0,
+                    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP
+                )
+                """
+                cursor.execute(create_index_state_query)
+                try:
+                    cursor.execute("CREATE INDEX idx_news_created_id ON tb_news (created_at, id)")
+                except mysql.connector.Error:
+                    pass # 이미 존재
+                conn.commit()
+                cursor.close()
                 
                 conn.close()
                 logger.info("Tables checked/created.")
@@ -273,6 +314,191 @@ class NewsDatabase:
             if conn:
                 conn.close()
 
+    @staticmethod
+    def _hash_link(link):
+        """캐시/피드 테이블에서 공통으로 사용하는 링크 해시(MD5)."""
+        return hashlib.md5(link.encode('utf-8')).hexdigest()
+
+    def upsert_feed_entries(self, entries):
+        """
+        피드 항목을 tb_feed_entries에 일괄 저장합니다 (link_hash 기준 중복 제거).
+
+        이미 존재하는 링크는 제목과 last_seen_at만 갱신하며, 최초 수집 시각은 유지됩니다.
+
+        Args:
+            entries (list): fetch_feeds가 반환한 항목(dict) 목록.
+
+        Returns:
+            int: 처리된 항목 수, 실패 시 0.
+        """
+        if not entries:
+            return 0
+
+        conn = self.get_connection()
+        if not conn:
+            return 0
+
+        try:
+            cursor = conn.cursor()
+            query = """
+            INSERT INTO tb_feed_entries (link_hash, link, title, published_date, published_at, source)
+            VALUES (%s, %s, %s, %s, %s, %s)
+            ON DUPLICATE KEY UPDATE title=VALUES(title), last_seen_at=NOW()
+            """
+            values = [
+                (
+                    self._hash_link(e['link']),
+                    e['link'],
+                    (e.get('title') or '')[:500],
+                    e.get('published'),
+                    e.get('published_at') or datetime.now(),
+                    e.get('source', ''),
+                )
+                for e in entries
+            ]
+            cursor.executemany(query, values)
+            conn.commit()
+            return len(values)
+        except mysql.connector.Error as err:
+            logger.error(f"Feed upsert error: {err}")
+            return 0
+        finally:
+            if 'cursor' in locals() and cursor:
+                cursor.close()
+            if conn:
+                conn.close()
+
+    def get_feed_entries(self, source, limit=20, offset=0):
+        """
+        tb_feed_entries에서 소스별 항목을 최신순으로 페이지 단위 조회합니다.
+
+        Returns:
+            list: fetch_feeds와 동일한 형태의 dict 목록 (title, link, published, source).
+        """
+        conn = self.get_connection()
+        if not conn:
+            return []
+
+        try:
+            cursor = conn.cursor(dictionary=True)
+            cursor.execute(
+                """
+                SELECT title, link, published_date AS published, source
+                FROM tb_feed_entries
+                WHERE source = %s
+                ORDER BY published_at DESC, id DESC
+                LIMIT %s OFFSET %s
+                """,
+                (source, int(limit), int(offset))
+            )
+            return cursor.fetchall()
+        except mysql.connector.Error as err:
+            logger.error(f"Feed query error: {err}")
+            return []
+        finally:
+            if conn:
+                conn.close()
+
+    def count_feed_entries(self, source):
+        """소스별로 누적된 피드 항목 수를 반환합니다."""
+        conn = self.get_connection()
+        if not conn:
+            return 0
+
+        try:
+            cursor = conn.cursor()
+            cursor.execute("SELECT COUNT(*) FROM tb_feed_entries WHERE source = %s", (source,))
+            return cursor.fetchone()[0]
+        except mysql.connector.Error as err:
+            logger.error(f"Feed count error: {err}")
+            return 0
+        finally:
+            if conn:
+                conn.close()
+
+    def get_articles_since(self, last_created_at, last_id, limit=32):
+        """
+        워터마크 (created_at, id) 이후에 추가/수정된 tb_news 행을 오래된 순으로 반환합니다.
+
+        Args:
+            last_created_at (datetime): 마지막으로 처리한 created_at (None이면 처음부터).
+            last_id (int): 같은 created_at 안에서 마지막으로 처리한 id.
+            limit (int): 최대 행 수.
+        """
+        conn = self.get_connection()
+        if not conn:
+            return []
+
+        try:
+            cursor = conn.cursor(dictionary=True)
+            if last_created_at is None:
+                cursor.execute(
+                    "SELECT * FROM tb_news ORDER BY created_at ASC, id ASC LIMIT %s",
+                    (int(limit),)
+                )
+            else:
+                cursor.execute(
+                    """
+                    SELECT * FROM tb_news
+                    WHERE created_at > %s OR (created_at = %s AND id > %s)
+                    ORDER BY created_at ASC, id ASC
+                    LIMIT %s
+                    """,
+                    (last_created_at, last_created_at, int(last_id), int(limit))
+                )
+            return cursor.fetchall()
+        except mysql.connector.Error as err:
+            logger.error(f"Article watermark query error: {err}")
+            return []
+        finally:
+            if conn:
+                conn.close()
+
+    def get_index_watermark(self, name):
+        """색인 워터마크 (last_created_at, last_id)를 반환합니다. 없으면 (None, 0)."""
+        conn = self.get_connection()
+        if not conn:
+            return None, 0
+
+        try:
+            cursor = conn.cursor(dictionary=True)
+            cursor.execute("SELECT last_created_at, last_id FROM tb_news_index_state WHERE name = %s", (name,))
+            row = cursor.fetchone()
+            if row:
+                return row['last_created_at'], row['last_id']
+            return None, 0
+        except mysql.connector.Error as err:
+            logger.error(f"Watermark get error: {err}")
+            return None, 0
+        finally:
+            if conn:
+                conn.close()
+
+    def set_index_watermark(self, name, last_created_at, last_id):
+        """색인 워터마크를 저장합니다."""
+        conn = self.get_connection()
+        if not conn:
+            return False
+
+        try:
+            cursor = conn.cursor()
+            cursor.execute(
+                """
+                INSERT INTO tb_news_index_state (name, last_created_at, last_id)
+                VALUES (%s, %s, %s)
+                ON DUPLICATE KEY UPDATE last_created_at=VALUES(last_created_at), last_id=VALUES(last_id)
+                """,
+                (name, last_created_at, int(last_id))
+            )
+            conn.commit()
+            return True
+        except mysql.connector.Error as err:
+            logger.error(f"Watermark save error: {err}")
+            return False
+        finally:
+            if conn:
+                conn.close()
+
     def get_saved_articles(self):
         """tb_news에서 저장된 모든 기사를 최신순으로 검색합니다."""
         conn = self.get_connection()
@@ -319,7 +545,8 @@ class NewsFetcher:
             source_name (str): self.sources 중 하나와 일치하는 키.
 
         Returns:
-            list: 상위 10개 뉴스 항목(dict)의 목록, 또는 변경 사항이 없는 경우 None.
+            list: 피드의 모든 뉴스 항목(dict) 목록, 또는 변경 사항이 없는 경우 None.
+                  각 항목은 정렬용 published_at(datetime, KST)을 포함합니다.
         """
         url = self.sources.get(source_name)
         if not url:
@@ -366,8 +593,9 @@ class NewsFetcher:
             return []
 
         entries = []
-        for entry in feed.entries[:5]: # 5개로 제한
+        for entry in feed.entries:
             published = entry.get('published', datetime.now().strftime('%Y-%m-%d %H:%M:%S'))
+            published_at = datetime.now()
             
             # KST 변환 로직 추가
             if hasattr(entry, 'published_parsed') and entry.published_parsed:
@@ -380,6 +608,7 @@ class NewsFetcher:
                     dt_kst = dt_utc.astimezone(kst_tz)
                     
                     published = dt_kst.strftime('%Y-%m-%d %H:%M:%S')
+                    published_at = dt_kst.replace(tzinfo=None)
                 except Exception as e:
                     # 변환 실패 시 원본 문자열 유지
                     pass
@@ -388,6 +617,7 @@ class NewsFetcher:
                 'title': entry.title,
                 'link': entry.link,
                 'published': published,
+                'published_at': published_at,
                 'source': source_name
             })
         return entries
@@ -23,7 +23,7 @@ import requests
 import chromadb
 import pandas as pd
 import pymysql # Added for ID Backtracking
-from sentence_transformers import SentenceTransformer
+from embed_client import load_embedder
 
 # --- API Helper Functions ---
 def call_openai_api(model, messages, api_key):
@@ -122,8 +122,12 @@ MARIADB_USER = os.getenv("MARIADB_USER", "root")
 MARIADB_PASSWORD = os.getenv("MARIADB_PASSWORD")
 MARIADB_DB = os.getenv("MARIADB_DB", "rag_diary_db")
 
-def get_full_document_from_mariadb(table_name, source_id):
-    """Fetches the full content from MariaDB using the source ID."""
+def get_full_document_from_mariadb(table_name, source_id, id_column="uuid"):
+    """Fetches the full content from MariaDB using the source ID.
+
+    `table_name` may be schema-qualified (e.g. `news_db.tb_news`) and `id_column`
+    names the key column for sources that are not keyed by `uuid`.
+    """
     try:
         conn = pymysql.connect(
             host=MARIADB_HOST, user=MARIADB_USER, password=MARIADB_PASSWORD, database=MARIADB_DB,
@@ -132,7 +136,7 @@ def get_full_document_from_mariadb(table_name, source_id):
         )
         with conn.cursor() as cursor:
             st.caption(f"🔍 Fetching valid doc from MariaDB: {source_id}") # Debug Log
-            cursor.execute(f"SELECT * FROM {table_name} WHERE uuid = %s", (source_id,))
+            cursor.execute(f"SELECT * FROM {table_name} WHERE {id_column} = %s", (source_id,))
             result = cursor.fetchone()
         conn.close()
         
@@ -143,8 +147,8 @@ def get_full_document_from_mariadb(table_name, source_id):
             # Handle Metadata (JSON check)
             metadata_raw = result.get('metadata')
             summary = ""
-            date = result.get('log_date', '')
-            subject = result.get('subject', '')
+            date = result.get('log_date') or result.get('published_date', '')
+            subject = result.get('subject') or result.get('title', '')
             
             if metadata_raw:
                 if isinstance(metadata_raw, str):
@@ -197,8 +201,8 @@ LLM_MODEL = "gpt-oss:20b"
 
 @st.cache_resource
 def get_embedding_model():
-    # Returns the raw SentenceTransformer model
-    return SentenceTransformer(EMBED_MODEL_ID)
+    # Returns the SentenceTransformer model (or the shared embedding server client, see embed-server/client)
+    return load_embedder(EMBED_MODEL_ID)
 
 @st.cache_resource
 def get_chroma_client():
@@ -221,7 +225,7 @@ with st.sidebar:
     st.markdown("Select effective knowledge base (Category).")
     
     # Filter Categories matching Config
-    scope_options = ["ALL", "Factory_Manuals", "Personal_Diaries", "Dev_Logs", "Ideas"]
+    scope_options = ["ALL", "Factory_Manuals", "Personal_Diaries", "Dev_Logs", "Ideas", "News"]
     selected_scope = st.selectbox("📂 Target Category", scope_options, index=0)
     
     st.divider()
@@ -728,10 +732,11 @@ with tab4:
                             # We MUST use the metadata's source_id for logical deduplication.
                             real_source_id = meta.get('source_id') or source_id
                             table_name = meta.get('table_name') or COLLECTION_NAME
+                            id_column = meta.get('id_column') or "uuid"
                             
                             if real_source_id and real_source_id not in seen_ids:
                                 # Fetch Full Content from MariaDB (Single Source of Truth)
-                                full_doc = get_full_document_from_mariadb(table_name, real_source_id)
+                                full_doc = get_full_document_from_mariadb(table_name, real_source_id, id_column)
                                 if full_doc:
                                     context_parts.append(full_doc)
                                     seen_ids.add(real_source_id)
@@ -1,7 +1,7 @@
 import requests
 import json
 import chromadb
-from sentence_transformers import SentenceTransformer
+from embed_client import load_embedder  # 공용 임베딩 서버 (EMBED_SERVER_URL), 없으면 로컬 모델
 import sys
 import os
 
@@ -20,7 +20,7 @@ class RAGChat:
         # 1. 임베딩 모델 로드
         print(f"   - 임베딩 모델 로드: {EMBED_MODEL_ID}")
         try:
-            self.embed_model = SentenceTransformer(EMBED_MODEL_ID)
+            self.embed_model = load_embedder(EMBED_MODEL_ID)
         except Exception as e:
             print(f"❌ 임베딩 모델 로드 실패: {e}")
             sys.exit(1)
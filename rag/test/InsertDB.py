@@ -1,5 +1,5 @@
 import chromadb
-from sentence_transformers import SentenceTransformer
+from embed_client import load_embedder  # 공용 임베딩 서버 (EMBED_SERVER_URL), 없으면 로컬 모델
 
 # --- 설정 ---
 CHROMA_HOST = '2080ti'
@@ -10,7 +10,7 @@ def init_database():
     print(f"1. 임베딩 모델 로딩 중... ({EMBED_MODEL_ID})")
     # RTX 2060을 임베딩 전용으로 쓰려면 device='cuda:1'로 변경하세요.
     # 지금은 테스트니 기본(CPU/GPU자동)으로 둡니다.
-    model = SentenceTransformer(EMBED_MODEL_ID)
+    model = load_embedder(EMBED_MODEL_ID)
 
     print("2. ChromaDB(8001) 연결 중...")
     client = chromadb.HttpClient(host=CHROMA_HOST, port=CHROMA_PORT)
@@ -1,7 +1,7 @@
 import requests
 import json
 import chromadb
-from sentence_transformers import SentenceTransformer
+from embed_client import load_embedder  # 공용 임베딩 서버 (EMBED_SERVER_URL), 없으면 로컬 모델
 
 # --- 설정 ---
 OLLAMA_URL = "http://2080ti:11434/api/chat"
@@ -13,7 +13,7 @@ LLM_MODEL = "qwen2.5:7b" # 사용 중인 모델명 (없으면 llama3.1 등으로
 class FactoryRAG:
     def __init__(self):
         print("시스템 가동 중...")
-        self.embed_model = SentenceTransformer(EMBED_MODEL_ID)
+        self.embed_model = load_embedder(EMBED_MODEL_ID)
         self.db_client = chromadb.HttpClient(host=CHROMA_HOST, port=CHROMA_PORT)
         self.collection = self.db_client.get_collection(name="factory_manuals")
 
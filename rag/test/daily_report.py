@@ -1,7 +1,7 @@
 import requests
 import json
 import chromadb
-from sentence_transformers import SentenceTransformer
+from embed_client import load_embedder  # 공용 임베딩 서버 (EMBED_SERVER_URL), 없으면 로컬 모델
 from datetime import datetime
 
 # --- 설정 (환경에 맞게 IP 수정) ---
@@ -15,7 +15,7 @@ LLM_MODEL = "qwen3:8b"
 class FactoryAnalyst:
     def __init__(self):
         print("🏭 공장 분석 시스템 초기화 중...")
-        self.embed_model = SentenceTransformer(EMBED_MODEL_ID)
+        self.embed_model = load_embedder(EMBED_MODEL_ID)
         self.db_client = chromadb.HttpClient(host=CHROMA_HOST, port=CHROMA_PORT)
         self.collection = self.db_client.get_collection(name="factory_manuals")
         print("✅ 시스템 준비 완료.")
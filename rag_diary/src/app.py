@@ -24,7 +24,7 @@ import requests
 import json
 import uuid 
 import chromadb
-from sentence_transformers import SentenceTransformer
+from embed_client import load_embedder
 
 import db_utils
 import category_config # Import the new config 
@@ -221,7 +221,8 @@ def analyze_log_content(text, model_name, config, provider, api_key=None, custom
 
 @st.cache_resource
 def get_embedding_model():
-    return SentenceTransformer(EMBEDDING_MODEL_NAME)
+    # Shared embedding server if EMBED_SERVER_URL is set, in-process model otherwise
+    return load_embedder(EMBEDDING_MODEL_NAME)
 
 def get_chroma_collection():
     """Returns the Native Chroma Collection."""